@@ -0,0 +1,53 @@
+import importlib
+
+# 公開名は最初に参照されたときにモジュールを読み込む（from snowflake_info_tool.common import ... のように
+# 一部だけを使う場合に、snowflake.connector や pandas まで読み込まれて画面の初回表示が遅れないようにする）
+_EXPORTS = {
+    "CatalogSnapshotStore": "snapshots",
+    "ConnectionManager": "connection",
+    "EffectiveAccess": "roles",
+    "GrantsSnapshotStore": "snapshots",
+    "RoleGraph": "roles",
+    "ScopeFilter": "scope",
+    "diff_snapshots": "snapshots",
+    "extract_grants": "grants",
+    "extract_parameters": "parameters",
+    "extract_table_definitions": "definitions",
+    "extract_table_definitions_by_describe": "definitions",
+    "fetch_hierarchy_index": "grants",
+    "fetch_role_edges": "roles",
+    "group_grants_by_object": "grants",
+    "refresh_catalog": "snapshots",
+    "sync_grants_snapshot": "grants",
+}
+
+__all__ = [
+    "CatalogSnapshotStore",
+    "ConnectionManager",
+    "EffectiveAccess",
+    "GrantsSnapshotStore",
+    "RoleGraph",
+    "ScopeFilter",
+    "diff_snapshots",
+    "extract_grants",
+    "extract_parameters",
+    "extract_table_definitions",
+    "extract_table_definitions_by_describe",
+    "fetch_hierarchy_index",
+    "fetch_role_edges",
+    "group_grants_by_object",
+    "refresh_catalog",
+    "sync_grants_snapshot",
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from .common import DEFAULT_MAX_WORKERS, escape_identifier
+from .connection import ConnectionManager
+from .definitions import extract_table_definitions, extract_table_definitions_by_describe
+from .export import EXPORT_FORMATS, iter_table_definition_sheets, write_sheets
+from .fakes import FakeAccount, FakeBackend
+from .fetch import fetch_parallel
+from .grants import extract_grants, fetch_hierarchy_index, group_grants_by_object, sync_grants_snapshot
+from .parameters import PARAMETER_LEVELS, extract_parameters
+
+BENCH_RESULT_COLUMNS = [
+    "scenario", "units", "unit", "queries", "failures", "wall_s", "wall_s_min", "throughput", "peak_mb",
+]
+
+
+# ---- ベンチマーク ----
+# 疑似バックエンド（fakes）の上で、パラメータ取得・テーブル定義取得 + Excel 出力・権限取得を実行し、
+# 処理件数あたりのスループット・所要時間・ピークメモリを測る。実アカウントなしで性能の劣化を検出するためのもの。
+# 所要時間は tracemalloc なしで計測し、ピークメモリは別の1回で tracemalloc を有効にして計測する。
+# cancel シナリオは取得の中止後も接続がそのまま使えることを確かめ、使えなければ例外で止まる。
+
+def bench_parameters(query, account, max_workers):
+    result_dict, failed_dbs, failed_whs = extract_parameters(
+        query, PARAMETER_LEVELS, account.databases, account.warehouses, max_workers=max_workers
+    )
+    return len(result_dict), "objects"
+
+
+def bench_definitions(query, account, max_workers):
+    df_def_all, failed = extract_table_definitions(query, account.databases, max_workers=max_workers)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "table_definitions" + EXPORT_FORMATS["Excel (.xlsx)"][0])
+        write_sheets(iter_table_definition_sheets(df_def_all, "All_Tables_Overview"), path, "Excel (.xlsx)")
+    return df_def_all.groupby(["database_name", "schema_name", "table_name"]).ngroups, "tables"
+
+
+def bench_definitions_describe(query, account, max_workers):
+    df_def_all, failed = extract_table_definitions_by_describe(query, account.databases, max_workers=max_workers)
+    return df_def_all.groupby(["database_name", "schema_name", "table_name"]).ngroups, "tables"
+
+
+def grant_targets(query, account, max_workers):
+    index, failed = fetch_hierarchy_index(query, account.databases, max_workers=max_workers)
+    schemas = [(db, schema) for db in account.databases for schema in index.get(db, {})]
+    tables = [f"{db}.{schema}.{tbl}" for db, schema in schemas for tbl in index[db][schema]]
+    return account.databases, schemas, tables
+
+
+def bench_grants(query, account, max_workers):
+    dbs, schemas, tables = grant_targets(query, account, max_workers)
+    grant_results, failed = extract_grants(query, dbs, schemas, tables, max_workers)
+    return len(dbs) + len(schemas) + len(tables), "objects"
+
+
+def bench_grants_account_usage(query, account, max_workers):
+    dbs, schemas, tables = grant_targets(query, account, max_workers)
+    snapshot = sync_grants_snapshot(query)
+    group_grants_by_object(snapshot["grants"], dbs, schemas, tables)
+    return len(dbs) + len(schemas) + len(tables), "objects"
+
+
+def bench_cancel(manager, account, max_workers):
+    # 取得を途中で中止したあと・取得中にエラーで抜けたあとも、範囲外のクエリが中止扱いにならないことを確かめる
+    def show_schemas(db):
+        return manager.query(f"SHOW SCHEMAS IN DATABASE {escape_identifier(db)}")
+
+    with manager.cancellable() as cancel:
+        fetch_parallel(account.databases, show_schemas, max_workers, on_result=lambda *outcome: cancel.set(), cancel=cancel)
+    try:
+        with manager.cancellable():
+            show_schemas("__MISSING__")
+    except Exception:
+        pass
+    manager.query("SHOW DATABASES")
+    manager.use_role(account.roles[0])
+    with manager.cancellable():
+        outcomes = fetch_parallel(account.databases, show_schemas, max_workers)
+    if len(outcomes) != len(account.databases):
+        raise RuntimeError("中止後の取得が最後まで実行されませんでした")
+    return len(outcomes), "databases"
+
+
+SCENARIOS = {
+    "parameters": bench_parameters,
+    "definitions": bench_definitions,
+    "definitions_describe": bench_definitions_describe,
+    "grants": bench_grants,
+    "grants_account_usage": bench_grants_account_usage,
+    "cancel": bench_cancel,
+}
+# ConnectionManager そのもの（cancellable / use_role）を使うシナリオ
+MANAGER_SCENARIOS = {"cancel"}
+
+
+def run_once(scenario, account, backend_options, max_workers, measure_memory=False):
+    backend = FakeBackend(account, **backend_options)
+    manager = ConnectionManager({}, pool_size=max_workers, connector=backend.connect)
+    if measure_memory:
+        tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        target = manager if scenario in MANAGER_SCENARIOS else manager.query
+        units, unit = SCENARIOS[scenario](target, account, max_workers)
+        wall = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+    finally:
+        if measure_memory:
+            tracemalloc.stop()
+        manager.close()
+    return {
+        "units": units, "unit": unit, "wall_s": wall, "peak_bytes": peak,
+        "queries": backend.query_count, "failures": backend.failure_count,
+    }
+
+
+def run_benchmarks(scenarios, account, backend_options, max_workers=DEFAULT_MAX_WORKERS, repeat=3):
+    results = []
+    for scenario in scenarios:
+        runs = [run_once(scenario, account, backend_options, max_workers) for _ in range(repeat)]
+        memory = run_once(scenario, account, backend_options, max_workers, measure_memory=True)
+        wall = statistics.median(run["wall_s"] for run in runs)
+        results.append({
+            "scenario": scenario,
+            "units": runs[0]["units"],
+            "unit": runs[0]["unit"],
+            "queries": runs[0]["queries"],
+            "failures": runs[0]["failures"],
+            "wall_s": round(wall, 4),
+            "wall_s_min": round(min(run["wall_s"] for run in runs), 4),
+            "throughput": round(runs[0]["units"] / wall, 1) if wall else None,
+            "peak_mb": round(memory["peak_bytes"] / 2 ** 20, 2),
+        })
+    return pd.DataFrame(results, columns=BENCH_RESULT_COLUMNS)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m snowflake_info_tool.bench",
+        description="疑似 Snowflake バックエンド上でパラメータ・テーブル定義・権限の取得処理を計測します。"
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="実行するシナリオ")
+    parser.add_argument("--databases", type=int, default=5)
+    parser.add_argument("--schemas", type=int, default=5, help="DB あたりのスキーマ数")
+    parser.add_argument("--tables", type=int, default=20, help="スキーマあたりのテーブル数")
+    parser.add_argument("--columns", type=int, default=12, help="テーブルあたりのカラム数")
+    parser.add_argument("--warehouses", type=int, default=4)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--grants", type=int, default=3, help="オブジェクトあたりの権限数")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="クエリごとに注入する遅延（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="遅延のゆらぎの上限（ミリ秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="クエリを失敗させる確率（0〜1）")
+    parser.add_argument("--fail-pattern", help="この正規表現に一致する SQL を常に失敗させる")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3, help="所要時間の計測回数（中央値を表示）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="結果を書き出す JSON ファイルのパス")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    account = FakeAccount(
+        databases=args.databases, schemas=args.schemas, tables=args.tables, columns=args.columns,
+        warehouses=args.warehouses, roles=args.roles, grants_per_object=args.grants, seed=args.seed
+    )
+    backend_options = {
+        "latency": args.latency_ms / 1000, "jitter": args.jitter_ms / 1000,
+        "failure_rate": args.failure_rate, "fail_pattern": args.fail_pattern, "seed": args.seed,
+    }
+    df_results = run_benchmarks(
+        args.scenarios, account, backend_options, max_workers=args.max_workers, repeat=args.repeat
+    )
+    print(df_results.to_string(index=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(args), "results": df_results.to_dict("records")}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import argparse
+import os
+import sys
+from contextlib import nullcontext
+
+from .common import DEFAULT_MAX_WORKERS, EXCLUDED_DATABASES
+from .compute import WarehouseGuard
+from .connection import ConnectionManager
+from .definitions import extract_table_definitions, extract_table_definitions_by_describe
+from .export import EXPORT_FORMATS, iter_table_definition_sheets, write_sheets
+from .grants import GRANT_LEVELS, extract_grants, fetch_hierarchy_index, group_grants_by_object, sync_grants_snapshot
+from .parameters import (
+    PARAMETER_COLUMN_WIDTHS,
+    PARAMETER_LEVELS,
+    extract_parameters,
+    parameter_flags,
+    parameter_matrix,
+    parameters_long_frame,
+)
+from .roles import EffectiveAccess, RoleGraph, fetch_role_edges, role_edges_from_grants
+from .scope import SCOPE_LEVELS, ScopeFilter, load_scope_profile, save_scope_profile
+from .snapshots import CatalogSnapshotStore, GrantsSnapshotStore, refresh_catalog
+from .trace import QueryTrace
+
+OUTPUT_FORMATS = {
+    "excel": "Excel (.xlsx)",
+    "parquet": "Parquet (.zip)",
+    "csv": "CSV (.zip)",
+    "arrow": "Arrow IPC (.zip)",
+}
+SCOPE_LABELS = {"database": "データベース", "schema": "スキーマ", "table": "テーブル"}
+DEFINITION_MODES = ["information_schema", "account_usage", "incremental", "describe"]
+GRANT_MODES = ["show", "account_usage"]
+PARAMETER_LAYOUTS = ["matrix", "objects"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m snowflake_info_tool",
+        description="Snowflake のパラメータ・テーブル定義・ロール権限をファイルに出力します（Streamlit なしのバッチ実行）。"
+    )
+    parser.add_argument("--account", default=os.environ.get("SNOWFLAKE_ACCOUNT"), help="Account Identifier（既定: $SNOWFLAKE_ACCOUNT）")
+    parser.add_argument("--user", default=os.environ.get("SNOWFLAKE_USER"), help="ユーザー名（既定: $SNOWFLAKE_USER）")
+    parser.add_argument("--password-env", default="SNOWFLAKE_PASSWORD", help="パスワードを読む環境変数名")
+    parser.add_argument("--authenticator", help="snowflake.connector の authenticator（externalbrowser など）")
+    parser.add_argument("--role")
+    parser.add_argument("--warehouse")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="同時に実行するクエリ数の上限")
+    parser.add_argument("--login-timeout", type=int, default=120, help="ログインのタイムアウト（秒）")
+    parser.add_argument("--network-timeout", type=int, help="ネットワークのタイムアウト（秒）")
+    parser.add_argument("--statement-timeout", type=int, help="1クエリのタイムアウト（秒, STATEMENT_TIMEOUT_IN_SECONDS）")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="excel", help="出力形式")
+    parser.add_argument("--output-dir", default=".", help="出力先ディレクトリ")
+    parser.add_argument("--databases", nargs="+", help="対象データベース（既定: すべて）")
+    parser.add_argument("--scope-profile", help="取得範囲プロファイルの名前または JSON ファイルのパス")
+    parser.add_argument("--save-scope-profile", metavar="NAME", help="指定した取得範囲をこの名前のプロファイルとして保存する")
+    for level in SCOPE_LEVELS:
+        parser.add_argument(
+            f"--include-{level}s", nargs="+", metavar="PATTERN",
+            help=f"対象にする{SCOPE_LABELS[level]}名の LIKE パターン（%% と _、大文字小文字を区別しない）"
+        )
+        parser.add_argument(f"--exclude-{level}s", nargs="+", metavar="PATTERN", help=f"除外する{SCOPE_LABELS[level]}名の LIKE パターン")
+    parser.add_argument("--trace", help="クエリ計測のトレースを書き出す JSON ファイルのパス")
+    parser.add_argument(
+        "--suspend-auto-resumed", action="store_true",
+        help="停止中だったセッションのウェアハウスが取得中に自動再開された場合、終了時に停止する（他の処理が使っていても停止する）"
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parameters = subparsers.add_parser("parameters", help="パラメータ設定を出力")
+    parameters.add_argument("--levels", nargs="+", choices=PARAMETER_LEVELS, default=["ACCOUNT", "SESSION"])
+    parameters.add_argument("--warehouses", nargs="+", help="対象ウェアハウス（既定: すべて）")
+    parameters.add_argument(
+        "--resume-warehouses", action="store_true",
+        help="従来方式: ウェアハウスを RESUME してから取得する（起動した場合は取得後に停止状態へ戻す）"
+    )
+    parameters.add_argument(
+        "--layout", choices=PARAMETER_LAYOUTS, default="matrix",
+        help="matrix: キー × オブジェクトの行列と縦長一覧の2シート ／ objects: オブジェクトごとに1シート（従来）"
+    )
+
+    definitions = subparsers.add_parser("definitions", help="テーブル定義書を出力")
+    definitions.add_argument("--mode", choices=DEFINITION_MODES, default="information_schema")
+
+    grants = subparsers.add_parser("grants", help="ロール権限一覧を出力")
+    grants.add_argument("--mode", choices=GRANT_MODES, default="show")
+    grants.add_argument("--levels", nargs="+", choices=GRANT_LEVELS, default=GRANT_LEVELS)
+    grants.add_argument(
+        "--effective-access", action="store_true",
+        help="ロールの継承を展開した実効権限（role, object, privilege, via_role）のシートを追加する"
+    )
+    return parser
+
+
+def connect(args, trace=None):
+    params = {"account": args.account, "user": args.user, "login_timeout": args.login_timeout}
+    password = os.environ.get(args.password_env)
+    if password:
+        params["password"] = password
+    for key in ["authenticator", "role", "warehouse", "network_timeout"]:
+        if getattr(args, key):
+            params[key] = getattr(args, key)
+    if args.statement_timeout:
+        params["session_parameters"] = {"STATEMENT_TIMEOUT_IN_SECONDS": args.statement_timeout}
+    manager = ConnectionManager(params, pool_size=args.max_workers, trace=trace)
+    manager.connect()
+    return manager
+
+
+def build_scope(args):
+    # プロファイルの範囲に、コマンドラインで指定したパターンを追加する
+    scope = load_scope_profile(args.scope_profile) if args.scope_profile else ScopeFilter()
+    return scope.merge(ScopeFilter(
+        {level: getattr(args, f"include_{level}s") for level in SCOPE_LEVELS},
+        {level: getattr(args, f"exclude_{level}s") for level in SCOPE_LEVELS},
+    ))
+
+
+def list_databases(query, args):
+    if args.databases:
+        return args.scope.filter_names("database", args.databases)
+    databases = args.scope.filter_names("database", query(args.scope.show("DATABASES"))["name"].tolist())
+    return [db for db in databases if db.upper() not in EXCLUDED_DATABASES]
+
+
+def run_parameters(query, args):
+    databases = list_databases(query, args) if "DATABASE" in args.levels else []
+    warehouses = []
+    if "WAREHOUSE" in args.levels:
+        warehouses = args.warehouses or query("SHOW WAREHOUSES")["name"].tolist()
+    result_dict, failed_dbs, failed_whs = extract_parameters(
+        query, args.levels, databases, warehouses, max_workers=args.max_workers, resume_warehouses=args.resume_warehouses
+    )
+    failures = [f"DATABASE {db}: {err}" for db, err in failed_dbs] + [f"WAREHOUSE {wh}: {err}" for wh, err in failed_whs]
+    if args.layout == "objects":
+        return "snowflake_parameters", list(result_dict.items()), failures, PARAMETER_COLUMN_WIDTHS
+    df_params = parameter_flags(parameters_long_frame(result_dict))
+    df_matrix, _ = parameter_matrix(df_params)
+    return "snowflake_parameters", [("Matrix", df_matrix.reset_index()), ("Parameters", df_params)], failures, None
+
+
+def run_definitions(query, args):
+    databases = list_databases(query, args)
+    if args.mode == "incremental":
+        df_def_all, summary, failed = refresh_catalog(
+            query, CatalogSnapshotStore(), args.account, databases, max_workers=args.max_workers, scope=args.scope
+        )
+        print(
+            f"差分更新: 追加 {summary['added']} / 変更 {summary['changed']} / "
+            f"削除 {summary['dropped']} / 変更なし {summary['unchanged']} テーブル",
+            file=sys.stderr
+        )
+        if summary["snapshot_id"] is None:
+            print("主キーを取得できなかったため、今回の結果はスナップショットに保存していません", file=sys.stderr)
+    elif args.mode == "describe":
+        df_def_all, failed = extract_table_definitions_by_describe(
+            query, databases, max_workers=args.max_workers, scope=args.scope
+        )
+    else:
+        df_def_all, failed = extract_table_definitions(
+            query, databases, account_wide=args.mode == "account_usage", max_workers=args.max_workers, scope=args.scope
+        )
+    failures = [f"{name}: {err}" for name, err in failed]
+    return "table_definitions", iter_table_definition_sheets(df_def_all, "All_Tables_Overview"), failures, None
+
+
+def run_grants(query, args):
+    databases = list_databases(query, args)
+    hierarchy_index, failed = fetch_hierarchy_index(query, databases, max_workers=args.max_workers, scope=args.scope)
+    failures = [f"{db}: {err}" for db, err in failed]
+    dbs = databases if "DATABASE" in args.levels else []
+    schemas = [(db, schema) for db in databases for schema in hierarchy_index.get(db, {})] if "SCHEMA" in args.levels else []
+    tables = [
+        f"{db}.{schema}.{tbl}"
+        for db in databases for schema, names in hierarchy_index.get(db, {}).items() for tbl in names
+    ] if "TABLE" in args.levels else []
+
+    if args.mode == "account_usage":
+        # 前回の実行で保存したスナップショットがあれば、その watermark 以降の差分だけを取得する
+        store = GrantsSnapshotStore()
+        snapshot = sync_grants_snapshot(query, store.load(args.account))
+        store.save(args.account, snapshot)
+        print(f"差分同期: {snapshot['changed_rows']} 件の変更を反映しました", file=sys.stderr)
+        df_grants = snapshot["grants"]
+        grant_results = group_grants_by_object(df_grants, dbs, schemas, tables)
+    else:
+        grant_results, failed = extract_grants(query, dbs, schemas, tables, max_workers=args.max_workers)
+        failures += [f"{level} {name}: {err}" for level, name, err in failed]
+    sheets = list(grant_results.items())
+
+    if args.effective_access:
+        # ロール階層: 一括取得方式は GRANTS_TO_ROLES の ROLE 行から、SHOW 方式は SHOW GRANTS OF ROLE から
+        roles = query("SHOW ROLES")["name"].tolist()
+        if args.mode == "account_usage":
+            df_edges = role_edges_from_grants(df_grants)
+        else:
+            df_edges, failed = fetch_role_edges(query, roles, max_workers=args.max_workers)
+            failures += [f"ROLE {role}: {err}" for role, err in failed]
+        sheets.insert(0, ("Effective_Access", EffectiveAccess(RoleGraph(roles, df_edges), grant_results).to_frame()))
+    return "object_grants_by_level", sheets, failures, None
+
+
+COMMANDS = {
+    "parameters": run_parameters,
+    "definitions": run_definitions,
+    "grants": run_grants,
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.account or not args.user:
+        print("--account と --user（または SNOWFLAKE_ACCOUNT / SNOWFLAKE_USER）を指定してください", file=sys.stderr)
+        return 2
+    args.scope = build_scope(args)
+    if args.save_scope_profile:
+        print(f"取得範囲を保存しました: {save_scope_profile(args.save_scope_profile, args.scope)}", file=sys.stderr)
+
+    trace = QueryTrace() if args.trace else None
+    manager = connect(args, trace)
+    # SHOW / DESCRIBE はウェアハウスなしで実行し、ウェアハウスを使った文は終了時に報告する
+    guard = WarehouseGuard(
+        manager.query, trace, allow_resume=getattr(args, "resume_warehouses", False),
+        suspend_auto_resumed=args.suspend_auto_resumed
+    )
+    try:
+        with trace.phase(args.command) if trace else nullcontext():
+            name, sheets, failures, col_widths = COMMANDS[args.command](guard, args)
+        export_format = OUTPUT_FORMATS[args.format]
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, name + EXPORT_FORMATS[export_format][0])
+        with trace.phase("ファイル出力") if trace else nullcontext():
+            write_sheets(sheets, path, export_format, col_widths=col_widths)
+    finally:
+        try:
+            restored = guard.restore()
+            if restored:
+                print(f"自動再開されたウェアハウス {restored} を停止状態に戻しました", file=sys.stderr)
+        except Exception as e:
+            print(f"ウェアハウスの状態を戻せませんでした: {e}", file=sys.stderr)
+        manager.close()
+        if trace:
+            with open(args.trace, "w", encoding="utf-8") as f:
+                f.write(trace.to_json())
+
+    df_compute = guard.report()
+    for (category, warehouse), count in df_compute.groupby(["category", "warehouse"], dropna=False).size().items():
+        print(f"ウェアハウスを使った文: {category} × {count}（{warehouse or 'ウェアハウス未指定'}）", file=sys.stderr)
+    for failure in failures:
+        print(f"取得失敗: {failure}", file=sys.stderr)
+    print(path)
+    return 1 if failures else 0
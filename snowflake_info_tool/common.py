@@ -0,0 +1,21 @@
+DEF_COLUMNS = ["column_name", "data_type", "nullable", "primary_key", "comment"]
+DEF_ALL_COLUMNS = DEF_COLUMNS + ["database_name", "schema_name", "table_name"]
+TABLE_KEY_COLUMNS = ["database_name", "schema_name", "table_name"]
+OVERVIEW_COLUMNS = ["database_name", "schema_name", "table_name", "column_name", "data_type", "nullable", "primary_key", "comment"]
+EXCLUDED_DATABASES = ["SNOWFLAKE_SAMPLE_DATA"]
+DEFAULT_MAX_WORKERS = 8
+MAX_WORKERS_LIMIT = 32
+SHOW_MAX_ROWS = 10000
+
+
+def escape_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def escape_literal(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def lower_columns(df):
+    df.columns = [str(col).strip('"').lower() for col in df.columns]
+    return df
@@ -0,0 +1,139 @@
+import re
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .common import escape_identifier, escape_literal, lower_columns
+from .trace import classify_sql
+
+# ウェアハウスなし（クラウドサービスのみ）で実行できる文。SELECT でもコンテキスト関数・システム関数は対象
+COMPUTE_FREE_PREFIXES = (
+    "SHOW ", "DESC ", "DESCRIBE ", "USE ", "ALTER SESSION ", "SELECT CURRENT_", "SELECT SYSTEM$CANCEL_QUERY",
+)
+COMPUTE_STATEMENT_PREFIXES = ("SELECT ", "WITH ", "CALL ")
+# 606: No active warehouse selected in the current session
+NO_WAREHOUSE_ERRNO = 606
+COMPUTE_REPORT_COLUMNS = ["phase", "category", "sql", "warehouse", "warehouse_state", "error"]
+RESUME_WAREHOUSE = re.compile(r"^ALTER\s+WAREHOUSE\s+.*\bRESUME\b", re.IGNORECASE | re.DOTALL)
+
+
+def needs_compute(sql):
+    statement = " ".join(sql.split()).upper() + " "
+    if statement.startswith(COMPUTE_FREE_PREFIXES) or statement == "SELECT 1 ":
+        return False
+    return statement.startswith(COMPUTE_STATEMENT_PREFIXES)
+
+
+# ---- ウェアハウスの状態 ----
+# 取得のためにウェアハウスを起動した場合は、終わったら元の状態（停止中なら SUSPEND）に戻す。
+
+def warehouse_state(query, wh):
+    df = lower_columns(query(f"SHOW WAREHOUSES LIKE {escape_literal(wh)}"))
+    df = df[df["name"] == wh]
+    return None if df.empty else str(df["state"].iloc[0])
+
+
+@contextmanager
+def resumed_warehouse(query, wh):
+    safe_wh = escape_identifier(wh)
+    resumed = False
+    try:
+        if warehouse_state(query, wh) == "SUSPENDED":
+            query(f"ALTER WAREHOUSE {safe_wh} RESUME IF SUSPENDED")
+            resumed = True
+    except Exception:
+        pass
+    try:
+        yield
+    finally:
+        if resumed:
+            try:
+                query(f"ALTER WAREHOUSE {safe_wh} SUSPEND")
+            except Exception:
+                pass
+
+
+class ComputeNotAllowed(Exception):
+    pass
+
+
+# ---- ウェアハウスを使わないメタデータ取得 ----
+# query をラップし、ウェアハウス（計算リソース）を必要とした文を記録する。allow_resume=False なら RESUME を拒否する。
+# SHOW / DESCRIBE はクラウドサービスのみで実行されるが、INFORMATION_SCHEMA・ACCOUNT_USAGE・サンプルの SELECT は
+# ウェアハウスを使う。自動再開されたウェアハウスは他の利用者・処理も使っている可能性があるため既定では停止せず、
+# suspend_auto_resumed=True のときだけ、取得の終わりの restore() で最初の文の前に停止中だったウェアハウスを停止に戻す。
+
+class WarehouseGuard:
+    def __init__(self, query, trace=None, allow_resume=False, suspend_auto_resumed=False):
+        self.query = query
+        self.trace = trace
+        self.allow_resume = allow_resume
+        self.suspend_auto_resumed = suspend_auto_resumed
+        self.records = []
+        self._lock = threading.Lock()
+        self._warehouse = None
+        self._original_state = None
+        self._checked = False
+
+    def __call__(self, sql):
+        if not self.allow_resume and RESUME_WAREHOUSE.match(sql.strip()):
+            raise ComputeNotAllowed(f"メタデータのみのモードではウェアハウスを起動しません: {sql.strip()[:80]}")
+        if not needs_compute(sql):
+            return self.query(sql)
+        self._check_warehouse()
+        try:
+            df = self.query(sql)
+        except Exception as e:
+            self._record(sql, e)
+            raise
+        self._record(sql)
+        return df
+
+    def _check_warehouse(self):
+        # 最初に計算リソースを使う文の前に、セッションのウェアハウスとその状態を控える
+        with self._lock:
+            if self._checked:
+                return
+            self._checked = True
+            try:
+                self._warehouse = self.query("SELECT CURRENT_WAREHOUSE()").iloc[0, 0]
+                if self._warehouse and self.suspend_auto_resumed:
+                    self._original_state = warehouse_state(self.query, self._warehouse)
+            except Exception:
+                self._warehouse = None
+
+    def _record(self, sql, error=None):
+        if error is not None and getattr(error, "errno", None) == NO_WAREHOUSE_ERRNO:
+            error = "ウェアハウス未指定のため実行できません"
+        entry = {
+            "phase": self.trace.current_phase if self.trace is not None else None,
+            "category": classify_sql(sql),
+            "sql": " ".join(sql.split())[:200],
+            "warehouse": self._warehouse,
+            "warehouse_state": self._original_state,
+            "error": None if error is None else str(error),
+        }
+        with self._lock:
+            self.records.append(entry)
+
+    def restore(self):
+        # 取得の終わりに1回呼ぶ。suspend_auto_resumed=True で、停止中だったウェアハウスが自動再開されていたら
+        # 停止に戻す ／ 戻した場合はウェアハウス名を返す
+        with self._lock:
+            warehouse, original = self._warehouse, self._original_state
+            self._warehouse, self._original_state, self._checked = None, None, False
+        if not self.suspend_auto_resumed or not warehouse or original != "SUSPENDED":
+            return None
+        if warehouse_state(self.query, warehouse) == "SUSPENDED":
+            return None
+        self.query(f"ALTER WAREHOUSE {escape_identifier(warehouse)} SUSPEND")
+        return warehouse
+
+    def report(self):
+        with self._lock:
+            return pd.DataFrame(list(self.records), columns=COMPUTE_REPORT_COLUMNS)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
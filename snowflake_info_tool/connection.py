@@ -0,0 +1,241 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from .common import DEFAULT_MAX_WORKERS, escape_identifier, escape_literal
+from .fetch import QueryCancelled, fetch_frame
+
+KEEPALIVE_INTERVAL = 600
+ASYNC_POLL_INTERVAL = 0.05
+ASYNC_POLL_MAX_INTERVAL = 1.0
+# セッション失効系のエラー（390111: セッションなし / 390112: 期限切れ / 390114: 認証トークン期限切れ）
+SESSION_EXPIRED_ERRNOS = {390111, 390112, 390114}
+
+
+# ---- 接続管理 ----
+# 認証は1回だけ行い（Duo のプッシュも1回）、その接続の上に cursor プールと Snowpark セッションを載せる。
+# 並列取得ではプールから cursor を借りて返し、同時実行数は pool_size を上限とする。
+# セッション失効や切断を検知したら同じ接続パラメータで再接続し、失敗したクエリを1回だけ再実行する。
+# trace（QueryTrace）を渡すと、すべてのクエリを記録し、フェーズ名を QUERY_TAG に設定する。
+# cancellable() の間はクエリを非同期で投入してクエリIDを控え、中止時は SYSTEM$CANCEL_QUERY で止める。
+
+class ConnectionManager:
+    def __init__(self, connect_params, pool_size=DEFAULT_MAX_WORKERS, keepalive_interval=KEEPALIVE_INTERVAL, trace=None,
+                 connector=None):
+        self.connect_params = dict(connect_params)
+        # connector: 接続を作る関数（既定は snowflake.connector.connect。ベンチマークでは疑似バックエンドを渡す）
+        # snowflake.connector は読み込みに時間がかかるため、ConnectionManager を作るときに初めて読み込む
+        if connector is None:
+            import snowflake.connector
+            connector = snowflake.connector.connect
+        self.connector = connector
+        self.pool_size = pool_size
+        self.keepalive_interval = keepalive_interval
+        self.trace = trace
+        self._lock = threading.RLock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = queue.LifoQueue()
+        self._conn = None
+        self._session = None
+        self._generation = 0
+        self._last_used = 0.0
+        self._query_tag = None
+        self._cancellable = False
+        self.cancelled = threading.Event()
+
+    def connect(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self.connector(client_session_keep_alive=True, **self.connect_params)
+                self._generation += 1
+                self._last_used = time.monotonic()
+                self._query_tag = None
+            return self._conn
+
+    def reconnect(self):
+        with self._lock:
+            self._discard()
+            return self.connect()
+
+    def close(self):
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        # 古い接続に紐づく cursor は世代番号で判別し、返却時に捨てる
+        self._drain_idle()
+        if self._session is not None:
+            try:
+                self._session.close()
+            except Exception:
+                pass
+            self._session = None
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _drain_idle(self):
+        while True:
+            try:
+                _, cursor = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            cursor.close()
+
+    @property
+    def connection(self):
+        return self.ensure_alive()
+
+    def ensure_alive(self):
+        with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                return self.reconnect()
+            # しばらく使われていない接続は、軽いクエリで生存確認してから使う
+            if time.monotonic() - self._last_used > self.keepalive_interval:
+                from snowflake.connector.errors import DatabaseError
+                try:
+                    with self._conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                except DatabaseError:
+                    return self.reconnect()
+                self._last_used = time.monotonic()
+            return self._conn
+
+    def session(self):
+        # Snowpark は既存の接続をそのまま使う（2回目の認証をしない）
+        with self._lock:
+            conn = self.ensure_alive()
+            if self._session is None:
+                from snowflake.snowpark import Session
+                self._session = Session.builder.configs({"connection": conn}).create()
+            return self._session
+
+    @contextmanager
+    def cursor(self):
+        self._slots.acquire()
+        try:
+            conn = self.ensure_alive()
+            generation = self._generation
+            try:
+                cursor_generation, cursor = self._idle.get_nowait()
+                if cursor_generation != generation:
+                    cursor.close()
+                    cursor = conn.cursor()
+            except queue.Empty:
+                cursor = conn.cursor()
+            try:
+                yield cursor
+            except Exception:
+                cursor.close()
+                raise
+            self._last_used = time.monotonic()
+            if generation == self._generation:
+                self._idle.put((generation, cursor))
+            else:
+                cursor.close()
+        finally:
+            self._slots.release()
+
+    def query(self, sql):
+        # query(sql) -> DataFrame。各エンジンの query 引数としてそのまま渡せる
+        from snowflake.connector.errors import DatabaseError
+        self.ensure_alive()
+        generation = self._generation
+        try:
+            return self._execute(sql)
+        except DatabaseError as e:
+            if e.errno not in SESSION_EXPIRED_ERRNOS and not self._conn_closed() and generation == self._generation:
+                raise
+        # 並列実行中の他スレッドがすでに再接続していれば、そのまま新しい接続で再実行する
+        with self._lock:
+            if generation == self._generation:
+                self.reconnect()
+        return self._execute(sql)
+
+    @contextmanager
+    def cancellable(self):
+        # 中止可能な取得の範囲。画面の再実行などで中断された場合も実行中のクエリを止める
+        # 抜けるときに中止フラグを戻し、範囲外のクエリ（メタデータ取得・ロール切替など）には影響させない
+        self.cancelled.clear()
+        self._cancellable = True
+        try:
+            yield self.cancelled
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            self._cancellable = False
+            self.cancelled.clear()
+
+    def cancel(self):
+        # 以降のクエリは投入せず、実行中の非同期クエリは各ワーカーが自分のクエリIDで取り消す
+        self.cancelled.set()
+
+    def _run(self, cursor, sql):
+        if not self._cancellable:
+            cursor.execute(sql)
+            return
+        if self.cancelled.is_set():
+            raise QueryCancelled(sql.strip()[:80])
+        cursor.execute_async(sql)
+        query_id = cursor.sfqid
+        conn = cursor.connection
+        interval = ASYNC_POLL_INTERVAL
+        while conn.is_still_running(conn.get_query_status_throw_if_error(query_id)):
+            if self.cancelled.wait(interval):
+                self._cancel_query(query_id)
+                raise QueryCancelled(query_id)
+            interval = min(interval * 2, ASYNC_POLL_MAX_INTERVAL)
+        cursor.query_result(query_id)
+
+    def _cancel_query(self, query_id):
+        # プールが埋まっていても取り消せるよう、プール外の cursor で発行する
+        from snowflake.connector.errors import DatabaseError
+        try:
+            with self.ensure_alive().cursor() as cursor:
+                cursor.execute(f"SELECT SYSTEM$CANCEL_QUERY({escape_literal(query_id)})")
+        except DatabaseError:
+            pass
+
+    def _execute(self, sql):
+        trace = self.trace
+        if trace is None:
+            with self.cursor() as cursor:
+                self._run(cursor, sql)
+                return fetch_frame(cursor)
+
+        self._apply_query_tag(trace.query_tag())
+        with self.cursor() as cursor:
+            started = time.time()
+            try:
+                self._run(cursor, sql)
+                df = fetch_frame(cursor)
+            except Exception as e:
+                trace.record(sql, started, query_id=getattr(e, "sfqid", None) or cursor.sfqid, error=e)
+                raise
+            trace.record(sql, started, cursor.sfqid, len(df), int(df.memory_usage(deep=True).sum()))
+            return df
+
+    def _apply_query_tag(self, tag):
+        # QUERY_TAG はセッション単位なので、フェーズが変わったときだけ設定し直す
+        if tag == self._query_tag:
+            return
+        with self._lock:
+            if tag == self._query_tag:
+                return
+            with self.ensure_alive().cursor() as cursor:
+                cursor.execute(f"ALTER SESSION SET QUERY_TAG = {escape_literal(tag)}")
+            self._query_tag = tag
+
+    def _conn_closed(self):
+        conn = self._conn
+        return conn is None or conn.is_closed()
+
+    def use_role(self, role):
+        # 再接続後も同じロールに戻れるよう、接続パラメータにも反映する
+        self.query(f"USE ROLE {escape_identifier(role)}")
+        self.connect_params["role"] = role
@@ -0,0 +1,492 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .common import (
+    DEF_ALL_COLUMNS,
+    DEF_COLUMNS,
+    DEFAULT_MAX_WORKERS,
+    EXCLUDED_DATABASES,
+    TABLE_KEY_COLUMNS,
+    escape_identifier,
+    escape_literal,
+    lower_columns,
+)
+from .fetch import ColumnarCollector, QueryCancelled, fetch_parallel, track
+from .scope import scope_where_sql
+
+SAMPLE_ROWS = 10
+SAMPLE_MAX_COLUMNS = 50
+SAMPLE_MAX_BYTES = 1_000_000
+SAMPLE_METHODS = ["LIMIT", "SAMPLE (n ROWS)", "SAMPLE SYSTEM (1) + LIMIT"]
+SEARCH_FIELDS = {
+    "すべて": "all",
+    "データベース名": "database_name",
+    "スキーマ名": "schema_name",
+    "テーブル名": "table_name",
+    "カラム名": "column_name",
+    "データ型": "data_type",
+    "コメント": "comment",
+}
+PREVIEW_PAGE_SIZES = [10, 20, 50, 100]
+HIERARCHY_MAX_NODES = 100
+# 主キーを取得できなかったときに failed に入れる名前
+PRIMARY_KEYS_FAILURE = "SHOW PRIMARY KEYS"
+# ACCOUNT_USAGE.COLUMNS を参照できなかったとき（SNOWFLAKE データベースの権限なしなど）に failed に入れる名前
+ACCOUNT_USAGE_COLUMNS_FAILURE = "ACCOUNT_USAGE.COLUMNS"
+# セッションに保持する定義一覧で category（辞書エンコード）にする列
+CATALOG_CATEGORY_COLUMNS = TABLE_KEY_COLUMNS + ["data_type", "nullable", "primary_key"]
+# セッションごとのメモリ上限（定義一覧・検索インデックス・サンプルの合計）。超えた分のサンプルはディスクに退避する
+SESSION_MEMORY_BUDGET_BYTES = int(os.environ.get("SESSION_MEMORY_BUDGET_MB", "256")) * 1024 * 1024
+SAMPLE_SPILL_DIR = os.environ.get("SAMPLE_SPILL_DIR", os.path.join(tempfile.gettempdir(), "snowflake_info_tool_samples"))
+SAMPLE_SPILL_MAX_BYTES = int(os.environ.get("SAMPLE_SPILL_MAX_MB", "512")) * 1024 * 1024
+
+
+# ---- テーブル定義: 一括取得エンジン ----
+# DESCRIBE TABLE をテーブルごとに発行する代わりに、INFORMATION_SCHEMA.COLUMNS
+# （DB単位）または SNOWFLAKE.ACCOUNT_USAGE.COLUMNS（アカウント全体）を1クエリで取得し、
+# 主キーは SHOW PRIMARY KEYS でまとめて取得する。
+# query は「SQL文字列 -> pandas.DataFrame」の関数。
+
+COLUMNS_SELECT = """
+    SELECT c.table_catalog, c.table_schema, c.table_name, c.column_name, c.ordinal_position,
+           c.data_type, c.character_maximum_length, c.numeric_precision, c.numeric_scale,
+           c.datetime_precision, c.is_nullable, c.comment
+"""
+
+
+def information_schema_columns_sql(db, tables=None, scope=None):
+    # tables: [(schema, table), ...] を指定するとそのテーブルのカラムだけを取得する
+    # scope（ScopeFilter）のスキーマ・テーブル条件は WHERE 句に入れる
+    info = f"{escape_identifier(db)}.INFORMATION_SCHEMA"
+    sql = COLUMNS_SELECT + f"""
+    FROM {info}.COLUMNS c
+    JOIN {info}.TABLES t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE t.table_type = 'BASE TABLE'
+    """
+    if tables:
+        pairs = ", ".join(f"({escape_literal(schema)}, {escape_literal(tbl)})" for schema, tbl in tables)
+        sql += f"  AND (c.table_schema, c.table_name) IN ({pairs})\n"
+    return sql + scope_where_sql(scope, schema="c.table_schema", table="c.table_name")
+
+
+def account_usage_columns_sql(excluded_dbs=EXCLUDED_DATABASES, scope=None):
+    sql = COLUMNS_SELECT + """
+    FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c
+    JOIN SNOWFLAKE.ACCOUNT_USAGE.TABLES t ON t.table_id = c.table_id
+    WHERE c.deleted IS NULL AND t.deleted IS NULL AND t.table_type = 'BASE TABLE'
+    """
+    if excluded_dbs:
+        sql += f"  AND c.table_catalog NOT IN ({', '.join(escape_literal(db) for db in excluded_dbs)})\n"
+    return sql + scope_where_sql(scope, database="c.table_catalog", schema="c.table_schema", table="c.table_name")
+
+
+def format_data_types(df):
+    # INFORMATION_SCHEMA の型情報を DESCRIBE TABLE と同じ表記（VARCHAR(16777216), NUMBER(38,0) 等）にそろえる
+    base = df["data_type"].astype(str).str.upper().replace({"TEXT": "VARCHAR"})
+    length = pd.to_numeric(df["character_maximum_length"], errors="coerce").astype("Int64").astype(str)
+    precision = pd.to_numeric(df["numeric_precision"], errors="coerce").astype("Int64").astype(str)
+    scale = pd.to_numeric(df["numeric_scale"], errors="coerce").astype("Int64").astype(str)
+    dt_precision = pd.to_numeric(df["datetime_precision"], errors="coerce").astype("Int64").astype(str)
+
+    result = base.copy()
+    has_length = base.isin(["VARCHAR", "BINARY"]) & df["character_maximum_length"].notna()
+    result[has_length] = base[has_length] + "(" + length[has_length] + ")"
+    is_number = base.eq("NUMBER") & df["numeric_precision"].notna()
+    result[is_number] = "NUMBER(" + precision[is_number] + "," + scale[is_number] + ")"
+    is_time = (base.str.startswith("TIMESTAMP") | base.eq("TIME")) & df["datetime_precision"].notna()
+    result[is_time] = base[is_time] + "(" + dt_precision[is_time] + ")"
+    return result
+
+
+def fetch_primary_keys(query, scope="ACCOUNT"):
+    # scope: "ACCOUNT" または 'DATABASE "db"'
+    df_pk = lower_columns(query(f"SHOW PRIMARY KEYS IN {scope}"))
+    if df_pk.empty:
+        return set()
+    return set(zip(df_pk["database_name"], df_pk["schema_name"], df_pk["table_name"], df_pk["column_name"]))
+
+
+def collect_primary_keys(query, failed):
+    # 失敗は failed に (PRIMARY_KEYS_FAILURE, エラー内容) で追加し、主キーなし（primary_key はすべて N）で続ける
+    try:
+        return fetch_primary_keys(query, "ACCOUNT")
+    except QueryCancelled:
+        return set()
+    except Exception as e:
+        failed.append((PRIMARY_KEYS_FAILURE, str(e)))
+        return set()
+
+
+def to_definition_frame(df_cols, primary_keys):
+    df_cols = lower_columns(df_cols)
+    if df_cols.empty:
+        return pd.DataFrame(columns=DEF_ALL_COLUMNS)
+    df_cols = df_cols.sort_values(["table_catalog", "table_schema", "table_name", "ordinal_position"])
+    keys = list(zip(df_cols["table_catalog"], df_cols["table_schema"], df_cols["table_name"], df_cols["column_name"]))
+    df_def = pd.DataFrame({
+        "column_name": df_cols["column_name"].values,
+        "data_type": format_data_types(df_cols).values,
+        "nullable": df_cols["is_nullable"].map({"YES": "Y", "NO": "N"}).fillna(df_cols["is_nullable"]).values,
+        "primary_key": ["Y" if key in primary_keys else "N" for key in keys],
+        "comment": df_cols["comment"].values,
+        "database_name": df_cols["table_catalog"].values,
+        "schema_name": df_cols["table_schema"].values,
+        "table_name": df_cols["table_name"].values,
+    })
+    return df_def
+
+
+def describe_table(query, db, schema, tbl):
+    # 従来方式: DESCRIBE TABLE 1テーブル分の定義（DEF_COLUMNS）を返す
+    df_desc = query(f"DESCRIBE TABLE {escape_identifier(db)}.{escape_identifier(schema)}.{escape_identifier(tbl)}")
+    df_desc.columns = [str(i) for i in range(df_desc.shape[1])]
+    df_desc = df_desc.rename(columns={
+        "0": "column_name",
+        "1": "data_type",
+        "3": "nullable",
+        "5": "primary_key",
+        "9": "comment"
+    })
+    return df_desc[DEF_COLUMNS]
+
+
+def extract_table_definitions(query, database_names, account_wide=False, max_workers=DEFAULT_MAX_WORKERS,
+                              progress=None, cancel=None, scope=None):
+    # 戻り値: (df_def_all, failed) ／ failed は [(db, エラー内容)]
+    # progress には DB ごとの定義（DEF_ALL_COLUMNS）を完了順に通知する
+    failed = []
+    primary_keys = collect_primary_keys(query, failed)
+    if account_wide:
+        try:
+            df_cols = query(account_usage_columns_sql(scope=scope))
+        except QueryCancelled:
+            return ColumnarCollector(DEF_ALL_COLUMNS).to_frame(), failed
+        except Exception as e:
+            failed.append((ACCOUNT_USAGE_COLUMNS_FAILURE, str(e)))
+            return ColumnarCollector(DEF_ALL_COLUMNS).to_frame(), failed
+        df_def_all = to_definition_frame(df_cols, primary_keys)
+        if database_names is not None:
+            df_def_all = df_def_all[df_def_all["database_name"].isin(database_names)].reset_index(drop=True)
+        return df_def_all, failed
+
+    collector = ColumnarCollector(DEF_ALL_COLUMNS)
+    results = fetch_parallel(
+        database_names,
+        lambda db: to_definition_frame(query(information_schema_columns_sql(db, scope=scope)), primary_keys),
+        max_workers,
+        on_result=track(progress, database_names),
+        cancel=cancel
+    )
+    for db, df_def, error in results:
+        if error is not None:
+            failed.append((db, str(error)))
+        else:
+            collector.append(df_def)
+    return collector.to_frame(), failed
+
+
+def table_entry_name(entry):
+    return f"{entry['table_catalog']}.{entry['table_schema']}.{entry['table_name']}"
+
+
+def extract_table_definitions_by_describe(query, database_names, max_workers=DEFAULT_MAX_WORKERS,
+                                          progress=None, cancel=None, scope=None):
+    # 従来方式: テーブル一覧を取得し、テーブルごとに DESCRIBE TABLE を実行する
+    # 戻り値: (df_def_all, failed) ／ failed は [(db または db.schema.table, エラー内容)]
+    failed = []
+    all_tables = ColumnarCollector()
+    results = fetch_parallel(database_names, lambda db: query(f"""
+        SELECT table_catalog, table_schema, table_name
+        FROM {db}.information_schema.tables
+        WHERE table_type = 'BASE TABLE'
+    """ + scope_where_sql(scope, schema="table_schema", table="table_name")), max_workers, on_result=track(progress, database_names, keep=False), cancel=cancel)
+    for db, df, error in results:
+        if error is not None:
+            failed.append((db, str(error)))
+            continue
+        all_tables.append(lower_columns(df), table_catalog=db)
+
+    table_entries = all_tables.to_frame().to_dict("records")
+
+    def_all = ColumnarCollector(DEF_ALL_COLUMNS)
+    results = fetch_parallel(
+        table_entries,
+        lambda entry: describe_table(query, entry["table_catalog"], entry["table_schema"], entry["table_name"]).assign(
+            database_name=entry["table_catalog"], schema_name=entry["table_schema"], table_name=entry["table_name"]
+        ),
+        max_workers,
+        on_result=track(progress, table_entries, table_entry_name),
+        cancel=cancel
+    )
+    for entry, df_def, error in results:
+        if error is not None:
+            failed.append((table_entry_name(entry), str(error)))
+            continue
+        def_all.append(df_def)
+    return def_all.to_frame(), failed
+
+
+# ---- サンプルデータ（遅延取得） ----
+# 定義取得とは切り離し、プレビューで表示するテーブルだけを必要になった時点で取得する。
+# 列数の上限（定義上の先頭から N 列）とバイト数の上限を設け、結果はテーブル単位でキャッシュする。
+# キャッシュ（SampleStore）はセッションのメモリ上限を超えた分をディスクに退避し、退避先も上限を超えたら破棄する。
+
+def sample_sql(db, schema, tbl, columns=None, rows=SAMPLE_ROWS, method="LIMIT"):
+    full_name = f"{escape_identifier(db)}.{escape_identifier(schema)}.{escape_identifier(tbl)}"
+    column_list = ", ".join(escape_identifier(col) for col in columns) if columns else "*"
+    if method == "SAMPLE (n ROWS)":
+        return f"SELECT {column_list} FROM {full_name} SAMPLE ({int(rows)} ROWS)"
+    if method == "SAMPLE SYSTEM (1) + LIMIT":
+        # ブロック単位のサンプリングで読み込むマイクロパーティションを絞る
+        return f"SELECT {column_list} FROM {full_name} SAMPLE SYSTEM (1) LIMIT {int(rows)}"
+    return f"SELECT {column_list} FROM {full_name} LIMIT {int(rows)}"
+
+
+def fetch_sample(query, db, schema, tbl, columns=None, rows=SAMPLE_ROWS, method="LIMIT",
+                 max_columns=SAMPLE_MAX_COLUMNS, max_bytes=SAMPLE_MAX_BYTES):
+    if columns is not None:
+        columns = list(columns)[:max_columns]
+    df = query(sample_sql(db, schema, tbl, columns, rows, method))
+    usage = int(df.memory_usage(deep=True, index=False).sum())
+    if usage > max_bytes and len(df) > 1:
+        df = df.head(max(1, len(df) * max_bytes // usage))
+    return df
+
+
+class SampleStore:
+    # サンプルをテーブル単位で保持する。メモリ上は最近使った順に並べ、上限（budget - reserved）を超えたら
+    # 古いものからセッション専用のディレクトリに pickle で退避し、退避分も上限を超えたら古いものから破棄する
+    def __init__(self, budget=SESSION_MEMORY_BUDGET_BYTES, spill_dir=SAMPLE_SPILL_DIR,
+                 max_spill_bytes=SAMPLE_SPILL_MAX_BYTES):
+        self.budget = budget
+        self.reserved = 0
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.evicted = 0
+        self._memory = OrderedDict()   # key -> (DataFrame, バイト数)
+        self._spilled = OrderedDict()  # key -> (ファイルパス, バイト数)
+        self._dir = None
+        self._finalizer = None
+
+    def __contains__(self, key):
+        return key in self._memory or key in self._spilled
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key][0]
+        if key not in self._spilled:
+            return None
+        path, _ = self._spilled.pop(key)
+        df = pd.read_pickle(path)
+        os.remove(path)
+        self.put(key, df)
+        return df
+
+    def put(self, key, df):
+        self.discard(key)
+        self._memory[key] = (df, int(df.memory_usage(deep=True).sum()))
+        self._enforce()
+
+    def discard(self, key):
+        self._memory.pop(key, None)
+        if key in self._spilled:
+            self._remove_file(self._spilled.pop(key)[0])
+
+    def reserve(self, nbytes):
+        # 定義一覧など、サンプル以外にセッションが保持している分を上限から差し引く
+        self.reserved = int(nbytes)
+        self._enforce()
+
+    def clear(self):
+        self._memory.clear()
+        self._spilled.clear()
+        self.evicted = 0
+        if self._finalizer is not None:
+            self._finalizer()
+            self._dir = self._finalizer = None
+
+    def memory_bytes(self):
+        return sum(nbytes for _, nbytes in self._memory.values())
+
+    def disk_bytes(self):
+        return sum(nbytes for _, nbytes in self._spilled.values())
+
+    def usage(self):
+        return {
+            "budget_bytes": self.budget,
+            "reserved_bytes": self.reserved,
+            "memory_bytes": self.memory_bytes(),
+            "memory_tables": len(self._memory),
+            "disk_bytes": self.disk_bytes(),
+            "disk_tables": len(self._spilled),
+            "evicted_tables": self.evicted,
+        }
+
+    def _enforce(self):
+        # 直近に使った1件は表示中のためメモリに残す
+        limit = max(0, self.budget - self.reserved)
+        memory_bytes = self.memory_bytes()
+        while memory_bytes > limit and len(self._memory) > 1:
+            key, (df, nbytes) = self._memory.popitem(last=False)
+            memory_bytes -= nbytes
+            self._spill(key, df)
+        disk_bytes = self.disk_bytes()
+        while disk_bytes > self.max_spill_bytes and self._spilled:
+            _, (path, nbytes) = self._spilled.popitem(last=False)
+            disk_bytes -= nbytes
+            self._remove_file(path)
+            self.evicted += 1
+
+    def _spill(self, key, df):
+        try:
+            if self._dir is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                self._dir = tempfile.mkdtemp(dir=self.spill_dir)
+                # セッションが破棄されたら退避先のディレクトリも削除する
+                self._finalizer = weakref.finalize(self, shutil.rmtree, self._dir, True)
+            fd, path = tempfile.mkstemp(suffix=".pkl", dir=self._dir)
+            os.close(fd)
+            df.to_pickle(path)
+        except OSError:
+            # 退避できない場合は破棄する（必要になったら取り直す）
+            self.evicted += 1
+            return
+        self._spilled[key] = (path, os.path.getsize(path))
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ---- テーブル定義: 検索インデックスとページング ----
+# プレビューでは全テーブルを描画せず、検索条件に合うテーブルのうち現在ページ分だけを描画する。
+# インデックスは取得直後に1回だけ作り、検索は小文字化済みの列に対するベクトル演算で行う。
+
+def build_definition_search_index(df_def):
+    groups = df_def.groupby(TABLE_KEY_COLUMNS, sort=True, observed=True)
+    table_ids = groups.ngroup().to_numpy()
+    table_keys = list(groups.groups)
+    fields = {
+        # category 列は fillna("") できないため、文字列に戻してから小文字化する
+        col: df_def[col].astype(object).fillna("").astype(str).str.lower()
+        for col in SEARCH_FIELDS.values() if col != "all"
+    }
+    fields["all"] = fields["database_name"]
+    for col in ["schema_name", "table_name", "column_name", "data_type", "comment"]:
+        fields["all"] = fields["all"] + "\t" + fields[col]
+    # テーブルごとの行位置: table_id で安定ソートした並びと、各テーブルの開始・終了位置
+    order = np.argsort(table_ids, kind="stable")
+    bounds = np.searchsorted(table_ids[order], np.arange(len(table_keys) + 1))
+    return {
+        "table_ids": table_ids,
+        "table_keys": table_keys,
+        "key_ids": {key: table_id for table_id, key in enumerate(table_keys)},
+        "fields": fields,
+        "order": order,
+        "bounds": bounds,
+        "hierarchy": build_hierarchy(table_keys),
+    }
+
+
+def search_definitions(index, text, field="all"):
+    # 空白区切りの語をすべて含む行を持つテーブルの table_id を返す
+    terms = str(text).lower().split()
+    if not terms:
+        return np.arange(len(index["table_keys"]))
+    mask = np.ones(len(index["table_ids"]), dtype=bool)
+    for term in terms:
+        mask &= index["fields"][field].str.contains(term, regex=False).to_numpy()
+    return np.unique(index["table_ids"][mask])
+
+
+def definition_rows(index, table_id):
+    return index["order"][index["bounds"][table_id]:index["bounds"][table_id + 1]]
+
+
+# ---- テーブル定義: セッション内のコンパクトな表現 ----
+# セッションに保持する定義一覧は、繰り返しの多い DB / スキーマ / テーブル名・データ型などを category にして持つ。
+# 選択したテーブルの切り出しは (db, schema, table) -> table_id の索引と行位置で行い、列の比較や結合はしない。
+
+def compact_definitions(df_def):
+    return df_def.astype({col: "category" for col in CATALOG_CATEGORY_COLUMNS if col in df_def.columns})
+
+
+def select_definitions(df_def, index, table_keys):
+    # table_keys: [(db, schema, table), ...] ／ 元の行順のまま返す
+    table_ids = [index["key_ids"][key] for key in table_keys if key in index["key_ids"]]
+    if not table_ids:
+        return df_def.iloc[:0]
+    return df_def.iloc[np.sort(np.concatenate([definition_rows(index, table_id) for table_id in table_ids]))]
+
+
+def catalog_memory_usage(df_def, index=None):
+    # 戻り値: {"catalog": 定義一覧のバイト数, "index": 検索インデックスのバイト数}
+    usage = {"catalog": int(df_def.memory_usage(deep=True).sum()), "index": 0}
+    if index is not None:
+        usage["index"] = (
+            sum(int(field.memory_usage(deep=True)) for field in index["fields"].values())
+            + sum(index[name].nbytes for name in ["table_ids", "order", "bounds"])
+        )
+    return usage
+
+
+# ---- 階層ビュー（DB → スキーマ → テーブル） ----
+# 全テーブルを1つの graphviz に載せず、集計件数を表示して選択したレベルだけを展開する。
+# 1回の描画で出すノード数は HIERARCHY_MAX_NODES までに制限する。
+
+def build_hierarchy(table_keys):
+    # {db: {schema: [table, ...]}}（fetch_hierarchy_index と同じ形）
+    hierarchy = {}
+    for db, schema, tbl in table_keys:
+        hierarchy.setdefault(db, {}).setdefault(schema, []).append(tbl)
+    return hierarchy
+
+
+def hierarchy_summary(hierarchy, db=None):
+    if db is None:
+        return pd.DataFrame(
+            [(name, len(schemas), sum(len(tables) for tables in schemas.values())) for name, schemas in hierarchy.items()],
+            columns=["database_name", "schemas", "tables"]
+        )
+    return pd.DataFrame(
+        [(schema, len(tables)) for schema, tables in hierarchy.get(db, {}).items()],
+        columns=["schema_name", "tables"]
+    )
+
+
+def hierarchy_dot(hierarchy, db, schema=None, max_nodes=HIERARCHY_MAX_NODES):
+    def quote(label):
+        return '"' + str(label).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    schemas = hierarchy.get(db, {})
+    dot_lines = ["digraph G {", "rankdir=LR;", 'node [shape=box];']
+    if schema is None:
+        children = [(f"{db}.{name}", f"{name} ({len(tables)})") for name, tables in schemas.items()]
+        parent = db
+    else:
+        dot_lines.append(f"{quote(db)} -> {quote(f'{db}.{schema}')}")
+        dot_lines.append(f"{quote(f'{db}.{schema}')} [label={quote(schema)}];")
+        children = [(f"{db}.{schema}.{tbl}", tbl) for tbl in schemas.get(schema, [])]
+        parent = f"{db}.{schema}"
+    for node, label in children[:max_nodes]:
+        dot_lines.append(f"{quote(node)} [label={quote(label)}];")
+        dot_lines.append(f"{quote(parent)} -> {quote(node)}")
+    if len(children) > max_nodes:
+        dot_lines.append(f'"__more__" [label={quote(f"…他 {len(children) - max_nodes} 件")}, shape=plaintext];')
+        dot_lines.append(f'{quote(parent)} -> "__more__"')
+    dot_lines.append("}")
+    return "\n".join(dot_lines)
@@ -0,0 +1,134 @@
+import os
+import re
+import tempfile
+
+from .common import DEF_COLUMNS, OVERVIEW_COLUMNS, TABLE_KEY_COLUMNS
+
+EXCEL_MAX_ROWS = 1048576
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ---- 出力（Excel / Parquet / CSV / Arrow IPC） ----
+# 各タブの出力は「シート名 -> DataFrame」の並び（シート相当のレイアウト）で表し、形式ごとの書き出しを共通化する。
+# Excel は xlsxwriter の constant_memory モードで行を順に書き出し、ブックはメモリではなく一時ファイルに作る。
+# Parquet / CSV / Arrow IPC はシートごとに1ファイルとして zip にまとめ、文字列化せず型のまま書き出す。
+# ダウンロードには一時ファイルをそのまま渡し、BytesIO.getvalue() による二重コピーを避ける。
+
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": (".xlsx", XLSX_MIME),
+    "Parquet (.zip)": (".zip", "application/zip"),
+    "CSV (.zip)": (".zip", "application/zip"),
+    "Arrow IPC (.zip)": (".zip", "application/zip"),
+}
+
+
+def unique_sheet_name(name, used_sheet_names, max_length=31):
+    # Excel のシート名は31文字まで・大文字小文字を区別しないため、切り詰め後の重複には連番を付ける
+    name = re.sub(r'[:\\/?*\[\]]', '_', str(name))[:max_length] or "Sheet"
+    candidate = name
+    i = 1
+    while candidate.lower() in used_sheet_names:
+        suffix = f"_{i}"
+        candidate = f"{name[:max_length - len(suffix)]}{suffix}"
+        i += 1
+    used_sheet_names.add(candidate.lower())
+    return candidate
+
+
+def iter_table_definition_sheets(df_def, overview_sheet="All_Tables_Overview"):
+    # Sheet1: 一覧 ／ Sheet2〜: テーブルごとの定義
+    yield overview_sheet, df_def[OVERVIEW_COLUMNS].sort_values(TABLE_KEY_COLUMNS + ["column_name"])
+    for (db, schema, tbl), df_group in df_def.groupby(TABLE_KEY_COLUMNS, sort=True, observed=True):
+        yield tbl, df_group[DEF_COLUMNS]
+
+
+def write_sheet_rows(worksheet, df, start_row=0, header_format=None):
+    worksheet.write_row(start_row, 0, [str(col) for col in df.columns], header_format)
+    values = df.astype(object).where(df.notna(), None)
+    for row_num, row in enumerate(values.itertuples(index=False, name=None), start=start_row + 1):
+        worksheet.write_row(row_num, 0, row)
+
+
+def write_sheets_xlsx(sheets, path, col_widths=None):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "tmpdir": tempfile.gettempdir(),
+        "remove_timezone": True,
+    })
+    header_format = workbook.add_format({"bold": True})
+    used_sheet_names = set()
+    chunk_rows = EXCEL_MAX_ROWS - 1
+    for name, df in sheets:
+        # Excel の行数上限を超えるシートは続きのシートに分割
+        for part, start in enumerate(range(0, max(len(df), 1), chunk_rows), start=1):
+            sheet_name = name if part == 1 else f"{name}_{part}"
+            worksheet = workbook.add_worksheet(unique_sheet_name(sheet_name, used_sheet_names))
+            for i, width in enumerate(col_widths or []):
+                worksheet.set_column(i, i, width)
+            write_sheet_rows(worksheet, df.iloc[start:start + chunk_rows], header_format=header_format)
+    workbook.close()
+
+
+def to_arrow_table(df):
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # 型が混在する列だけ文字列に変換する
+        df = df.copy()
+        for col in df.columns:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].astype(str).where(df[col].notna(), None)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_sheets_zip(sheets, path, export_format):
+    import zipfile
+
+    extension = {"Parquet (.zip)": ".parquet", "CSV (.zip)": ".csv", "Arrow IPC (.zip)": ".arrow"}[export_format]
+    # Parquet / Arrow は書き出し側で圧縮済みのため zip では再圧縮しない
+    compression = zipfile.ZIP_DEFLATED if extension == ".csv" else zipfile.ZIP_STORED
+    used_file_names = set()
+    with zipfile.ZipFile(path, "w", compression=compression, allowZip64=True) as zf:
+        for name, df in sheets:
+            file_name = unique_sheet_name(name, used_file_names, max_length=200) + extension
+            with zf.open(file_name, "w", force_zip64=True) as f:
+                if extension == ".csv":
+                    df.to_csv(f, index=False, encoding="utf-8-sig")
+                elif extension == ".parquet":
+                    import pyarrow.parquet as pq
+                    pq.write_table(to_arrow_table(df), f)
+                else:
+                    import pyarrow as pa
+                    table = to_arrow_table(df)
+                    with pa.ipc.new_file(f, table.schema) as writer:
+                        writer.write_table(table)
+
+
+def write_sheets(sheets, path, export_format="Excel (.xlsx)", col_widths=None):
+    if export_format == "Excel (.xlsx)":
+        write_sheets_xlsx(sheets, path, col_widths=col_widths)
+    else:
+        write_sheets_zip(sheets, path, export_format)
+
+
+def export_to_tempfile(write, data, suffix, **kwargs):
+    # write(data, path, ...) で一時ファイルに書き出し、そのパスを返す（削除は download_tempfile 側）
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        write(data, path, **kwargs)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def export_sheets(sheets, export_format, **kwargs):
+    suffix, mime = EXPORT_FORMATS[export_format]
+    return export_to_tempfile(write_sheets, sheets, suffix, export_format=export_format, **kwargs), suffix, mime
@@ -0,0 +1,576 @@
+import random
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from snowflake.connector.errors import NotSupportedError, ProgrammingError
+
+from .common import EXCLUDED_DATABASES, SHOW_MAX_ROWS
+from .compute import NO_WAREHOUSE_ERRNO, needs_compute
+from .scope import like_to_regex
+
+FAKE_ERRNO = 2003
+FAKE_CANCELED_ERRNO = 604
+FAKE_ARROW_BATCH_ROWS = 10000
+FAKE_COLUMN_TYPES = [
+    # (data_type, character_maximum_length, numeric_precision, numeric_scale, datetime_precision, DESCRIBE 表記)
+    ("NUMBER", None, 38, 0, None, "NUMBER(38,0)"),
+    ("TEXT", 16777216, None, None, None, "VARCHAR(16777216)"),
+    ("TIMESTAMP_NTZ", None, None, None, 9, "TIMESTAMP_NTZ(9)"),
+    ("BOOLEAN", None, None, None, None, "BOOLEAN"),
+    ("DATE", None, None, None, None, "DATE"),
+    ("FLOAT", None, None, None, None, "FLOAT"),
+]
+FAKE_PARAMETERS = [
+    ("ABORT_DETACHED_QUERY", "false", "BOOLEAN"),
+    ("AUTOCOMMIT", "true", "BOOLEAN"),
+    ("DATA_RETENTION_TIME_IN_DAYS", "1", "NUMBER"),
+    ("MAX_CONCURRENCY_LEVEL", "8", "NUMBER"),
+    ("QUERY_TAG", "", "STRING"),
+    ("STATEMENT_QUEUED_TIMEOUT_IN_SECONDS", "0", "NUMBER"),
+    ("STATEMENT_TIMEOUT_IN_SECONDS", "172800", "NUMBER"),
+    ("TIMEZONE", "America/Los_Angeles", "STRING"),
+    ("TIMESTAMP_OUTPUT_FORMAT", "YYYY-MM-DD HH24:MI:SS.FF3 TZHTZM", "STRING"),
+    ("USE_CACHED_RESULT", "true", "BOOLEAN"),
+]
+FAKE_PARAMETER_LEVELS = {
+    "ACCOUNT": [name for name, _, _ in FAKE_PARAMETERS],
+    "SESSION": [name for name, _, _ in FAKE_PARAMETERS],
+    "DATABASE": ["DATA_RETENTION_TIME_IN_DAYS", "MAX_DATA_EXTENSION_TIME_IN_DAYS", "DEFAULT_DDL_COLLATION"],
+    "WAREHOUSE": ["MAX_CONCURRENCY_LEVEL", "STATEMENT_QUEUED_TIMEOUT_IN_SECONDS", "STATEMENT_TIMEOUT_IN_SECONDS"],
+}
+FAKE_PRIVILEGES = {
+    "DATABASE": ["OWNERSHIP", "USAGE", "MONITOR", "CREATE SCHEMA"],
+    "SCHEMA": ["OWNERSHIP", "USAGE", "CREATE TABLE", "MONITOR"],
+    "TABLE": ["OWNERSHIP", "SELECT", "INSERT", "UPDATE", "DELETE"],
+}
+IDENTIFIER = r'(?:"(?:[^"]|"")*"|[A-Za-z0-9_$]+)'
+
+
+# ---- 疑似アカウント ----
+# 実アカウントなしで性能を測るための合成メタデータ。DB・スキーマ・テーブル・カラム・ウェアハウス・権限の
+# 件数を指定して、INFORMATION_SCHEMA / ACCOUNT_USAGE / SHOW と同じ形の DataFrame を作る。
+
+class FakeAccount:
+    def __init__(self, databases=3, schemas=3, tables=10, columns=8, warehouses=2, roles=10,
+                 grants_per_object=3, seed=0):
+        rng = np.random.default_rng(seed)
+        self.roles = ["ACCOUNTADMIN", "SYSADMIN", "PUBLIC"] + [f"ROLE_{i:03d}" for i in range(max(0, roles - 3))]
+        self.warehouses = [f"WH_{i:03d}" for i in range(warehouses)]
+        self.databases = [f"DB_{i:03d}" for i in range(databases)]
+        now = pd.Timestamp("2024-01-01", tz="UTC")
+
+        db_col = np.repeat(self.databases, schemas)
+        self.schemas = pd.DataFrame({
+            "database_name": db_col,
+            "name": np.tile([f"SCHEMA_{i:03d}" for i in range(schemas)], databases),
+        })
+        n_tables = len(self.schemas) * tables
+        created = now + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, n_tables), unit="s")
+        self.tables = pd.DataFrame({
+            "database_name": np.repeat(self.schemas["database_name"].to_numpy(), tables),
+            "schema_name": np.repeat(self.schemas["name"].to_numpy(), tables),
+            "table_name": np.tile([f"TABLE_{i:04d}" for i in range(tables)], len(self.schemas)),
+            "created": created,
+            "last_altered": created + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, n_tables), unit="s"),
+        })
+
+        type_ids = rng.integers(0, len(FAKE_COLUMN_TYPES), n_tables * columns)
+        types = pd.DataFrame(FAKE_COLUMN_TYPES, columns=[
+            "DATA_TYPE", "CHARACTER_MAXIMUM_LENGTH", "NUMERIC_PRECISION", "NUMERIC_SCALE", "DATETIME_PRECISION", "DESCRIBE_TYPE"
+        ]).iloc[type_ids].reset_index(drop=True)
+        self.columns = pd.concat([pd.DataFrame({
+            "TABLE_CATALOG": np.repeat(self.tables["database_name"].to_numpy(), columns),
+            "TABLE_SCHEMA": np.repeat(self.tables["schema_name"].to_numpy(), columns),
+            "TABLE_NAME": np.repeat(self.tables["table_name"].to_numpy(), columns),
+            "COLUMN_NAME": np.tile([f"COL_{i:03d}" for i in range(columns)], n_tables),
+            "ORDINAL_POSITION": np.tile(np.arange(1, columns + 1), n_tables),
+        }), types], axis=1)
+        self.columns["IS_NULLABLE"] = np.where(self.columns["ORDINAL_POSITION"] == 1, "NO", "YES")
+        self.columns["COMMENT"] = np.where(rng.random(len(self.columns)) < 0.3, "synthetic column", None)
+        # 先頭カラムを主キーとする
+        self.primary_keys = self.columns[self.columns["ORDINAL_POSITION"] == 1].rename(columns={
+            "TABLE_CATALOG": "database_name", "TABLE_SCHEMA": "schema_name",
+            "TABLE_NAME": "table_name", "COLUMN_NAME": "column_name",
+        })[["database_name", "schema_name", "table_name", "column_name"]].reset_index(drop=True)
+
+        self.grants = self._generate_grants(rng, grants_per_object, now)
+        self.role_grants = self._generate_role_grants(np.random.default_rng(seed + 1), now)
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def _generate_grants(self, rng, grants_per_object, now):
+        objects = pd.concat([
+            pd.DataFrame({"GRANTED_ON": "DATABASE", "NAME": self.databases, "TABLE_CATALOG": self.databases, "TABLE_SCHEMA": None}),
+            pd.DataFrame({
+                "GRANTED_ON": "SCHEMA", "NAME": self.schemas["name"],
+                "TABLE_CATALOG": self.schemas["database_name"], "TABLE_SCHEMA": self.schemas["name"],
+            }),
+            pd.DataFrame({
+                "GRANTED_ON": "TABLE", "NAME": self.tables["table_name"],
+                "TABLE_CATALOG": self.tables["database_name"], "TABLE_SCHEMA": self.tables["schema_name"],
+            }),
+        ], ignore_index=True)
+        grants = objects.loc[objects.index.repeat(grants_per_object)].reset_index(drop=True)
+        slot = np.tile(np.arange(grants_per_object), len(objects))
+        privileges = {level: np.array(names) for level, names in FAKE_PRIVILEGES.items()}
+        grants["PRIVILEGE"] = [privileges[level][i % len(privileges[level])] for level, i in zip(grants["GRANTED_ON"], slot)]
+        grants["GRANTEE_NAME"] = np.array(self.roles)[rng.integers(0, len(self.roles), len(grants))]
+        grants["GRANTED_TO"] = "ROLE"
+        grants["GRANT_OPTION"] = "false"
+        grants["GRANTED_BY"] = "SYSADMIN"
+        grants["CREATED_ON"] = now + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, len(grants)), unit="s")
+        grants["MODIFIED_ON"] = grants["CREATED_ON"]
+        grants["DELETED_ON"] = pd.Series(pd.NaT, index=grants.index, dtype="datetime64[ns, UTC]")
+        return grants.drop_duplicates(["PRIVILEGE", "GRANTED_ON", "NAME", "TABLE_CATALOG", "TABLE_SCHEMA", "GRANTEE_NAME"])
+
+    def _generate_role_grants(self, rng, now):
+        # SYSADMIN → ACCOUNTADMIN、カスタムロールは SYSADMIN か自分より前のカスタムロールに付与した木構造
+        # （PUBLIC はすべてのロールが暗黙に継承するため付与しない）
+        custom = self.roles[3:]
+        parents = [
+            "SYSADMIN" if i == 0 or rng.random() < 0.3 else custom[rng.integers(0, i)] for i in range(len(custom))
+        ]
+        names = (["SYSADMIN"] if "SYSADMIN" in self.roles else []) + custom
+        grantees = (["ACCOUNTADMIN"] if "SYSADMIN" in self.roles else []) + parents
+        return pd.DataFrame({
+            "CREATED_ON": now, "MODIFIED_ON": now,
+            "DELETED_ON": pd.Series(pd.NaT, index=range(len(names)), dtype="datetime64[ns, UTC]"),
+            "PRIVILEGE": "USAGE", "GRANTED_ON": "ROLE", "NAME": names, "TABLE_CATALOG": None, "TABLE_SCHEMA": None,
+            "GRANTED_TO": "ROLE", "GRANTEE_NAME": grantees, "GRANT_OPTION": "false", "GRANTED_BY": "SECURITYADMIN",
+        })
+
+    def group(self, name, df, keys):
+        # SHOW GRANTS / DESCRIBE などオブジェクト単位の参照用に、初回だけ groupby しておく
+        with self._lock:
+            if name not in self._groups:
+                self._groups[name] = {key: part for key, part in df.groupby(keys, sort=False)}
+            return self._groups[name]
+
+
+# ---- 疑似バックエンド ----
+# SQL を正規表現で振り分けて FakeAccount から結果を返す。クエリごとに遅延（固定 + ゆらぎ）と
+# 失敗（確率・パターン指定）を注入でき、発行回数・失敗回数・注入した遅延の合計を記録する。
+
+def unquote(name):
+    if name.startswith('"') and name.endswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name.upper()
+
+
+def split_name(name):
+    return [unquote(part) for part in re.findall(IDENTIFIER, name)]
+
+
+def apply_ilike_predicates(df, sql, columns=None):
+    # WHERE 句の "[NOT] col ILIKE ANY ('p1', ...)" を再現する ／ columns: {SQL の列名: df の列名}
+    for negate, col, patterns in re.findall(
+        r"(NOT )?(?:\w+\.)?(\w+) ILIKE ANY \(((?:'(?:[^'\\]|\\.)*'(?:, )?)+)\)", sql, re.IGNORECASE
+    ):
+        target = (columns or {}).get(col.lower(), col.upper())
+        regex = "|".join(like_to_regex(p) for p in re.findall(r"'((?:[^'\\]|\\.)*)'", patterns))
+        matched = df[target].astype(str).str.fullmatch(f"(?:{regex})", case=False)
+        df = df[~matched if negate else matched]
+    return df
+
+
+class FakeBackend:
+    def __init__(self, account, latency=0.0, jitter=0.0, failure_rate=0.0, fail_pattern=None, seed=0):
+        self.account = account
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_pattern = re.compile(fail_pattern, re.IGNORECASE) if fail_pattern else None
+        self.role = "ACCOUNTADMIN"
+        # セッションのウェアハウス（None ならウェアハウスを使う文は 606 で失敗）と各ウェアハウスの状態
+        self.warehouse = account.warehouses[0] if account.warehouses else None
+        self.warehouse_states = {wh: "SUSPENDED" for wh in account.warehouses}
+        self.query_count = 0
+        self.failure_count = 0
+        self.injected_latency = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._async_queries = {}
+
+    def connect(self, **params):
+        # snowflake.connector.connect の代わりに ConnectionManager へ渡せる
+        if "warehouse" in params:
+            self.warehouse = params["warehouse"]
+        return FakeConnection(self)
+
+    def execute(self, sql, canceled=None):
+        with self._lock:
+            self.query_count += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self._random.random() < self.failure_rate
+            self.injected_latency += delay
+        if canceled is not None:
+            if canceled.wait(delay):
+                raise ProgrammingError(msg="SQL execution canceled", errno=FAKE_CANCELED_ERRNO)
+        elif delay:
+            time.sleep(delay)
+        if fail or (self.fail_pattern is not None and self.fail_pattern.search(sql)):
+            with self._lock:
+                self.failure_count += 1
+            raise ProgrammingError(msg=f"Injected failure: {sql.strip()[:80]}", errno=FAKE_ERRNO)
+        if needs_compute(sql):
+            # ウェアハウスを使う文: 未指定なら失敗し、停止中なら自動再開（AUTO_RESUME）する
+            if self.warehouse is None:
+                raise ProgrammingError(msg="No active warehouse selected in the current session.", errno=NO_WAREHOUSE_ERRNO)
+            with self._lock:
+                self.warehouse_states[self.warehouse] = "STARTED"
+        return self.route(" ".join(sql.split()))
+
+    def execute_async(self, sql, query_id):
+        # 別スレッドで実行し、状態は get_status / SYSTEM$CANCEL_QUERY から参照・操作する
+        entry = {"canceled": threading.Event(), "done": threading.Event(), "result": None, "error": None}
+        with self._lock:
+            self._async_queries[query_id] = entry
+
+        def run():
+            try:
+                entry["result"] = self.execute(sql, entry["canceled"])
+            except ProgrammingError as e:
+                entry["error"] = e
+            entry["done"].set()
+        threading.Thread(target=run, daemon=True).start()
+
+    def async_entry(self, query_id):
+        with self._lock:
+            entry = self._async_queries.get(query_id)
+        if entry is None:
+            raise ProgrammingError(msg=f"Query '{query_id}' not found", errno=FAKE_ERRNO)
+        return entry
+
+    def cancel_query(self, query_id):
+        with self._lock:
+            entry = self._async_queries.get(query_id)
+        if entry is not None:
+            entry["canceled"].set()
+        return pd.DataFrame({f"SYSTEM$CANCEL_QUERY('{query_id}')": [f"query [{query_id}] terminated."]})
+
+    def route(self, sql):
+        account = self.account
+        upper = sql.upper()
+        m = re.match(r"SHOW PARAMETERS IN (ACCOUNT|SESSION|DATABASE|WAREHOUSE)\s*(.*)$", upper)
+        if m:
+            return self.show_parameters(m.group(1), split_name(sql[m.start(2):]))
+        m = re.match(r"(SHOW \w+) LIKE '((?:[^'\\]|\\.)*)'(.*)$", sql, re.IGNORECASE)
+        if m:
+            # SHOW ... LIKE '<pattern>' は LIKE なしの結果を name 列で絞り込む
+            df = self.route(m.group(1) + m.group(3))
+            return df[df["name"].astype(str).str.fullmatch(like_to_regex(m.group(2)), case=False)].reset_index(drop=True)
+        if upper.startswith("SHOW DATABASES"):
+            return pd.DataFrame({
+                "created_on": pd.Timestamp("2024-01-01", tz="UTC"), "name": account.databases,
+                "is_default": "N", "owner": "SYSADMIN",
+            })
+        if upper.startswith("SHOW WAREHOUSES"):
+            return pd.DataFrame({
+                "name": account.warehouses, "state": [self.warehouse_states[wh] for wh in account.warehouses],
+                "size": "X-Small",
+            })
+        m = re.match(rf"ALTER WAREHOUSE ({IDENTIFIER}) (RESUME|SUSPEND)", sql, re.IGNORECASE)
+        if m:
+            wh = unquote(m.group(1))
+            if wh not in self.warehouse_states:
+                raise self.not_found("Warehouse", wh)
+            with self._lock:
+                self.warehouse_states[wh] = "STARTED" if m.group(2).upper() == "RESUME" else "SUSPENDED"
+            return pd.DataFrame({"status": ["Statement executed successfully."]})
+        if upper.startswith("SHOW ROLES"):
+            return pd.DataFrame({"created_on": pd.Timestamp("2024-01-01", tz="UTC"), "name": account.roles})
+        if upper.startswith("SHOW SCHEMAS IN ACCOUNT"):
+            return account.schemas.head(SHOW_MAX_ROWS).assign(created_on=pd.Timestamp("2024-01-01", tz="UTC"))
+        if upper.startswith("SHOW SCHEMAS IN DATABASE"):
+            db = split_name(sql[len("SHOW SCHEMAS IN DATABASE"):])[0]
+            if db not in account.databases:
+                raise self.not_found("Database", db)
+            return account.schemas[account.schemas["database_name"] == db].reset_index(drop=True)
+        if upper.startswith("SHOW TABLES IN ACCOUNT"):
+            return account.tables.head(SHOW_MAX_ROWS).rename(columns={"table_name": "name"}).assign(kind="TABLE")
+        if upper.startswith("SHOW TABLES IN DATABASE"):
+            db = split_name(sql[len("SHOW TABLES IN DATABASE"):])[0]
+            tables = account.tables[account.tables["database_name"] == db]
+            return tables.head(SHOW_MAX_ROWS).rename(columns={"table_name": "name"}).reset_index(drop=True)
+        if upper.startswith("SHOW TABLES IN SCHEMA"):
+            db, schema = split_name(sql[len("SHOW TABLES IN SCHEMA"):])[:2]
+            tables = account.tables
+            return tables[(tables["database_name"] == db) & (tables["schema_name"] == schema)].rename(columns={"table_name": "name"})
+        if upper.startswith("SHOW PRIMARY KEYS"):
+            return account.primary_keys.assign(created_on=pd.Timestamp("2024-01-01", tz="UTC"))
+        if upper.startswith("SHOW GRANTS OF ROLE"):
+            role = split_name(sql[len("SHOW GRANTS OF ROLE"):])[0]
+            if role not in account.roles:
+                raise self.not_found("Role", role)
+            df = account.role_grants[account.role_grants["NAME"] == role]
+            return pd.DataFrame({
+                "created_on": df["CREATED_ON"].values, "role": role, "granted_to": df["GRANTED_TO"].values,
+                "grantee_name": df["GRANTEE_NAME"].values, "granted_by": df["GRANTED_BY"].values,
+            })
+        m = re.match(r"SHOW GRANTS ON (DATABASE|SCHEMA|TABLE) (.*)$", upper)
+        if m:
+            return self.show_grants(m.group(1), split_name(sql[m.start(2):]))
+        if upper.startswith("DESCRIBE TABLE"):
+            return self.describe_table(split_name(sql[len("DESCRIBE TABLE"):]))
+        if upper.startswith(("ALTER ", "USE ")):
+            if upper.startswith("USE ROLE"):
+                self.role = split_name(sql[len("USE ROLE"):])[0]
+            return pd.DataFrame({"status": ["Statement executed successfully."]})
+        m = re.match(r"SELECT SYSTEM\$CANCEL_QUERY\('([^']*)'\)", sql, re.IGNORECASE)
+        if m:
+            return self.cancel_query(m.group(1))
+        if upper in ("SELECT 1", "SELECT CURRENT_ROLE()"):
+            return pd.DataFrame({upper[len("SELECT "):]: [1 if upper == "SELECT 1" else self.role]})
+        if upper == "SELECT CURRENT_WAREHOUSE()":
+            return pd.DataFrame({"CURRENT_WAREHOUSE()": [self.warehouse]})
+        if "ACCOUNT_USAGE.COLUMNS" in upper:
+            columns = account.columns[~account.columns["TABLE_CATALOG"].isin(EXCLUDED_DATABASES)]
+            return self.columns_frame(apply_ilike_predicates(columns, sql))
+        if "ACCOUNT_USAGE.GRANTS_TO_ROLES" in upper:
+            return self.grants_to_roles(sql)
+        m = re.search(rf"FROM ({IDENTIFIER})\.INFORMATION_SCHEMA\.(COLUMNS|TABLES|SCHEMATA)", sql, re.IGNORECASE)
+        if m:
+            return self.information_schema(unquote(m.group(1)), m.group(2).upper(), sql)
+        m = re.match(rf"SELECT (.*?) FROM ({IDENTIFIER}\.{IDENTIFIER}\.{IDENTIFIER})(?:.*?(?:LIMIT|SAMPLE \()\s*(\d+))?", sql, re.IGNORECASE)
+        if m:
+            return self.sample(split_name(m.group(2)), m.group(1), int(m.group(3) or 10))
+        raise ProgrammingError(msg=f"SQL compilation error: unsupported statement: {sql[:80]}", errno=FAKE_ERRNO)
+
+    def not_found(self, kind, name):
+        return ProgrammingError(msg=f"{kind} '{name}' does not exist or not authorized.", errno=FAKE_ERRNO)
+
+    def show_parameters(self, level, names):
+        if level == "DATABASE" and names[0] not in self.account.databases:
+            raise self.not_found("Database", names[0])
+        if level == "WAREHOUSE" and names[0] not in self.account.warehouses:
+            raise self.not_found("Warehouse", names[0])
+        defaults = {name: (default, kind) for name, default, kind in FAKE_PARAMETERS}
+        keys = FAKE_PARAMETER_LEVELS[level]
+        return pd.DataFrame({
+            "key": keys,
+            "value": [defaults.get(key, ("", "STRING"))[0] for key in keys],
+            "default": [defaults.get(key, ("", "STRING"))[0] for key in keys],
+            "level": "",
+            "description": [f"{key} (synthetic)" for key in keys],
+            "type": [defaults.get(key, ("", "STRING"))[1] for key in keys],
+        })
+
+    def show_grants(self, level, names):
+        grants = self.account.grants
+        if level == "DATABASE":
+            key = (level, names[0], names[0])
+        else:
+            key = (level, names[-1], names[0])
+        groups = self.account.group("grants", grants, ["GRANTED_ON", "NAME", "TABLE_CATALOG"])
+        df = groups.get(key, grants.iloc[0:0])
+        if level == "TABLE":
+            df = df[df["TABLE_SCHEMA"] == names[1]]
+        return pd.DataFrame({
+            "created_on": df["CREATED_ON"].values,
+            "privilege": df["PRIVILEGE"].values,
+            "granted_on": df["GRANTED_ON"].values,
+            "name": ".".join(names),
+            "granted_to": df["GRANTED_TO"].values,
+            "grantee_name": df["GRANTEE_NAME"].values,
+            "grant_option": df["GRANT_OPTION"].values,
+            "granted_by": df["GRANTED_BY"].values,
+        })
+
+    def describe_table(self, names):
+        groups = self.account.group("columns", self.account.columns, ["TABLE_CATALOG", "TABLE_SCHEMA", "TABLE_NAME"])
+        df = groups.get(tuple(names))
+        if df is None:
+            raise self.not_found("Table", ".".join(names))
+        return pd.DataFrame({
+            "name": df["COLUMN_NAME"].values,
+            "type": df["DESCRIBE_TYPE"].values,
+            "kind": "COLUMN",
+            "null?": np.where(df["IS_NULLABLE"] == "YES", "Y", "N"),
+            "default": None,
+            "primary key": np.where(df["ORDINAL_POSITION"] == 1, "Y", "N"),
+            "unique key": "N",
+            "check": None,
+            "expression": None,
+            "comment": df["COMMENT"].values,
+        })
+
+    def columns_frame(self, columns):
+        return columns.drop(columns="DESCRIBE_TYPE").reset_index(drop=True)
+
+    def information_schema(self, db, view, sql):
+        account = self.account
+        if db not in account.databases:
+            raise self.not_found("Database", db)
+        if view == "SCHEMATA":
+            schemas = apply_ilike_predicates(
+                account.schemas[account.schemas["database_name"] == db], sql, {"schema_name": "name"}
+            )
+            return pd.DataFrame({"DATABASE_NAME": schemas["database_name"].values, "NAME": schemas["name"].values})
+        if view == "COLUMNS":
+            groups = account.group("columns_by_db", account.columns, ["TABLE_CATALOG"])
+            columns = apply_ilike_predicates(groups.get((db,), account.columns.iloc[0:0]), sql)
+            m = re.search(r"table_name\) IN \((.*)\)$", sql, re.MULTILINE | re.IGNORECASE)
+            pairs = re.findall(r"\('((?:[^'\\]|\\.)*)', '((?:[^'\\]|\\.)*)'\)", m.group(1)) if m else []
+            if pairs:
+                keys = pd.MultiIndex.from_frame(columns[["TABLE_SCHEMA", "TABLE_NAME"]])
+                columns = columns[keys.isin(pairs)]
+            return self.columns_frame(columns)
+        tables = apply_ilike_predicates(
+            account.tables[account.tables["database_name"] == db], sql,
+            {"table_catalog": "database_name", "table_schema": "schema_name", "table_name": "table_name"}
+        )
+        upper = sql.upper()
+        if "AS NAME" in upper:
+            return pd.DataFrame({
+                "DATABASE_NAME": tables["database_name"].values, "SCHEMA_NAME": tables["schema_name"].values,
+                "NAME": tables["table_name"].values,
+            })
+        if "LAST_ALTERED" in upper:
+            return pd.DataFrame({
+                "DATABASE_NAME": tables["database_name"].values, "SCHEMA_NAME": tables["schema_name"].values,
+                "TABLE_NAME": tables["table_name"].values,
+                "CREATED": tables["created"].values, "LAST_ALTERED": tables["last_altered"].values,
+            })
+        return pd.DataFrame({
+            "TABLE_CATALOG": tables["database_name"].values, "TABLE_SCHEMA": tables["schema_name"].values,
+            "TABLE_NAME": tables["table_name"].values,
+        })
+
+    def grants_to_roles(self, sql):
+        grants = pd.concat([self.account.grants, self.account.role_grants], ignore_index=True)
+        m = re.search(r"modified_on >= TO_TIMESTAMP_LTZ\('([^']*)'\)", sql, re.IGNORECASE)
+        if m:
+            since = pd.Timestamp(m.group(1))
+            if since.tzinfo is None:
+                since = since.tz_localize("UTC")
+            grants = grants[(grants["MODIFIED_ON"] >= since) | (grants["DELETED_ON"] >= since)]
+        columns = [
+            "CREATED_ON", "MODIFIED_ON", "DELETED_ON", "PRIVILEGE", "GRANTED_ON", "NAME", "TABLE_CATALOG", "TABLE_SCHEMA",
+            "GRANTED_TO", "GRANTEE_NAME", "GRANT_OPTION", "GRANTED_BY",
+        ]
+        return grants[columns].reset_index(drop=True)
+
+    def sample(self, names, column_list, rows):
+        groups = self.account.group("columns", self.account.columns, ["TABLE_CATALOG", "TABLE_SCHEMA", "TABLE_NAME"])
+        df = groups.get(tuple(names))
+        if df is None:
+            raise self.not_found("Table", ".".join(names))
+        columns = df["COLUMN_NAME"].tolist() if column_list.strip() == "*" else split_name(column_list)
+        return pd.DataFrame({col: [f"{col.lower()}_{i}" for i in range(rows)] for col in columns})
+
+
+# ---- 疑似コネクタ / Snowpark ----
+# snowflake.connector の cursor と Snowpark の session.sql(...).to_pandas() の代わり。
+# SELECT の結果は Arrow と同様に fetch_pandas_batches で分割して返し、SHOW / DESCRIBE などは
+# 実コネクタと同じく NotSupportedError にして fetchall() 側の経路を通す。
+
+class FakeCursor:
+    def __init__(self, backend, connection=None):
+        self.backend = backend
+        self.connection = connection
+        self.description = None
+        self.sfqid = None
+        self.rowcount = None
+        self._result = None
+        self._arrow = False
+
+    def execute(self, sql):
+        self.sfqid = str(uuid.uuid4())
+        self._set_result(self.backend.execute(sql), sql)
+        return self
+
+    def execute_async(self, sql):
+        self.sfqid = str(uuid.uuid4())
+        self._async_sql = sql
+        self.backend.execute_async(sql, self.sfqid)
+        return {"queryId": self.sfqid}
+
+    def query_result(self, query_id):
+        entry = self.backend.async_entry(query_id)
+        if entry["error"] is not None:
+            raise entry["error"]
+        self.sfqid = query_id
+        self._set_result(entry["result"], self._async_sql)
+        return self
+
+    def _set_result(self, result, sql):
+        self._result = result
+        self._arrow = sql.lstrip().upper().startswith("SELECT")
+        self.description = [(col,) for col in result.columns]
+        self.rowcount = len(result)
+
+    def fetch_pandas_batches(self):
+        if not self._arrow:
+            raise NotSupportedError("Unknown result format")
+        for start in range(0, len(self._result), FAKE_ARROW_BATCH_ROWS):
+            yield self._result.iloc[start:start + FAKE_ARROW_BATCH_ROWS].reset_index(drop=True)
+
+    def fetch_pandas_all(self):
+        return self._result
+
+    def fetchall(self):
+        return list(self._result.itertuples(index=False, name=None))
+
+    def close(self):
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeConnection:
+    def __init__(self, backend):
+        self.backend = backend
+        self._closed = False
+
+    def cursor(self):
+        return FakeCursor(self.backend, self)
+
+    def get_query_status_throw_if_error(self, query_id):
+        entry = self.backend.async_entry(query_id)
+        if not entry["done"].is_set():
+            return "RUNNING"
+        if entry["error"] is not None:
+            raise entry["error"]
+        return "SUCCESS"
+
+    @staticmethod
+    def is_still_running(status):
+        return status == "RUNNING"
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+
+class FakeDataFrame:
+    def __init__(self, backend, sql):
+        self.backend = backend
+        self.query = sql
+
+    def to_pandas(self):
+        return self.backend.execute(self.query)
+
+    def collect(self):
+        return self.to_pandas().to_dict("records")
+
+
+class FakeSession:
+    def __init__(self, backend):
+        self.backend = backend
+        self.connection = FakeConnection(backend)
+
+    def sql(self, sql):
+        return FakeDataFrame(self.backend, sql)
+
+    def close(self):
+        self.connection.close()
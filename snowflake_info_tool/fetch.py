@@ -0,0 +1,230 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .common import DEFAULT_MAX_WORKERS
+
+METADATA_CACHE_TTL = 600
+METADATA_CACHE_MAX_ENTRIES = 512
+
+
+# ---- 並列取得プール ----
+# SHOW / DESCRIBE などのメタデータ取得を、並列数を上限としたスレッドプールで実行する。
+# 結果は入力順に (item, result, error) で返すため、出力順は常に一定。
+# ワーカースレッドからは st.* を呼ばず、失敗はメインスレッドでまとめて表示する。
+# on_result(item, result, error) は完了順にメインスレッドで呼ぶ（進捗・途中結果の表示用）。
+# cancel（threading.Event）がセットされたら未着手の項目は実行せず、完了済みの分だけを返す。
+
+def fetch_parallel(items, fetch, max_workers=DEFAULT_MAX_WORKERS, on_result=None, cancel=None):
+    def run(item):
+        try:
+            return item, fetch(item), None
+        except Exception as e:
+            return item, None, e
+
+    items = list(items)
+    outcomes = [None] * len(items)
+
+    def complete(index, outcome):
+        # 中止で打ち切られた項目は未完了として扱い、失敗には数えない
+        if isinstance(outcome[2], QueryCancelled):
+            return
+        outcomes[index] = outcome
+        if on_result is not None:
+            on_result(*outcome)
+
+    if cancel is not None and cancel.is_set():
+        return []
+    if max_workers <= 1 or len(items) <= 1:
+        for index, item in enumerate(items):
+            if cancel is not None and cancel.is_set():
+                break
+            complete(index, run(item))
+    else:
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(items)))
+        try:
+            futures = {executor.submit(run, item): index for index, item in enumerate(items)}
+            for future in as_completed(futures):
+                complete(futures[future], future.result())
+                if cancel is not None and cancel.is_set():
+                    break
+        except BaseException:
+            # 画面の再実行などで中断された場合も、実行中のクエリを止めてから抜ける
+            if cancel is not None:
+                cancel.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return [outcome for outcome in outcomes if outcome is not None]
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+# ---- 進捗 ----
+# 複数の並列取得をまたいで「完了数 / 全体数」と失敗数を数え、完了ごとに
+# callback(progress, key, result, error) を呼ぶ。keep=False の段階（一覧取得など）は result を渡さない。
+
+class Progress:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+
+    def step(self, key, result=None, error=None):
+        self.done += 1
+        if error is not None:
+            self.failed += 1
+        if self.callback is not None:
+            self.callback(self, key, result, error)
+
+    def track(self, items, label=str, keep=True):
+        # fetch_parallel の on_result に渡すコールバックを返す
+        self.total += len(items)
+
+        def on_result(item, result, error):
+            self.step(label(item), result if keep else None, error)
+        return on_result
+
+
+def track(progress, items, label=str, keep=True):
+    return None if progress is None else progress.track(items, label, keep)
+
+
+# ---- 結果の取得（Arrow） ----
+# fetchall() で1行ずつ Python のタプルを作ってから DataFrame に変換する代わりに、
+# 結果形式が Arrow のクエリは fetch_pandas_batches で列指向のまま受け取る。
+# SHOW / DESCRIBE など Arrow 形式で返らない結果は fetchall() にフォールバックする。
+
+def fetch_frame(cursor):
+    from snowflake.connector.errors import NotSupportedError
+
+    columns = [col[0] for col in cursor.description]
+    try:
+        batches = list(cursor.fetch_pandas_batches())
+    except NotSupportedError:
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    batches = [batch for batch in batches if not batch.empty]
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    if len(batches) == 1:
+        return batches[0]
+    return pd.concat(batches, ignore_index=True)
+
+
+def make_cursor_query(conn):
+    # コネクタの cursor はスレッド間で共有できないため、ワーカーごとに cursor を持つ
+    local = threading.local()
+
+    def query(sql):
+        if getattr(local, "cursor", None) is None:
+            local.cursor = conn.cursor()
+        cursor = local.cursor
+        cursor.execute(sql)
+        return fetch_frame(cursor)
+    return query
+
+
+def make_session_query(session):
+    # Snowpark の .to_pandas() も、セッションが内部で持つコネクタ接続経由で同じ取得処理を使う
+    return make_cursor_query(session.connection)
+
+
+# ---- メタデータキャッシュ ----
+# SHOW ROLES / SHOW DATABASES などの一覧取得は Streamlit の再実行ごとに走るため、
+# (account, user, role) をスコープとしたキー単位で TTL 付き LRU キャッシュに保持する。
+# 全タブで同じインスタンスを使い、USE ROLE や「再取得」ボタンで明示的に破棄する。
+
+class MetadataCache:
+    def __init__(self, ttl=METADATA_CACHE_TTL, max_entries=METADATA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, scope=None):
+        # scope を指定した場合はそのスコープのキーのみ、未指定なら全件を破棄
+        with self.lock:
+            if scope is None:
+                self.entries.clear()
+                return
+            for key in [key for key in self.entries if key[0] == scope]:
+                del self.entries[key]
+
+
+def make_cached_query(cache, scope, query):
+    def cached_query(sql):
+        key = (scope, sql)
+        df = cache.get(key)
+        if df is None:
+            df = query(sql)
+            cache.put(key, df)
+        # 呼び出し側で列名を書き換えてもキャッシュが壊れないよう浅いコピーを返す
+        return df.copy(deep=False)
+    return cached_query
+
+
+# ---- 結果の蓄積 ----
+# ループ内で pd.concat を繰り返すと毎回それまでの全行がコピーされ、テーブル数に対して
+# 二乗の時間・メモリがかかる。列ごとに配列チャンクを貯め、最後に1回だけ DataFrame を組み立てる。
+
+class ColumnarCollector:
+    def __init__(self, columns=None):
+        self.columns = list(columns or [])
+        self.chunks = {col: [] for col in self.columns}
+        self.rows = 0
+
+    def _add_column(self, col):
+        self.columns.append(col)
+        self.chunks[col] = [np.full(self.rows, None, dtype=object)] if self.rows else []
+
+    def append(self, df, **constants):
+        # constants: 全行に同じ値を入れる列（database_name=db など）
+        n = len(df)
+        if n == 0:
+            return
+        for col in list(df.columns) + list(constants):
+            if col not in self.chunks:
+                self._add_column(col)
+        for col in self.columns:
+            if col in constants:
+                self.chunks[col].append(np.full(n, constants[col], dtype=object))
+            elif col in df.columns:
+                self.chunks[col].append(df[col].to_numpy())
+            else:
+                self.chunks[col].append(np.full(n, None, dtype=object))
+        self.rows += n
+
+    def __len__(self):
+        return self.rows
+
+    def to_frame(self):
+        return pd.DataFrame(
+            {col: np.concatenate(chunks) if chunks else np.array([], dtype=object) for col, chunks in self.chunks.items()},
+            columns=self.columns
+        )
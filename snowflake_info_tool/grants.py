@@ -0,0 +1,168 @@
+import pandas as pd
+
+from .common import DEFAULT_MAX_WORKERS, SHOW_MAX_ROWS, escape_identifier, escape_literal, lower_columns
+from .fetch import ColumnarCollector, fetch_parallel, track
+from .scope import scope_show, scope_where_sql
+
+GRANT_LEVELS = ["DATABASE", "SCHEMA", "TABLE"]
+GRANT_COLUMNS = ["created_on", "privilege", "granted_on", "name", "granted_to", "grantee_name", "grant_option", "granted_by"]
+# GRANTS_TO_ROLES から同期する対象。ROLE（ロール → ロールの付与）はロール階層の組み立てに使う
+GRANTS_SYNC_OBJECT_TYPES = GRANT_LEVELS + ["ROLE"]
+GRANT_KEY_COLUMNS = ["privilege", "granted_on", "name", "table_catalog", "table_schema", "granted_to", "grantee_name"]
+GRANTS_SNAPSHOT_COLUMNS = [
+    "created_on", "modified_on", "deleted_on", "privilege", "granted_on", "name", "table_catalog", "table_schema",
+    "granted_to", "grantee_name", "grant_option", "granted_by",
+]
+# ACCOUNT_USAGE は反映に最大2時間程度の遅延があるため、前回同期時刻より手前から取り直す
+GRANTS_SYNC_OVERLAP = pd.Timedelta(hours=3)
+
+
+# ---- DB → スキーマ → テーブル 階層インデックス ----
+# SHOW SCHEMAS / SHOW TABLES をオブジェクトごとに発行せず、アカウント単位の SHOW で
+# 階層全体を取得してメモリ上に {db: {schema: [table, ...]}} を組み立てる。
+# SHOW の出力は最大 10,000 行のため、上限に達した場合は DB ごとの INFORMATION_SCHEMA で取り直す。
+# 対象 DB が1つなら IN DATABASE に絞り、scope（ScopeFilter）は SHOW ... LIKE / ILIKE に寄せてから結果にも当てる。
+
+def fetch_hierarchy_index(query, database_names, max_workers=DEFAULT_MAX_WORKERS, scope=None):
+    # 戻り値: (index, failed) ／ failed は [(db, エラー内容)]
+    index = {db: {} for db in database_names}
+    failed = []
+    in_clause = f"IN DATABASE {escape_identifier(database_names[0])}" if len(database_names) == 1 else "IN ACCOUNT"
+
+    df_schemas = lower_columns(query(scope_show(scope, "SCHEMAS", in_clause)))
+    if len(df_schemas) >= SHOW_MAX_ROWS:
+        collector = ColumnarCollector(["database_name", "name"])
+        results = fetch_parallel(database_names, lambda db: lower_columns(query(
+            f"SELECT catalog_name AS database_name, schema_name AS name "
+            f"FROM {escape_identifier(db)}.INFORMATION_SCHEMA.SCHEMATA WHERE TRUE\n"
+            + scope_where_sql(scope, schema="schema_name")
+        )), max_workers)
+        for db, df, error in results:
+            if error is not None:
+                failed.append((db, str(error)))
+            else:
+                collector.append(df)
+        df_schemas = collector.to_frame()
+    if scope is not None:
+        df_schemas = scope.filter_frame(df_schemas, schema="name", table=None)
+    for db, schema in zip(df_schemas["database_name"], df_schemas["name"]):
+        if db in index:
+            index[db].setdefault(schema, [])
+
+    df_tables = lower_columns(query(scope_show(scope, "TABLES", in_clause)))
+    if len(df_tables) >= SHOW_MAX_ROWS:
+        collector = ColumnarCollector(["database_name", "schema_name", "name"])
+        results = fetch_parallel(database_names, lambda db: lower_columns(query(
+            f"SELECT table_catalog AS database_name, table_schema AS schema_name, table_name AS name "
+            f"FROM {escape_identifier(db)}.INFORMATION_SCHEMA.TABLES WHERE table_type LIKE '%TABLE'\n"
+            + scope_where_sql(scope, schema="table_schema", table="table_name")
+        )), max_workers)
+        for db, df, error in results:
+            if error is not None:
+                failed.append((db, str(error)))
+            else:
+                collector.append(df)
+        df_tables = collector.to_frame()
+    if scope is not None:
+        df_tables = scope.filter_frame(df_tables, table="name")
+    df_tables = df_tables.sort_values(["database_name", "schema_name", "name"])
+    for db, schema, tbl in zip(df_tables["database_name"], df_tables["schema_name"], df_tables["name"]):
+        if db in index:
+            index[db].setdefault(schema, []).append(tbl)
+    return index, failed
+
+
+# ---- 権限: オブジェクトごとの SHOW GRANTS ----
+# DB → SCHEMA → TABLE の順で取得対象を並べ、並列に SHOW GRANTS を実行する。
+
+def extract_grants(query, dbs, schemas, tables, max_workers=DEFAULT_MAX_WORKERS, progress=None, cancel=None):
+    # 戻り値: (grant_results, failed) ／ grant_results は {"{name} [LEVEL]": DataFrame}、failed は [(level, name, エラー内容)]
+    grant_targets = (
+        [("DATABASE", db) for db in dbs]
+        + [("SCHEMA", f"{db}.{schema}") for db, schema in schemas]
+        + [("TABLE", tbl_full) for tbl_full in tables]
+    )
+    results = fetch_parallel(
+        grant_targets,
+        lambda target: query(f"SHOW GRANTS ON {target[0]} {target[1]}"),
+        max_workers,
+        on_result=track(progress, grant_targets, lambda target: f"{target[1]} [{target[0]}]"),
+        cancel=cancel
+    )
+    grant_results = {}
+    failed = []
+    for (level, name), df, error in results:
+        if error is not None:
+            failed.append((level, name, str(error)))
+            continue
+        grant_results[f"{name} [{level}]"] = df
+    return grant_results, failed
+
+
+# ---- 権限: ACCOUNT_USAGE.GRANTS_TO_ROLES 一括取得 ----
+# オブジェクトごとの SHOW GRANTS の代わりに GRANTS_TO_ROLES を1クエリで読み、ローカルのスナップショットに保持する。
+# 2回目以降は MODIFIED_ON / DELETED_ON が前回同期以降の行だけを取得してスナップショットに反映する。
+# スナップショットは snapshots.GrantsSnapshotStore でアカウントごとに保存し、セッション・CLI の実行をまたいで使う。
+
+def grants_to_roles_sql(since=None):
+    sql = f"""
+    SELECT {', '.join(GRANTS_SNAPSHOT_COLUMNS)}
+    FROM SNOWFLAKE.ACCOUNT_USAGE.GRANTS_TO_ROLES
+    WHERE granted_on IN ({', '.join(escape_literal(level) for level in GRANTS_SYNC_OBJECT_TYPES)})
+    """
+    if since is None:
+        sql += "  AND deleted_on IS NULL\n"
+    else:
+        ts = escape_literal(pd.Timestamp(since).isoformat())
+        sql += f"  AND (modified_on >= TO_TIMESTAMP_LTZ({ts}) OR deleted_on >= TO_TIMESTAMP_LTZ({ts}))\n"
+    return sql
+
+
+def sync_grants_snapshot(query, snapshot=None):
+    # snapshot: {"grants": DataFrame, "watermark": Timestamp, "synced_at": Timestamp} ／ None なら全件取得
+    since = None if snapshot is None else snapshot["watermark"] - GRANTS_SYNC_OVERLAP
+    df_changes = lower_columns(query(grants_to_roles_sql(since)))
+    changed_at = df_changes["deleted_on"].fillna(df_changes["modified_on"])
+    df_changes = df_changes.assign(_changed_at=changed_at).sort_values("_changed_at").drop(columns="_changed_at")
+
+    if snapshot is None:
+        df_grants = df_changes
+        watermark = changed_at.max() if not changed_at.empty else None
+    else:
+        df_grants = pd.concat([snapshot["grants"], df_changes], ignore_index=True)
+        df_grants = df_grants.drop_duplicates(GRANT_KEY_COLUMNS, keep="last")
+        watermark = max([ts for ts in [snapshot["watermark"], changed_at.max()] if pd.notna(ts)], default=None)
+    df_grants = df_grants[df_grants["deleted_on"].isna()].reset_index(drop=True)
+    if watermark is None or pd.isna(watermark):
+        watermark = pd.Timestamp.now(tz="UTC")
+    return {
+        "grants": df_grants,
+        "watermark": watermark,
+        "synced_at": pd.Timestamp.now(tz="UTC"),
+        "changed_rows": len(df_changes),
+    }
+
+
+def group_grants_by_object(df_grants, dbs, schemas, tables):
+    # SHOW GRANTS 方式と同じ "{name} [DATABASE|SCHEMA|TABLE]" 単位・同じ順序で返す
+    granted_on = df_grants["granted_on"]
+    object_name = df_grants["name"].astype(str)
+    is_schema = granted_on.eq("SCHEMA")
+    is_table = granted_on.eq("TABLE")
+    object_name = object_name.where(~is_schema, df_grants["table_catalog"] + "." + object_name)
+    object_name = object_name.where(
+        ~is_table, df_grants["table_catalog"] + "." + df_grants["table_schema"] + "." + object_name
+    )
+    df_show = df_grants.assign(name=object_name)[GRANT_COLUMNS]
+    groups = {key: df.reset_index(drop=True) for key, df in df_show.groupby(["granted_on", "name"], sort=False)}
+
+    grant_results = {}
+    targets = (
+        [("DATABASE", db) for db in dbs]
+        + [("SCHEMA", f"{db}.{schema}") for db, schema in schemas]
+        + [("TABLE", tbl_full) for tbl_full in tables]
+    )
+    for level, name in targets:
+        if (level, name) in groups:
+            grant_results[f"{name} [{level}]"] = groups[(level, name)]
+    return grant_results
@@ -0,0 +1,153 @@
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from .common import DEFAULT_MAX_WORKERS, escape_identifier
+from .compute import resumed_warehouse
+from .fetch import fetch_parallel, track
+
+PARAMETER_LEVELS = ["ACCOUNT", "SESSION", "DATABASE", "WAREHOUSE"]
+PARAMETER_COLUMN_LABELS = {
+    "key": "key / キー",
+    "value": "value / 値",
+    "default": "default / デフォルト",
+    "level": "level / レベル",
+    "description": "description / 説明",
+    "type": "type / タイプ"
+}
+PARAMETER_COLUMN_WIDTHS = [50, 20, 30, 10, 80, 10]
+PARAMETER_LONG_COLUMNS = ["object_type", "object_name", "key", "value", "default", "level"]
+PARAMETER_FLAG_COLUMNS = ["non_default", "differs_from_account"]
+# Styler でセルを色付けする上限（これを超える行列は色付けせずに表示する）
+PARAMETER_STYLE_MAX_CELLS = 100_000
+
+
+def run_show_and_fetch(query, sql):
+    df = query(sql)
+    return df.rename(columns={col: PARAMETER_COLUMN_LABELS.get(col, col) for col in df.columns})
+
+
+def fetch_warehouse_parameters(query, wh, resume=False):
+    # SHOW PARAMETERS IN WAREHOUSE は停止中のウェアハウスにも実行できるため、既定では起動しない
+    # resume=True（従来方式）でも、起動した場合は取得後に停止状態へ戻す
+    safe_wh = escape_identifier(wh)
+    with resumed_warehouse(query, wh) if resume else nullcontext():
+        df = run_show_and_fetch(query, f'SHOW PARAMETERS IN WAREHOUSE {safe_wh}')
+    if df.empty:
+        raise ValueError("No parameter data returned")
+    return df
+
+
+def extract_parameters(query, levels, databases=(), warehouses=(), max_workers=DEFAULT_MAX_WORKERS,
+                       progress=None, cancel=None, resume_warehouses=False):
+    # 戻り値: (result_dict, failed_dbs, failed_whs) ／ result_dict は {"ACCOUNT" / "DATABASE_{db}" / ...: DataFrame}
+    # progress（fetch.Progress）には完了ごとに result_dict と同じキーで通知する
+    result_dict = {}
+    failed_dbs = []
+    failed_whs = []
+    databases = list(databases) if "DATABASE" in levels else []
+    warehouses = list(warehouses) if "WAREHOUSE" in levels else []
+
+    for level in ["ACCOUNT", "SESSION"]:
+        if level in levels:
+            on_result = track(progress, [level])
+            result_dict[level] = run_show_and_fetch(query, f"SHOW PARAMETERS IN {level}")
+            if on_result is not None:
+                on_result(level, result_dict[level], None)
+
+    if "DATABASE" in levels:
+        results = fetch_parallel(
+            databases,
+            lambda db: run_show_and_fetch(query, f"SHOW PARAMETERS IN DATABASE {escape_identifier(db)}"),
+            max_workers,
+            on_result=track(progress, databases, lambda db: f"DATABASE_{db}"),
+            cancel=cancel
+        )
+        for db, df, error in results:
+            if error is not None:
+                failed_dbs.append((db, str(error)))
+            else:
+                result_dict[f"DATABASE_{db}"] = df
+
+    if "WAREHOUSE" in levels:
+        results = fetch_parallel(
+            warehouses,
+            lambda wh: fetch_warehouse_parameters(query, wh, resume_warehouses),
+            max_workers,
+            on_result=track(progress, warehouses, lambda wh: f"WAREHOUSE_{wh}"),
+            cancel=cancel
+        )
+        for wh, df, error in results:
+            if error is not None:
+                failed_whs.append((wh, str(error)))
+            else:
+                result_dict[f"WAREHOUSE_{wh}"] = df
+
+    return result_dict, failed_dbs, failed_whs
+
+
+# ---- パラメータ: 横断マトリクス ----
+# オブジェクトごとの結果を1つの縦長テーブル（object_type, object_name, key, value, default, level）にまとめ、
+# キー × オブジェクトの行列に展開する。既定値との差・ACCOUNT との差は縦長テーブル上のベクトル演算で判定する。
+
+def parameters_long_frame(result_dict):
+    # result_dict のキー（"ACCOUNT" / "SESSION" / "DATABASE_{db}" / "WAREHOUSE_{wh}"）から object_type / object_name を決める
+    # オブジェクト数が多くても速いよう、列の rename はせずに表示名の列から直接 numpy 配列を集める
+    chunks = {col: [] for col in PARAMETER_LONG_COLUMNS}
+    for name, df in result_dict.items():
+        object_type, _, object_name = name.partition("_")
+        n = len(df)
+        chunks["object_type"].append(np.full(n, object_type, dtype=object))
+        chunks["object_name"].append(np.full(n, object_name or object_type, dtype=object))
+        for col in PARAMETER_LONG_COLUMNS[2:]:
+            label = PARAMETER_COLUMN_LABELS[col]
+            source = label if label in df.columns else col
+            chunks[col].append(df[source].to_numpy() if source in df.columns else np.full(n, None, dtype=object))
+    if not result_dict:
+        return pd.DataFrame(columns=PARAMETER_LONG_COLUMNS)
+    return pd.DataFrame({col: np.concatenate(arrays) for col, arrays in chunks.items()})
+
+
+def parameter_flags(df_long):
+    # non_default: 値が既定値と異なる ／ differs_from_account: 同じキーの ACCOUNT の値と異なる
+    value = df_long["value"].fillna("").astype(str)
+    default = df_long["default"].fillna("").astype(str)
+    is_account = df_long["object_type"].eq("ACCOUNT").to_numpy()
+    account_values = pd.Series(value.to_numpy()[is_account], index=df_long["key"].to_numpy()[is_account])
+    account_values = account_values[~account_values.index.duplicated()]
+    account_value = df_long["key"].map(account_values)
+    return df_long.assign(
+        non_default=(value != default).to_numpy(),
+        differs_from_account=(account_value.notna() & (account_value != value)).to_numpy(),
+    )
+
+
+def parameter_object_label(df_long):
+    return df_long["object_type"].where(
+        df_long["object_type"] == df_long["object_name"], df_long["object_type"] + " " + df_long["object_name"]
+    )
+
+
+def parameter_matrix(df_flags, only=None):
+    # 戻り値: (values, highlight) ／ どちらもキー × オブジェクト。highlight は only（または non_default）のフラグ
+    # only: "non_default" / "differs_from_account" を指定すると、そのフラグが1つでも立つキーだけに絞る
+    df = df_flags.assign(object=parameter_object_label(df_flags)).drop_duplicates(["key", "object"])
+    columns = list(dict.fromkeys(df["object"]))
+    flag = only or "non_default"
+    values = df.pivot(index="key", columns="object", values="value").reindex(columns=columns)
+    highlight = df.pivot(index="key", columns="object", values=flag).reindex(columns=columns)
+    highlight = highlight.fillna(False).astype(bool)
+    if only is not None:
+        keep = highlight.any(axis=1)
+        values, highlight = values[keep], highlight[keep]
+    return values, highlight
+
+
+def style_parameter_matrix(values, highlight, color="#fff3cd"):
+    if values.size > PARAMETER_STYLE_MAX_CELLS:
+        return values
+    styles = pd.DataFrame(
+        np.where(highlight.to_numpy(), f"background-color: {color}", ""), index=values.index, columns=values.columns
+    )
+    return values.style.apply(lambda _: styles, axis=None)
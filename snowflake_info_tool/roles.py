@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+from .common import DEFAULT_MAX_WORKERS, escape_identifier, lower_columns
+from .fetch import fetch_parallel, track
+
+# すべてのロールが暗黙に継承するロール
+PUBLIC_ROLE = "PUBLIC"
+ROLE_EDGE_COLUMNS = ["role", "grantee_name"]
+EFFECTIVE_GRANT_COLUMNS = ["role", "object", "privilege", "granted_on", "name", "via_role", "grant_option"]
+
+
+# ---- ロール → ロールの付与 ----
+# 「role を grantee_name に付与した」＝ grantee_name は role の権限を継承する、という辺の一覧を作る。
+# SHOW 方式ではロールごとに SHOW GRANTS OF ROLE を並列に実行し、一括取得方式では GRANTS_TO_ROLES の
+# スナップショット（granted_on = 'ROLE'）からクエリなしで組み立てる。
+
+def fetch_role_edges(query, role_names, max_workers=DEFAULT_MAX_WORKERS, progress=None, cancel=None):
+    # 戻り値: (df_edges, failed) ／ failed は [(ロール, エラー内容)]
+    results = fetch_parallel(
+        role_names,
+        lambda role: lower_columns(query(f"SHOW GRANTS OF ROLE {escape_identifier(role)}")),
+        max_workers,
+        on_result=track(progress, role_names, keep=False),
+        cancel=cancel
+    )
+    edges = []
+    failed = []
+    for role, df, error in results:
+        if error is not None:
+            failed.append((role, str(error)))
+            continue
+        # ユーザーへの付与（granted_to = USER）は継承に関係しない
+        df = df[df["granted_to"].astype(str).str.upper() == "ROLE"]
+        edges.append(pd.DataFrame({"role": role, "grantee_name": df["grantee_name"].to_numpy()}))
+    if not edges:
+        return pd.DataFrame(columns=ROLE_EDGE_COLUMNS), failed
+    return pd.concat(edges, ignore_index=True), failed
+
+
+def role_edges_from_grants(df_grants):
+    is_role = (df_grants["granted_on"] == "ROLE") & (df_grants["granted_to"] == "ROLE") & (df_grants["privilege"] == "USAGE")
+    return df_grants.loc[is_role, ["name", "grantee_name"]].rename(columns={"name": "role"}).reset_index(drop=True)
+
+
+# ---- ロール階層と推移閉包 ----
+# 各ロールが継承するロール（inherited）と、各ロールを継承するロール（inheritors）をロールごとに遅延計算して
+# キャッシュする。update() では前回との差分の辺だけを反映し、追加された辺は影響するロールのキャッシュに
+# 集合を足し込み、取り消された辺は影響するロールのキャッシュだけを破棄する。
+
+class RoleGraph:
+    def __init__(self, roles=(), edges=()):
+        self.roles = set()
+        self.granted = {}   # grantee -> 付与されたロール
+        self.holders = {}   # role -> そのロールを付与されたロール
+        self._inherited = {}
+        self._inheritors = {}
+        self.update(roles, edges)
+
+    def edges(self):
+        return {(role, grantee) for grantee, roles in self.granted.items() for role in roles}
+
+    def update(self, roles, edges):
+        # roles: ロール名の一覧（SHOW ROLES）、edges: [(role, grantee_name), ...] または ROLE_EDGE_COLUMNS の DataFrame
+        # 戻り値: {"added": 追加した辺の数, "removed": 取り消した辺の数}
+        if isinstance(edges, pd.DataFrame):
+            edges = zip(edges["role"], edges["grantee_name"])
+        roles = set(roles)
+        new_edges = {(role, grantee) for role, grantee in edges if role in roles and grantee in roles}
+        old_edges = self.edges()
+        removed = old_edges - new_edges
+        added = new_edges - old_edges
+        for role, grantee in removed:
+            self._remove_edge(role, grantee)
+        for role in self.roles - roles:
+            self._inherited.pop(role, None)
+            self._inheritors.pop(role, None)
+        self.roles = roles
+        for role, grantee in added:
+            self._add_edge(role, grantee)
+        return {"added": len(added), "removed": len(removed)}
+
+    def _closure(self, role, edges, cache):
+        cached = cache.get(role)
+        if cached is not None:
+            return cached
+        seen = {role}
+        stack = [role]
+        while stack:
+            for nxt in edges.get(stack.pop(), ()):
+                if nxt in seen:
+                    continue
+                closure = cache.get(nxt)
+                if closure is not None:
+                    seen |= closure
+                else:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        cache[role] = frozenset(seen)
+        return cache[role]
+
+    def _add_edge(self, role, grantee):
+        # grantee を継承するロールはすべて role の継承先を得る
+        inheritors = self._closure(grantee, self.holders, self._inheritors)
+        inherited = self._closure(role, self.granted, self._inherited)
+        self.granted.setdefault(grantee, set()).add(role)
+        self.holders.setdefault(role, set()).add(grantee)
+        for name in inheritors:
+            if name in self._inherited:
+                self._inherited[name] = self._inherited[name] | inherited
+        for name in inherited:
+            if name in self._inheritors:
+                self._inheritors[name] = self._inheritors[name] | inheritors
+
+    def _remove_edge(self, role, grantee):
+        inheritors = self._closure(grantee, self.holders, self._inheritors)
+        inherited = self._closure(role, self.granted, self._inherited)
+        self.granted[grantee].discard(role)
+        self.holders[role].discard(grantee)
+        for name in inheritors:
+            self._inherited.pop(name, None)
+        for name in inherited:
+            self._inheritors.pop(name, None)
+
+    def inherited_roles(self, role):
+        # role 自身と、role が（間接的に）継承するロール
+        # すべてのロールは PUBLIC を暗黙に継承するため、PUBLIC に付与されたロールも含める
+        inherited = self._closure(role, self.granted, self._inherited)
+        if PUBLIC_ROLE not in self.roles or PUBLIC_ROLE in inherited:
+            return inherited
+        return inherited | self._closure(PUBLIC_ROLE, self.granted, self._inherited)
+
+    def inheritor_roles(self, role):
+        # role 自身と、role を（間接的に）継承するロール
+        # role が PUBLIC に（間接的に）付与されていれば、すべてのロールが継承する
+        inheritors = self._closure(role, self.holders, self._inheritors)
+        if PUBLIC_ROLE in self.roles and PUBLIC_ROLE in inheritors:
+            return frozenset(self.roles)
+        return inheritors
+
+    def closure_frame(self):
+        # 全ロールの (role, inherited_role) ／ 実効権限を DataFrame の結合で求めるときに使う
+        pairs = [(role, inherited) for role in sorted(self.roles) for inherited in self.inherited_roles(role)]
+        return pd.DataFrame(pairs, columns=["role", "inherited_role"])
+
+
+# ---- 実効権限 ----
+# オブジェクトへの直接の付与（grant_results）とロール階層から、ロールの継承を含めた権限をメモリ上で引く。
+# 付与はオブジェクト別・付与先ロール別の行番号で索引しておき、問い合わせごとのクエリは発行しない。
+
+class EffectiveAccess:
+    def __init__(self, graph, grant_results):
+        # grant_results: {"{name} [LEVEL]": SHOW GRANTS の DataFrame}（extract_grants / group_grants_by_object の戻り値）
+        # オブジェクト数が多くても速いよう、列名の大文字小文字をそろえて numpy 配列を直接つなぐ
+        self.graph = graph
+        columns = ["object"] + EFFECTIVE_GRANT_COLUMNS[2:5] + ["granted_to", "grantee_name", "grant_option"]
+        chunks = {col: [] for col in columns}
+        for key, df in grant_results.items():
+            names = {col.lower(): col for col in df.columns}
+            chunks["object"].append(np.full(len(df), key, dtype=object))
+            for col in columns[1:]:
+                chunks[col].append(df[names[col]].to_numpy() if col in names else np.full(len(df), None, dtype=object))
+        df_grants = pd.DataFrame({
+            col: np.concatenate(arrays) if arrays else np.empty(0, dtype=object) for col, arrays in chunks.items()
+        })
+        df_grants = df_grants[df_grants["granted_to"].astype(str).str.upper() == "ROLE"].reset_index(drop=True)
+        self.grants = df_grants
+        self._grantees = df_grants["grantee_name"].to_numpy()
+        self._by_object = df_grants.groupby("object", sort=False).indices
+        self._by_grantee = df_grants.groupby("grantee_name", sort=False).indices
+
+    def _frame(self, positions, role):
+        df = self.grants.iloc[positions]
+        return pd.DataFrame({
+            "role": role,
+            "object": df["object"].to_numpy(),
+            "privilege": df["privilege"].to_numpy(),
+            "granted_on": df["granted_on"].to_numpy(),
+            "name": df["name"].to_numpy(),
+            "via_role": df["grantee_name"].to_numpy(),
+            "grant_option": df["grant_option"].to_numpy(),
+        }, columns=EFFECTIVE_GRANT_COLUMNS)
+
+    def roles_for_object(self, object_key):
+        # object_key の権限を持つロール ／ via_role はその権限を直接付与されているロール
+        positions = self._by_object.get(object_key)
+        if positions is None:
+            return pd.DataFrame(columns=EFFECTIVE_GRANT_COLUMNS)
+        grantees = self._grantees[positions]
+        rows, roles = [], []
+        for grantee in dict.fromkeys(grantees):
+            inheritors = sorted(self.graph.inheritor_roles(grantee))
+            matched = positions[grantees == grantee]
+            rows.append(np.tile(matched, len(inheritors)))
+            roles.append(np.repeat(np.array(inheritors, dtype=object), len(matched)))
+        df = self._frame(np.concatenate(rows), np.concatenate(roles))
+        return df.sort_values(["role", "privilege", "via_role"], kind="stable").reset_index(drop=True)
+
+    def objects_for_role(self, role):
+        # role が継承を含めて持つオブジェクト権限
+        positions = [self._by_grantee[name] for name in self.graph.inherited_roles(role) if name in self._by_grantee]
+        if not positions:
+            return pd.DataFrame(columns=EFFECTIVE_GRANT_COLUMNS)
+        df = self._frame(np.sort(np.concatenate(positions)), role)
+        return df.sort_values(["object", "privilege", "via_role"], kind="stable").reset_index(drop=True)
+
+    def to_frame(self):
+        # 全ロール × 継承を展開した実効権限の一覧（ファイル出力用）
+        df = self.graph.closure_frame().merge(self.grants, left_on="inherited_role", right_on="grantee_name")
+        df = df.rename(columns={"grantee_name": "via_role"})
+        return df[EFFECTIVE_GRANT_COLUMNS].sort_values(["role", "object", "privilege"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,165 @@
+import json
+import os
+import re
+
+import pandas as pd
+
+from .common import TABLE_KEY_COLUMNS, escape_literal
+
+SCOPE_LEVELS = ["database", "schema", "table"]
+SCOPE_SHOW_LEVELS = {"DATABASES": "database", "SCHEMAS": "schema", "TABLES": "table"}
+SCOPE_PROFILE_DIR = os.environ.get(
+    "SCOPE_PROFILE_DIR", os.path.join(os.path.expanduser("~"), ".snowflake_info_tool", "profiles")
+)
+SCOPE_PROFILE_NAME = re.compile(r"^[\w.-]+$")
+
+
+# ---- 取得範囲（include / exclude パターン） ----
+# DB・スキーマ・テーブル名を LIKE パターン（% と _、大文字小文字を区別しない）で絞り込む。
+# include が1つだけなら SHOW ... LIKE、INFORMATION_SCHEMA / ACCOUNT_USAGE では WHERE ... ILIKE ANY (...) として
+# サーバー側で絞り、SHOW で表せない条件（複数の include・exclude）は取得後に同じ規則で絞り込む。
+
+def like_to_regex(pattern):
+    return "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in pattern)
+
+
+def split_patterns(text):
+    # 画面・CLI から受け取る「カンマ区切りの文字列」をパターンのリストにする
+    if text is None:
+        return []
+    if isinstance(text, str):
+        text = text.split(",")
+    return [pattern.strip() for pattern in text if pattern and pattern.strip()]
+
+
+class ScopeFilter:
+    def __init__(self, include=None, exclude=None):
+        # include / exclude: {"database": [pattern, ...], "schema": [...], "table": [...]}
+        self.include = {level: split_patterns((include or {}).get(level)) for level in SCOPE_LEVELS}
+        self.exclude = {level: split_patterns((exclude or {}).get(level)) for level in SCOPE_LEVELS}
+        self._regex = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("include"), data.get("exclude"))
+
+    def to_dict(self):
+        return {"include": dict(self.include), "exclude": dict(self.exclude)}
+
+    def key(self):
+        # メタデータキャッシュのキーに使う
+        return tuple(
+            (kind, level, tuple(patterns[level]))
+            for kind, patterns in [("include", self.include), ("exclude", self.exclude)]
+            for level in SCOPE_LEVELS if patterns[level]
+        )
+
+    def is_empty(self):
+        return not self.key()
+
+    def merge(self, other):
+        return ScopeFilter(
+            {level: self.include[level] + other.include[level] for level in SCOPE_LEVELS},
+            {level: self.exclude[level] + other.exclude[level] for level in SCOPE_LEVELS},
+        )
+
+    def _compiled(self, kind, level):
+        if (kind, level) not in self._regex:
+            patterns = (self.include if kind == "include" else self.exclude)[level]
+            self._regex[(kind, level)] = re.compile(
+                "(?:" + "|".join(like_to_regex(p) for p in patterns) + ")", re.IGNORECASE | re.DOTALL
+            ) if patterns else None
+        return self._regex[(kind, level)]
+
+    def matches(self, level, name):
+        include, exclude = self._compiled("include", level), self._compiled("exclude", level)
+        name = str(name)
+        if include is not None and not include.fullmatch(name):
+            return False
+        return exclude is None or not exclude.fullmatch(name)
+
+    def filter_names(self, level, names):
+        return [name for name in names if self.matches(level, name)]
+
+    def mask(self, df, columns=None):
+        # columns: {"database": "database_name", ...}（既定は TABLE_KEY_COLUMNS）／ 列ごとに正規表現をベクトル演算で当てる
+        columns = dict(zip(SCOPE_LEVELS, TABLE_KEY_COLUMNS)) if columns is None else columns
+        mask = pd.Series(True, index=df.index)
+        for level, col in columns.items():
+            include, exclude = self._compiled("include", level), self._compiled("exclude", level)
+            if include is None and exclude is None:
+                continue
+            values = df[col].astype(str)
+            if include is not None:
+                mask &= values.str.fullmatch(include)
+            if exclude is not None:
+                mask &= ~values.str.fullmatch(exclude)
+        return mask
+
+    def filter_frame(self, df, database="database_name", schema="schema_name", table="table_name"):
+        columns = {level: col for level, col in zip(SCOPE_LEVELS, [database, schema, table]) if col in df.columns}
+        if self.is_empty() or df.empty:
+            return df
+        return df[self.mask(df, columns)].reset_index(drop=True)
+
+    def show(self, kind, scope_clause=""):
+        # SHOW DATABASES / SCHEMAS / TABLES [LIKE '<pattern>'] [IN ...]
+        include = self.include[SCOPE_SHOW_LEVELS[kind]]
+        sql = f"SHOW {kind}"
+        if len(include) == 1:
+            sql += f" LIKE {escape_literal(include[0])}"
+        if scope_clause:
+            sql += f" {scope_clause}"
+        return sql
+
+    def where_sql(self, database=None, schema=None, table=None):
+        # INFORMATION_SCHEMA / ACCOUNT_USAGE の WHERE 句に続ける条件（AND ...）
+        sql = ""
+        for level, col in zip(SCOPE_LEVELS, [database, schema, table]):
+            if col is None:
+                continue
+            if self.include[level]:
+                sql += f"  AND {col} ILIKE ANY ({', '.join(escape_literal(p) for p in self.include[level])})\n"
+            if self.exclude[level]:
+                sql += f"  AND NOT {col} ILIKE ANY ({', '.join(escape_literal(p) for p in self.exclude[level])})\n"
+        return sql
+
+
+def scope_where_sql(scope, database=None, schema=None, table=None):
+    return "" if scope is None else scope.where_sql(database, schema, table)
+
+
+def scope_show(scope, kind, scope_clause=""):
+    return (scope or ScopeFilter()).show(kind, scope_clause)
+
+
+# ---- 取得範囲のプロファイル ----
+# 定期実行（CLI）でも同じ範囲を使えるよう、名前付きの JSON ファイルとして保存・読み込みする。
+
+def scope_profile_path(name, directory=SCOPE_PROFILE_DIR):
+    if not SCOPE_PROFILE_NAME.match(name):
+        raise ValueError(f"プロファイル名に使えない文字が含まれています: {name}")
+    return os.path.join(directory, f"{name}.json")
+
+
+def list_scope_profiles(directory=SCOPE_PROFILE_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(".json")] for name in os.listdir(directory) if name.endswith(".json"))
+
+
+def save_scope_profile(name, scope, directory=SCOPE_PROFILE_DIR):
+    path = scope_profile_path(name, directory)
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(scope.to_dict(), f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_scope_profile(name_or_path, directory=SCOPE_PROFILE_DIR):
+    # 名前（保存先ディレクトリ内）またはファイルパスを受け付ける
+    path = name_or_path if os.path.sep in name_or_path or name_or_path.endswith(".json") else scope_profile_path(
+        name_or_path, directory
+    )
+    with open(path, encoding="utf-8") as f:
+        return ScopeFilter.from_dict(json.load(f))
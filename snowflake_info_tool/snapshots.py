@@ -0,0 +1,294 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from .common import DEF_ALL_COLUMNS, DEFAULT_MAX_WORKERS, TABLE_KEY_COLUMNS, escape_identifier, lower_columns
+from .definitions import collect_primary_keys, information_schema_columns_sql, to_definition_frame
+from .fetch import ColumnarCollector, QueryCancelled, fetch_parallel, track
+from .grants import GRANTS_SNAPSHOT_COLUMNS
+from .scope import scope_where_sql
+
+CATALOG_DB_PATH = os.environ.get(
+    "CATALOG_SNAPSHOT_PATH", os.path.join(os.path.expanduser("~"), ".snowflake_info_tool", "catalog.sqlite")
+)
+CATALOG_SNAPSHOT_RETENTION = 10
+CATALOG_TABLE_COLUMNS = TABLE_KEY_COLUMNS + ["created", "last_altered"]
+# 1クエリの (schema, table) IN (...) に並べるテーブル数の上限。超える DB は全カラムを取得して絞り込む
+INCREMENTAL_MAX_TABLES_PER_QUERY = 500
+GRANTS_TIMESTAMP_COLUMNS = ["created_on", "modified_on", "deleted_on"]
+
+
+# ---- テーブル定義: ローカルスナップショットと差分更新 ----
+# 取得したテーブル定義をアカウント単位で SQLite に保存し、次回は INFORMATION_SCHEMA.TABLES の
+# CREATED / LAST_ALTERED を前回スナップショットと比較して、追加・変更されたテーブルだけを取り直す。
+# 削除されたテーブルは定義から外す。スナップショット同士の差分も確認できる。
+
+class CatalogSnapshotStore:
+    def __init__(self, path=CATALOG_DB_PATH, retention=CATALOG_SNAPSHOT_RETENTION):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.retention = retention
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT, account TEXT NOT NULL, taken_at TEXT NOT NULL, "
+                "table_count INTEGER, column_count INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_tables (snapshot_id INTEGER NOT NULL, "
+                + ", ".join(f"{col} TEXT" for col in CATALOG_TABLE_COLUMNS) + ")"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_columns (snapshot_id INTEGER NOT NULL, "
+                + ", ".join(f"{col} TEXT" for col in DEF_ALL_COLUMNS) + ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS snapshot_tables_id ON snapshot_tables (snapshot_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS snapshot_columns_id ON snapshot_columns (snapshot_id)")
+
+    def list_snapshots(self, account):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return pd.read_sql_query(
+                "SELECT snapshot_id, taken_at, table_count, column_count FROM snapshots "
+                "WHERE account = ? ORDER BY snapshot_id DESC",
+                conn, params=(account,)
+            )
+
+    def latest(self, account):
+        df = self.list_snapshots(account)
+        return None if df.empty else int(df["snapshot_id"].iloc[0])
+
+    def load(self, snapshot_id):
+        with closing(sqlite3.connect(self.path)) as conn:
+            df_tables = pd.read_sql_query(
+                f"SELECT {', '.join(CATALOG_TABLE_COLUMNS)} FROM snapshot_tables WHERE snapshot_id = ?",
+                conn, params=(snapshot_id,)
+            )
+            df_def = pd.read_sql_query(
+                f"SELECT {', '.join(DEF_ALL_COLUMNS)} FROM snapshot_columns WHERE snapshot_id = ? ORDER BY rowid",
+                conn, params=(snapshot_id,)
+            )
+        return df_tables, df_def
+
+    def save(self, account, df_tables, df_def):
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            cur = conn.execute(
+                "INSERT INTO snapshots (account, taken_at, table_count, column_count) VALUES (?, ?, ?, ?)",
+                (account, pd.Timestamp.now(tz="UTC").isoformat(timespec="seconds"), len(df_tables), len(df_def))
+            )
+            snapshot_id = cur.lastrowid
+            for table, df, columns in [
+                ("snapshot_tables", df_tables, CATALOG_TABLE_COLUMNS),
+                ("snapshot_columns", df_def, DEF_ALL_COLUMNS),
+            ]:
+                conn.executemany(
+                    f"INSERT INTO {table} (snapshot_id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+                    ((snapshot_id, *row) for row in df[columns].astype(object).where(df[columns].notna(), None)
+                     .itertuples(index=False, name=None))
+                )
+
+            # 保持件数を超えた古いスナップショットを削除
+            old_ids = [(row[0],) for row in conn.execute(
+                "SELECT snapshot_id FROM snapshots WHERE account = ? ORDER BY snapshot_id DESC LIMIT -1 OFFSET ?",
+                (account, self.retention)
+            )]
+            for table in ["snapshot_tables", "snapshot_columns", "snapshots"]:
+                conn.executemany(f"DELETE FROM {table} WHERE snapshot_id = ?", old_ids)
+        return snapshot_id
+
+
+# ---- 権限: GRANTS_TO_ROLES スナップショットの保存 ----
+# sync_grants_snapshot の結果（現存する付与と watermark）を、カタログのスナップショットと同じ SQLite に
+# アカウントごとに1つだけ保存する。次回はアプリの再起動後や CLI の定期実行でも watermark 以降の差分だけを取得する。
+
+class GrantsSnapshotStore:
+    def __init__(self, path=CATALOG_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grants_sync ("
+                "account TEXT PRIMARY KEY, watermark TEXT NOT NULL, synced_at TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grants_rows (account TEXT NOT NULL, "
+                + ", ".join(f"{col} TEXT" for col in GRANTS_SNAPSHOT_COLUMNS) + ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS grants_rows_account ON grants_rows (account)")
+
+    def load(self, account):
+        # 戻り値: sync_grants_snapshot に渡せる {"grants", "watermark", "synced_at"} ／ 未保存なら None
+        with closing(sqlite3.connect(self.path)) as conn:
+            row = conn.execute("SELECT watermark, synced_at FROM grants_sync WHERE account = ?", (account,)).fetchone()
+            if row is None:
+                return None
+            df_grants = pd.read_sql_query(
+                f"SELECT {', '.join(GRANTS_SNAPSHOT_COLUMNS)} FROM grants_rows WHERE account = ? ORDER BY rowid",
+                conn, params=(account,)
+            )
+        for col in GRANTS_TIMESTAMP_COLUMNS:
+            df_grants[col] = pd.to_datetime(df_grants[col], utc=True, format="ISO8601")
+        return {
+            "grants": df_grants,
+            "watermark": pd.Timestamp(row[0]),
+            "synced_at": pd.Timestamp(row[1]),
+            "changed_rows": 0,
+        }
+
+    def save(self, account, snapshot):
+        df = snapshot["grants"][GRANTS_SNAPSHOT_COLUMNS]
+        values = df.astype(str).where(df.notna(), None)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute("DELETE FROM grants_rows WHERE account = ?", (account,))
+            conn.executemany(
+                f"INSERT INTO grants_rows (account, {', '.join(GRANTS_SNAPSHOT_COLUMNS)}) "
+                f"VALUES (?{', ?' * len(GRANTS_SNAPSHOT_COLUMNS)})",
+                ((account, *row) for row in values.itertuples(index=False, name=None))
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO grants_sync (account, watermark, synced_at) VALUES (?, ?, ?)",
+                (account, pd.Timestamp(snapshot["watermark"]).isoformat(), pd.Timestamp(snapshot["synced_at"]).isoformat())
+            )
+
+
+def information_schema_tables_sql(db, scope=None):
+    return f"""
+    SELECT table_catalog AS database_name, table_schema AS schema_name, table_name, created, last_altered
+    FROM {escape_identifier(db)}.INFORMATION_SCHEMA.TABLES
+    WHERE table_type = 'BASE TABLE'
+    """ + scope_where_sql(scope, schema="table_schema", table="table_name")
+
+
+def table_key_index(df):
+    return pd.MultiIndex.from_frame(df[TABLE_KEY_COLUMNS].astype(str))
+
+
+def refresh_catalog(query, store, account, database_names, max_workers=DEFAULT_MAX_WORKERS, progress=None, cancel=None,
+                    scope=None):
+    # 戻り値: (df_def_all, summary, failed)
+    # 途中で中止された場合は不完全なスナップショットを保存せず QueryCancelled を送出する
+    # 主キーの取得に失敗した場合は failed に含めて返し、スナップショットは保存しない（summary の snapshot_id は None）
+    # scope（ScopeFilter）の範囲外のテーブルは取り直さず前回の内容をスナップショットに引き継ぎ、戻り値からは除く
+    prev_id = store.latest(account)
+    if prev_id is None:
+        prev_tables, prev_def = pd.DataFrame(columns=CATALOG_TABLE_COLUMNS), pd.DataFrame(columns=DEF_ALL_COLUMNS)
+    else:
+        prev_tables, prev_def = store.load(prev_id)
+
+    # 1. 現在のテーブル一覧（取得に失敗した DB は前回の内容を引き継ぐ）
+    failed = []
+    tables = ColumnarCollector(CATALOG_TABLE_COLUMNS)
+    results = fetch_parallel(
+        database_names, lambda db: query(information_schema_tables_sql(db, scope)), max_workers,
+        on_result=track(progress, database_names, keep=False), cancel=cancel
+    )
+    for db, df, error in results:
+        if error is not None:
+            failed.append((db, str(error)))
+            tables.append(prev_tables[prev_tables["database_name"] == db])
+            continue
+        df = lower_columns(df)
+        if scope is not None:
+            df = scope.filter_frame(df)
+        df["created"] = df["created"].astype(str)
+        df["last_altered"] = df["last_altered"].astype(str)
+        tables.append(df)
+    out_of_scope = 0
+    if scope is not None and not prev_tables.empty:
+        carried = prev_tables[~scope.mask(prev_tables)]
+        tables.append(carried)
+        out_of_scope = len(carried)
+    cur_tables = tables.to_frame()
+
+    # 2. 前回との比較: 追加・変更・削除
+    merged = cur_tables.merge(
+        prev_tables[CATALOG_TABLE_COLUMNS], on=TABLE_KEY_COLUMNS, how="outer", suffixes=("", "_prev"), indicator=True
+    )
+    added = merged[merged["_merge"] == "left_only"]
+    dropped = merged[merged["_merge"] == "right_only"]
+    changed = merged[(merged["_merge"] == "both") & (
+        (merged["last_altered"] != merged["last_altered_prev"]) | (merged["created"] != merged["created_prev"])
+    )]
+    to_fetch = pd.concat([added, changed])[TABLE_KEY_COLUMNS]
+
+    # 3. 追加・変更テーブルのカラムだけを取得
+    primary_key_failed = []
+    primary_keys = collect_primary_keys(query, primary_key_failed) if not to_fetch.empty else set()
+    failed.extend(primary_key_failed)
+
+    def fetch_db(item):
+        db, df_keys = item
+        pairs = list(zip(df_keys["schema_name"], df_keys["table_name"]))
+        if len(pairs) > INCREMENTAL_MAX_TABLES_PER_QUERY:
+            df_def = to_definition_frame(query(information_schema_columns_sql(db)), primary_keys)
+            return df_def[table_key_index(df_def).isin(table_key_index(df_keys))]
+        return to_definition_frame(query(information_schema_columns_sql(db, pairs)), primary_keys)
+
+    fetched = ColumnarCollector(DEF_ALL_COLUMNS)
+    refetch_failed = set()
+    groups = list(to_fetch.groupby("database_name"))
+    results = fetch_parallel(
+        groups, fetch_db, max_workers, on_result=track(progress, groups, lambda group: group[0], keep=False), cancel=cancel
+    )
+    for (db, df_keys), df_def, error in results:
+        if error is not None:
+            failed.append((db, str(error)))
+            refetch_failed.add(db)
+            continue
+        fetched.append(df_def)
+
+    # 4. 前回の定義から削除・再取得したテーブルを除き、取得結果と合わせる
+    # （再取得に失敗した DB の変更テーブルは前回の定義を残す）
+    replaced = to_fetch[~to_fetch["database_name"].isin(refetch_failed)]
+    removed = pd.concat([replaced, dropped[TABLE_KEY_COLUMNS]])
+    kept = prev_def[~table_key_index(prev_def).isin(table_key_index(removed))]
+    df_def_all = pd.concat([kept, fetched.to_frame()], ignore_index=True).sort_values(TABLE_KEY_COLUMNS, kind="stable")
+    df_def_all = df_def_all.reset_index(drop=True)
+
+    if cancel is not None and cancel.is_set():
+        raise QueryCancelled("refresh_catalog")
+    # 主キーを取得できなかった場合は保存しない（保存すると次回は変更なしとして取り直されない）
+    snapshot_id = None if primary_key_failed else store.save(account, cur_tables, df_def_all)
+    summary = {
+        "snapshot_id": snapshot_id,
+        "previous_snapshot_id": prev_id,
+        "added": len(added),
+        "changed": len(changed),
+        "dropped": len(dropped),
+        "unchanged": len(cur_tables) - len(added) - len(changed) - out_of_scope,
+        "out_of_scope": out_of_scope,
+    }
+    if scope is not None:
+        df_def_all = scope.filter_frame(df_def_all)
+    return df_def_all, summary, failed
+
+
+def diff_snapshots(store, old_id, new_id):
+    # 戻り値: (テーブル単位の差分, カラム単位の差分)
+    old_tables, old_def = store.load(old_id)
+    new_tables, new_def = store.load(new_id)
+
+    tables = new_tables.merge(old_tables, on=TABLE_KEY_COLUMNS, how="outer", suffixes=("", "_old"), indicator=True)
+    tables["change"] = np.select(
+        [tables["_merge"] == "left_only", tables["_merge"] == "right_only", tables["last_altered"] != tables["last_altered_old"]],
+        ["追加", "削除", "変更"], default=""
+    )
+    df_table_diff = tables[tables["change"] != ""][["change"] + TABLE_KEY_COLUMNS + ["last_altered_old", "last_altered"]]
+
+    attrs = ["data_type", "nullable", "primary_key", "comment"]
+    columns = new_def.merge(
+        old_def, on=TABLE_KEY_COLUMNS + ["column_name"], how="outer", suffixes=("", "_old"), indicator=True
+    )
+    modified = np.zeros(len(columns), dtype=bool)
+    for attr in attrs:
+        modified |= (columns[attr].fillna("").astype(str) != columns[f"{attr}_old"].fillna("").astype(str)).to_numpy()
+    columns["change"] = np.select(
+        [columns["_merge"] == "left_only", columns["_merge"] == "right_only", modified],
+        ["追加", "削除", "変更"], default=""
+    )
+    df_column_diff = columns[columns["change"] != ""][
+        ["change"] + TABLE_KEY_COLUMNS + ["column_name"] + [col for attr in attrs for col in (f"{attr}_old", attr)]
+    ]
+    return df_table_diff.reset_index(drop=True), df_column_diff.reset_index(drop=True)
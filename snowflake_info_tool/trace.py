@@ -0,0 +1,118 @@
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+QUERY_TAG_PREFIX = "snowflake_info_tool"
+TRACE_MAX_RECORDS = 5000
+TRACE_SQL_MAX_CHARS = 1000
+DEFAULT_PHASE = "その他"
+TRACE_SUMMARY_COLUMNS = ["phase", "wall_ms", "queries", "query_ms", "rows", "bytes", "errors"]
+
+
+# ---- クエリ計測 ----
+# Snowflake への呼び出しごとに SQL 種別・クエリID・所要時間・行数・バイト数・エラーを記録する。
+# 記録はフェーズ（DB一覧・定義取得・サンプル・ファイル出力など）単位でまとめ、
+# 同じフェーズ名を QUERY_TAG に設定して QUERY_HISTORY 側とも突き合わせられるようにする。
+
+def classify_sql(sql):
+    # 先頭のキーワードで分類する（SHOW / DESCRIBE / ALTER などは対象オブジェクト種別まで）
+    words = re.findall(r"[A-Za-z_$]+", sql.upper())
+    if not words:
+        return "UNKNOWN"
+    if words[0] in ("SHOW", "DESCRIBE", "DESC", "ALTER", "USE") and len(words) > 1:
+        return f"{words[0]} {words[1]}"
+    return words[0]
+
+
+class QueryTrace:
+    def __init__(self, max_records=TRACE_MAX_RECORDS):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.current_phase = DEFAULT_PHASE
+        self._lock = threading.Lock()
+        self._origin = time.time()
+        self.records = deque(maxlen=max_records)
+        self.phases = deque(maxlen=max_records)
+
+    def query_tag(self, phase=None):
+        return f"{QUERY_TAG_PREFIX}:{self.run_id}:{phase or self.current_phase}"
+
+    @contextmanager
+    def phase(self, name):
+        # フェーズはメインスレッドで切り替え、並列ワーカーはその間の current_phase をそのまま使う
+        previous = self.current_phase
+        self.current_phase = name
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.current_phase = previous
+            with self._lock:
+                self.phases.append({
+                    "phase": name,
+                    "started_at": round(started - self._origin, 3),
+                    "wall_ms": round((time.time() - started) * 1000, 1),
+                })
+
+    def record(self, sql, started, query_id=None, rows=None, nbytes=None, error=None):
+        entry = {
+            "phase": self.current_phase,
+            "category": classify_sql(sql),
+            "sql": sql.strip()[:TRACE_SQL_MAX_CHARS],
+            "query_id": query_id,
+            "started_at": round(started - self._origin, 3),
+            "wall_ms": round((time.time() - started) * 1000, 1),
+            "rows": rows,
+            "bytes": nbytes,
+            "error": None if error is None else str(error),
+        }
+        with self._lock:
+            self.records.append(entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self.phases.clear()
+            self._origin = time.time()
+
+    def queries_frame(self):
+        with self._lock:
+            return pd.DataFrame(list(self.records))
+
+    def summary(self):
+        # フェーズごとの所要時間（フェーズ全体）と、その中のクエリ時間・件数の合計
+        with self._lock:
+            records = pd.DataFrame(list(self.records))
+            phases = pd.DataFrame(list(self.phases))
+        if phases.empty and records.empty:
+            return pd.DataFrame(columns=TRACE_SUMMARY_COLUMNS)
+        if phases.empty:
+            phases = pd.DataFrame(columns=["phase", "wall_ms"])
+        summary = phases.groupby("phase", sort=False)["wall_ms"].sum().to_frame()
+        if not records.empty:
+            by_phase = records.groupby("phase", sort=False).agg(
+                queries=("sql", "size"),
+                query_ms=("wall_ms", "sum"),
+                rows=("rows", "sum"),
+                bytes=("bytes", "sum"),
+                errors=("error", "count"),
+            )
+            summary = summary.join(by_phase, how="outer")
+        summary = summary.reset_index().reindex(columns=TRACE_SUMMARY_COLUMNS).fillna(0)
+        return summary.astype({"queries": int, "rows": int, "bytes": int, "errors": int})
+
+    def to_json(self):
+        with self._lock:
+            payload = {
+                "run_id": self.run_id,
+                "query_tag_prefix": f"{QUERY_TAG_PREFIX}:{self.run_id}",
+                "phases": list(self.phases),
+                "queries": list(self.records),
+            }
+        return json.dumps(payload, ensure_ascii=False, indent=2)
@@ -1,9 +1,157 @@
 import streamlit as st
-from snowflake.snowpark import Session
-import pandas as pd
-import re
-import snowflake.connector
-from io import BytesIO
+import functools
+import os
+import time
+from collections import deque
+
+from snowflake_info_tool.common import DEF_ALL_COLUMNS, DEF_COLUMNS, EXCLUDED_DATABASES, DEFAULT_MAX_WORKERS, MAX_WORKERS_LIMIT
+
+SCRIPT_STARTED = time.perf_counter()
+
+TRACE_PREVIEW_ROWS = 200
+TRACE_PREVIEW_COLUMNS = ["phase", "category", "wall_ms", "rows", "bytes", "query_id", "error"]
+PARTIAL_PREVIEW_LIMIT = 20
+PARAMETER_MATRIX_FILTERS = {
+    "すべてのパラメータ": None,
+    "既定値と異なるもののみ": "non_default",
+    "ACCOUNT と異なるもののみ": "differs_from_account",
+}
+PARAMETER_EXPORT_LAYOUTS = ["マトリクス + 縦長一覧（2シート）", "オブジェクトごと（従来）"]
+MAIN_TABS = ["パラメータ設定", "テーブル定義書", "ロール権限一覧"]
+UI_TIMING_MAX_RECORDS = 200
+
+
+def download_tempfile(path, **download_kwargs):
+    try:
+        with open(path, "rb") as f:
+            st.download_button(data=f, **download_kwargs)
+    finally:
+        os.remove(path)
+
+
+def cached_download(slot, source, options, build, file_name, **download_kwargs):
+    # build() -> (path, suffix, mime)。取得結果（source）と出力条件（options）が前回と同じなら作り直さず、
+    # session_state に置いたファイルの内容をそのまま渡す（絞り込みなどの操作ごとにファイルを書き出さない）
+    entry = st.session_state.get(slot)
+    if entry is None or entry["source"] is not source or entry["options"] != options:
+        path, suffix, mime = build()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+        entry = {"source": source, "options": options, "data": data, "suffix": suffix, "mime": mime}
+        st.session_state[slot] = entry
+    st.download_button(
+        data=entry["data"], file_name=f"{file_name}{entry['suffix']}", mime=entry["mime"], **download_kwargs
+    )
+
+
+def restore_warehouse(guard):
+    # 取得の終わりに1回呼ぶ。「取得後に停止する」がオンで、停止中だったウェアハウスが自動再開されていたら停止状態に戻す
+    try:
+        restored_warehouse = guard.restore()
+        if restored_warehouse:
+            st.info(f"自動再開されたウェアハウス {restored_warehouse} を停止状態に戻しました")
+    except Exception as e:
+        st.warning(f"ウェアハウスの状態を戻せませんでした: {e}")
+
+
+# ---- 画面の応答時間とタブごとの再実行 ----
+# 初回描画（ログイン画面が出るまで）・画面全体の再実行・タブ内の操作による再実行の所要時間を記録する。
+# 各タブは st.fragment にして、タブ内のウィジェット操作ではそのタブだけを再実行する。
+# 選択中でないタブは実行しない（状態を持つ st.tabs がない古い Streamlit ではすべてのタブを実行する）。
+
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+
+def record_ui_timing(run, started):
+    if "ui_timings" not in st.session_state:
+        st.session_state.ui_timings = deque(maxlen=UI_TIMING_MAX_RECORDS)
+    st.session_state.ui_timings.append({
+        "run": run,
+        "at": time.strftime("%H:%M:%S"),
+        "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+
+
+def timed_fragment(name):
+    def decorate(func):
+        @fragment
+        @functools.wraps(func)
+        def run():
+            started = time.perf_counter()
+            try:
+                func()
+            finally:
+                record_ui_timing(f"タブ: {name}", started)
+        return run
+    return decorate
+
+
+def main_tabs(names):
+    try:
+        return st.tabs(names, key="main_tab", on_change="rerun")
+    except TypeError:
+        return st.tabs(names)
+
+
+def tab_is_open(tab):
+    return getattr(tab, "open", None) is not False
+
+
+# ---- 進捗表示と中止 ----
+# 長い取得では「完了数 / 全体数」と失敗数を表示し、結果が届いた順に途中結果を描画する。
+# 途中結果は session_state の job に置くため、「中止」などで画面が再実行されても取得済みの分は残る。
+# 中断はメインスレッドの次の描画時に検知されるため、実行中のクエリは次の完了時点で取り消される。
+# 中止ボタンはタブ（st.fragment）の外のサイドバーに置く（フラグメント内の操作では実行中の取得を中断できない）。
+
+def start_job(name):
+    job = {"results": {}, "failed": [], "running": True}
+    st.session_state[f"job_{name}"] = job
+    st.caption("中止するにはサイドバーの「取得を中止」を押してください。")
+    return job
+
+
+def interrupted_job(name):
+    # 前回の実行が完了せずに再実行された job（中止・別操作による中断）を1回だけ返す
+    job = st.session_state.get(f"job_{name}")
+    if job is None or not job["running"]:
+        return None
+    job["running"] = False
+    st.warning(
+        f"⚠️ 取得を中止しました（完了 {len(job['results'])} 件・失敗 {len(job['failed'])} 件）。取得済みの結果を表示します。"
+    )
+    return job
+
+
+def render_partial_frame(key, df):
+    st.caption(key)
+    st.dataframe(df, use_container_width=True)
+
+
+def job_progress(job, render=render_partial_frame):
+    bar = st.progress(0.0, text="取得を開始しています...")
+    status = st.empty()
+    live_slot = st.empty()
+    live = live_slot.container()
+
+    def on_step(progress, key, result, error):
+        if error is not None:
+            job["failed"].append((key, str(error)))
+        elif result is not None:
+            job["results"][key] = result
+            if render is not None and len(job["results"]) <= PARTIAL_PREVIEW_LIMIT:
+                with live:
+                    render(key, result)
+        bar.progress(min(progress.done / max(progress.total, 1), 1.0), text=f"{progress.done} / {progress.total} 件完了")
+        status.caption(f"失敗: {progress.failed} 件")
+
+    def finish():
+        live_slot.empty()
+        job["running"] = False
+    return Progress(on_step), finish
+
 
 # ---- Sidebar: Snowflake credentials ----
 st.set_page_config(page_title="Snowflake Information Tool", layout="wide", initial_sidebar_state="expanded")
@@ -18,13 +166,25 @@ st.sidebar.markdown(
     "**＊2** Account Identifierの確認方法は [こちら](https://docs.snowflake.com/ja/user-guide/admin-account-identifier)"
 )
 
-if "conn" not in st.session_state:
-    st.session_state.conn = None
-
+if "connection_manager" not in st.session_state:
+    st.session_state.connection_manager = None
 if st.sidebar.button("接続"):
+    # snowflake.connector と pandas はここで初めて読み込む（ログイン画面の表示を待たせない）
+    from snowflake_info_tool.connection import ConnectionManager
+    from snowflake_info_tool.trace import QueryTrace
+
+    if "query_trace" not in st.session_state:
+        st.session_state.query_trace = QueryTrace()
     try:
-        conn = snowflake.connector.connect(user=user, password=password, account=account)
-        st.session_state["conn"] = conn
+        # 認証はここで1回だけ行い、以降のクエリはすべてこの接続のプールを使う
+        if st.session_state.connection_manager is not None:
+            st.session_state.connection_manager.close()
+        connection_manager = ConnectionManager(
+            {"user": user, "password": password, "account": account},
+            pool_size=MAX_WORKERS_LIMIT, trace=st.session_state.query_trace
+        )
+        connection_manager.connect()
+        st.session_state["connection_manager"] = connection_manager
         st.sidebar.success("接続成功")
     except Exception as e:
         st.sidebar.error(f"接続失敗: {e}")
@@ -50,26 +210,98 @@ with st.expander("ツールの目的と概要", expanded=True):
     ※ すべての出力内容は、画面プレビューまたはExcel形式でダウンロード可能です。
     """)
 
-if "conn" not in st.session_state:
-    st.session_state.conn = None
-
-if st.session_state.conn:
-    if "snowpark_session" not in st.session_state:
-        try:
-            connection_parameters = {
-                "account": account,
-                "user": user,
-                "password": password,
-                "role": "ACCOUNTADMIN",  # または default role
-                "warehouse": "YOUR_WAREHOUSE"
-            }
-            from snowflake.snowpark import Session  # ← 忘れず import
-            st.session_state.snowpark_session = Session.builder.configs(connection_parameters).create()
-        except Exception as e:
-            st.error(f"Snowpark セッション作成失敗: {e}")
-            st.stop()
-
-    session = st.session_state.snowpark_session
+if "connection_manager" not in st.session_state:
+    st.session_state.connection_manager = None
+
+if "ui_timings" not in st.session_state:
+    record_ui_timing("初回描画（ログイン画面）", SCRIPT_STARTED)
+
+if st.session_state.connection_manager:
+    # 接続後の画面で使うモジュール（pandas などを含む）はここで読み込む
+    from snowflake_info_tool.compute import WarehouseGuard
+    from snowflake_info_tool.definitions import (
+        ACCOUNT_USAGE_COLUMNS_FAILURE,
+        PREVIEW_PAGE_SIZES,
+        PRIMARY_KEYS_FAILURE,
+        SAMPLE_MAX_COLUMNS,
+        SAMPLE_METHODS,
+        SAMPLE_ROWS,
+        SEARCH_FIELDS,
+        SampleStore,
+        build_definition_search_index,
+        catalog_memory_usage,
+        compact_definitions,
+        definition_rows,
+        extract_table_definitions,
+        extract_table_definitions_by_describe,
+        fetch_sample,
+        hierarchy_dot,
+        hierarchy_summary,
+        search_definitions,
+        select_definitions,
+    )
+    from snowflake_info_tool.export import EXPORT_FORMATS, export_sheets, iter_table_definition_sheets
+    from snowflake_info_tool.fetch import ColumnarCollector, MetadataCache, Progress, make_cached_query
+    from snowflake_info_tool.grants import extract_grants, fetch_hierarchy_index, group_grants_by_object, sync_grants_snapshot
+    from snowflake_info_tool.parameters import (
+        PARAMETER_COLUMN_WIDTHS,
+        PARAMETER_LEVELS,
+        extract_parameters,
+        parameter_flags,
+        parameter_matrix,
+        parameters_long_frame,
+        style_parameter_matrix,
+    )
+    from snowflake_info_tool.roles import EffectiveAccess, RoleGraph, fetch_role_edges, role_edges_from_grants
+    from snowflake_info_tool.scope import ScopeFilter, list_scope_profiles, load_scope_profile, save_scope_profile
+    from snowflake_info_tool.snapshots import CatalogSnapshotStore, GrantsSnapshotStore, diff_snapshots, refresh_catalog
+
+    connection_manager = st.session_state.connection_manager
+    query_trace = st.session_state.query_trace
+    session_query = connection_manager.query
+
+    if "metadata_cache" not in st.session_state:
+        st.session_state.metadata_cache = MetadataCache()
+    metadata_cache = st.session_state.metadata_cache
+
+    if st.sidebar.button("メタデータを再取得", help="ロール・データベース・ウェアハウス等の一覧キャッシュを破棄して再取得します"):
+        metadata_cache.invalidate()
+
+    current_role_error = None
+    try:
+        with query_trace.phase("セッション情報"):
+            current_role = make_cached_query(metadata_cache, (account, user), session_query)("SELECT CURRENT_ROLE()").iloc[0, 0]
+    except Exception as e:
+        current_role, current_role_error = None, e
+    metadata_scope = (account, user, current_role)
+    session_metadata_query = make_cached_query(metadata_cache, metadata_scope, session_query)
+
+    # ---- テーブル定義のセッション保持 ----
+    # 定義一覧は category 列にした形で保持し、検索インデックスとメモリ使用量は取得直後に1回だけ求める。
+    # サンプルは SampleStore に入れ、定義一覧・インデックスの分を差し引いたメモリ上限で管理する。
+    def sample_store():
+        if "sample_store" not in st.session_state:
+            st.session_state.sample_store = SampleStore()
+        return st.session_state.sample_store
+
+    def store_definitions(df_def_all):
+        df_def_all = compact_definitions(df_def_all)
+        definition_index = build_definition_search_index(df_def_all)
+        catalog_memory = catalog_memory_usage(df_def_all, definition_index)
+        st.session_state["df_def_all"] = df_def_all
+        st.session_state["definition_index"] = definition_index
+        st.session_state["catalog_memory"] = catalog_memory
+        sample_store().clear()
+        sample_store().reserve(sum(catalog_memory.values()))
+
+    def warn_definition_failures(failed):
+        for db, err in failed:
+            if db == PRIMARY_KEYS_FAILURE:
+                st.warning(f"⚠️ 主キーを取得できませんでした（primary_key 列はすべて N になります）。: {err}")
+            elif db == ACCOUNT_USAGE_COLUMNS_FAILURE:
+                st.warning(f"⚠️ ACCOUNT_USAGE.COLUMNS を参照できませんでした（SNOWFLAKE データベースへの参照権限が必要です）。: {err}")
+            else:
+                st.warning(f"⚠️ データベース {db} の取得に失敗しました。: {err}")
 
     # case-insensitive カラム取得関数
     def get_column_case_insensitive(df, target_col):
@@ -80,7 +312,8 @@ if st.session_state.conn:
 
     # --- ロール一覧取得
     try:
-        roles_df = session.sql("SHOW ROLES").to_pandas()
+        with query_trace.phase("セッション情報"):
+            roles_df = session_metadata_query("SHOW ROLES")
         name_col = get_column_case_insensitive(roles_df, "name")
         if name_col is None:
             st.error(f"`name`列が見つかりません。カラム一覧: {roles_df.columns.tolist()}")
@@ -95,293 +328,378 @@ if st.session_state.conn:
 
     if st.sidebar.button("このロールに切り替え"):
         try:
-            session.sql(f"USE ROLE {selected_role}").collect()
+            connection_manager.use_role(selected_role)
+            metadata_cache.invalidate()
             st.success(f"ロールを「{selected_role}」に切り替えました")
             st.rerun() 
         except Exception as e:
             st.error(f"ロール切り替えに失敗しました: {e}")
 
-    try:
-        current_role = session.sql("SELECT CURRENT_ROLE()").to_pandas().iloc[0, 0]
+    if current_role is not None:
         st.sidebar.markdown(f"現在のロール：<span style='color:green'><b>{current_role}</b></span>", unsafe_allow_html=True)
-    except Exception as e:
-        st.sidebar.warning("現在のロールの取得に失敗しました")
-
-    tabs = st.tabs(["パラメータ設定", "テーブル定義書", "ロール権限一覧"])
+    else:
+        st.sidebar.warning(
+            "現在のロールの取得に失敗しました" + (f": {current_role_error}" if current_role_error is not None else "")
+        )
 
-    with tabs[0]:
-        cursor = st.session_state["conn"].cursor()
+    max_workers = st.sidebar.number_input(
+        "並列実行数", min_value=1, max_value=MAX_WORKERS_LIMIT, value=DEFAULT_MAX_WORKERS,
+        help="SHOW PARAMETERS / DESCRIBE / SHOW GRANTS などを同時に実行するクエリ数の上限"
+    )
+
+    # ---- 取得の中止 ----
+    # タブ内のウィジェットの操作はフラグメントの再実行として順番待ちになり、実行中の取得を中断しない。
+    # このボタンはフラグメントの外にあるため、押すと画面全体の再実行で実行中の取得を中断し、
+    # cancellable() の範囲で実行中のクエリを SYSTEM$CANCEL_QUERY で取り消す。
+    st.sidebar.button("取得を中止", key="cancel_job", help="実行中のクエリを取り消し、取得済みの結果だけを残します")
+
+    # ---- メタデータのみ（ウェアハウスを起動しない） ----
+    # SHOW / DESCRIBE はウェアハウスなしで実行し、ウェアハウスの RESUME は行わない。
+    # ウェアハウスを使った文（INFORMATION_SCHEMA・ACCOUNT_USAGE・サンプル）は記録してサイドバーに表示する。
+    metadata_only = st.sidebar.checkbox(
+        "メタデータのみ（ウェアハウスを起動しない）", value=True,
+        help="オフにすると従来どおりウェアハウスを RESUME してからパラメータを取得します（取得後は元の状態に戻します）"
+    )
+    # 自動再開（AUTO_RESUME）されたウェアハウスは他の利用者・処理も使っている可能性があるため、停止は明示的に選んだ場合だけ
+    suspend_auto_resumed = st.sidebar.checkbox(
+        "自動再開されたウェアハウスを取得後に停止する", value=False,
+        help="取得の前に停止中だったセッションのウェアハウスが取得中に自動再開された場合、取得の終わりに停止します。"
+             "他の利用者・処理がそのウェアハウスを使っていても停止します。"
+    )
+    if st.session_state.get("warehouse_guard") is None or st.session_state.warehouse_guard.query != connection_manager.query:
+        st.session_state.warehouse_guard = WarehouseGuard(connection_manager.query, trace=query_trace)
+    warehouse_guard = st.session_state.warehouse_guard
+    warehouse_guard.allow_resume = not metadata_only
+    warehouse_guard.suspend_auto_resumed = suspend_auto_resumed
+    data_query = warehouse_guard
+
+    # ---- 取得範囲（include / exclude） ----
+    # 3つのタブで共通の絞り込み条件。SHOW ... LIKE や INFORMATION_SCHEMA の ILIKE に反映し、範囲外は取得しない。
+    # プロファイルとして保存すると、CLI の --scope-profile で同じ範囲を定期実行に使える。
+    with st.sidebar.expander("取得範囲（include / exclude）"):
+        scope_profiles = list_scope_profiles()
+        if scope_profiles:
+            profile_name = st.selectbox("保存済みプロファイル", scope_profiles, key="scope_profile")
+            if st.button("読み込む", key="scope_load"):
+                for kind, patterns in load_scope_profile(profile_name).to_dict().items():
+                    for level, values in patterns.items():
+                        st.session_state[f"scope_{kind}_{level}"] = ", ".join(values)
+                st.rerun()
+        scope_inputs = {"include": {}, "exclude": {}}
+        for level, label in [("database", "データベース"), ("schema", "スキーマ"), ("table", "テーブル")]:
+            scope_inputs["include"][level] = st.text_input(f"{label}（対象）", key=f"scope_include_{level}", placeholder="例: PROD_%, SALES")
+            scope_inputs["exclude"][level] = st.text_input(f"{label}（除外）", key=f"scope_exclude_{level}")
+        st.caption("LIKE パターン（% と _）をカンマ区切りで指定します。大文字小文字は区別しません。")
+        scope = ScopeFilter(scope_inputs["include"], scope_inputs["exclude"])
+
+        save_name = st.text_input("プロファイル名", key="scope_save_name")
+        if st.button("プロファイルとして保存", key="scope_save") and save_name:
+            try:
+                st.success(f"保存しました: {save_scope_profile(save_name, scope)}")
+            except ValueError as e:
+                st.error(str(e))
+
+    @timed_fragment(MAIN_TABS[0])
+    def parameters_tab():
+        query = data_query
+        metadata_query = make_cached_query(metadata_cache, metadata_scope, query)
         st.header("取得対象の選択")
-        levels = st.multiselect("取得したいレベルを選んでください", ["ACCOUNT", "SESSION", "DATABASE", "WAREHOUSE"], default=["ACCOUNT", "SESSION"])
+        levels = st.multiselect("取得したいレベルを選んでください", PARAMETER_LEVELS, default=["ACCOUNT", "SESSION"])
 
         database_list, warehouse_list = [], []
 
         if "DATABASE" in levels:
-            cursor.execute("SHOW DATABASES")
-            database_list = [row[1] for row in cursor.fetchall()]
+            with query_trace.phase("DB一覧"):
+                database_list = scope.filter_names("database", metadata_query(scope.show("DATABASES"))["name"].tolist())
             selected_dbs = st.multiselect("対象データベース", ["ALL"] + database_list, default="ALL")
         else:
             selected_dbs = []
 
-        def escape_identifier(name):
-            return f'"{name.replace("\"", "\"\"")}"'
-        
-        def run_show_and_fetch(sql):
-            cursor.execute(sql)
-            return cursor.fetchall()
-        
         if "WAREHOUSE" in levels:
-            cursor.execute("SHOW WAREHOUSES")
-            raw_warehouses = cursor.fetchall()
-            warehouse_list = [row[0] for row in raw_warehouses]
+            with query_trace.phase("ウェアハウス一覧"):
+                warehouse_list = metadata_query("SHOW WAREHOUSES")["name"].tolist()
             selected_whs = st.multiselect("対象ウェアハウス（複数選択可）", ["ALL"] + warehouse_list, default=["ALL"])
         else:
             selected_whs = []
 
 
-        def run_show_and_fetch(sql):
-            cursor.execute(sql)
-            df = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-            rename_dict = {
-                "key": "key / キー",
-                "value": "value / 値",
-                "default": "default / デフォルト",
-                "level": "level / レベル",
-                "description": "description / 説明",
-                "type": "type / タイプ"
-            }
-            return df.rename(columns={col: rename_dict.get(col, col) for col in df.columns})
-
-        def to_excel_multi_sheet(df_dict):
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                for sheet, df in df_dict.items():
-                    df.to_excel(writer, sheet_name=sheet[:31], index=False, startrow=1, header=False)
-                    ws = writer.sheets[sheet[:31]]
-                    for col_num, value in enumerate(df.columns.values):
-                        ws.write(0, col_num, value, writer.book.add_format({'bold': True}))
-                    col_widths = [50, 20, 30, 10, 80, 10]
-                    for i, width in enumerate(col_widths):
-                        ws.set_column(i, i, width)
-            output.seek(0)
-            return output
+        export_format = st.selectbox("出力ファイル形式", list(EXPORT_FORMATS), key="parameter_export_format")
+
+        job = interrupted_job("parameters")
+        if job is not None:
+            for name, err in job["failed"]:
+                st.text(f"{name}: {err}")
+            st.session_state["parameter_results"] = job["results"]
+            st.session_state["parameter_table"] = parameter_flags(parameters_long_frame(job["results"]))
 
         if st.button("パラメータを取得"):
             with st.spinner("⏳ パラメータ情報を取得中..."):
-                result_dict = {}
-                failed_whs = []
-
-                if "ACCOUNT" in levels:
-                    df = run_show_and_fetch("SHOW PARAMETERS IN ACCOUNT")
-                    result_dict["ACCOUNT"] = df
-
-                if "SESSION" in levels:
-                    df = run_show_and_fetch("SHOW PARAMETERS IN SESSION")
-                    result_dict["SESSION"] = df
-                
-                failed_dbs = []
-                if "DATABASE" in levels:
-                    targets = database_list if "ALL" in selected_dbs else selected_dbs
-                    for db in targets:
-                        try:
-                            safe_db = escape_identifier(db)
-                            df = run_show_and_fetch(f"SHOW PARAMETERS IN DATABASE {safe_db}")
-                            result_dict[f"DATABASE_{db}"] = df
-                        except Exception as e:
-                            failed_dbs.append((db, str(e)))
+                job = start_job("parameters")
+                progress, finish_job = job_progress(job)
+                with query_trace.phase("パラメータ取得"), connection_manager.cancellable() as cancel:
+                    result_dict, failed_dbs, failed_whs = extract_parameters(
+                        query,
+                        levels,
+                        databases=database_list if "ALL" in selected_dbs else selected_dbs,
+                        warehouses=warehouse_list if "ALL" in selected_whs else selected_whs,
+                        max_workers=max_workers,
+                        progress=progress,
+                        cancel=cancel,
+                        resume_warehouses=not metadata_only
+                    )
+                finish_job()
+                restore_warehouse(warehouse_guard)
+                st.session_state["parameter_results"] = result_dict
+                st.session_state["parameter_table"] = parameter_flags(parameters_long_frame(result_dict))
                 if failed_dbs:
                     st.warning("以下のデータベースのパラメータを取得できませんでした:")
                     for db, err in failed_dbs:
                         st.text(f"{db}: {err}")
+                if failed_whs:
+                    st.warning("以下のウェアハウスのパラメータを取得できませんでした:")
+                    for wh, err in failed_whs:
+                        st.text(f"{wh}: {err}")
+
+        # 取得結果は session_state に置き、絞り込みを切り替えても取り直さない
+        result_dict = st.session_state.get("parameter_results")
+        if result_dict is not None:
+            if result_dict:
+                st.success("パラメータ取得完了")
+                df_params = st.session_state["parameter_table"]
+                matrix_filter = st.radio(
+                    "表示するパラメータ", list(PARAMETER_MATRIX_FILTERS), horizontal=True, key="parameter_matrix_filter"
+                )
+                df_matrix, df_highlight = parameter_matrix(df_params, only=PARAMETER_MATRIX_FILTERS[matrix_filter])
+                st.caption(
+                    f"{len(df_matrix)} キー × {df_matrix.shape[1]} オブジェクト"
+                    f"（色付きのセル: {'ACCOUNT と異なる値' if matrix_filter.startswith('ACCOUNT') else '既定値と異なる値'}）"
+                )
+                st.dataframe(style_parameter_matrix(df_matrix, df_highlight), use_container_width=True)
+                with st.expander("縦長の一覧（object_type, object_name, key, value, default, level）"):
+                    st.dataframe(df_params, use_container_width=True)
 
-                if "WAREHOUSE" in levels:
-                    targets = warehouse_list if "ALL" in selected_whs else selected_whs
-                    for wh in targets:
-                        try:
-                            safe_wh = escape_identifier(wh)
-                            try:
-                                cursor.execute(f'ALTER WAREHOUSE {safe_wh} RESUME')
-                            except:
-                                pass
-                
-                            df = run_show_and_fetch(f'SHOW PARAMETERS IN WAREHOUSE {safe_wh}')
-                            if df.empty:
-                                raise ValueError("No parameter data returned")
-                
-                            result_dict[f"WAREHOUSE_{wh}"] = df
-                
-                        except Exception as e:
-                            failed_whs.append((wh, str(e)))
-                
-                    if failed_whs:
-                        st.warning("以下のウェアハウスのパラメータを取得できませんでした:")
-                        for wh, err in failed_whs:
-                            st.text(f"{wh}: {err}")
-
-
-                if result_dict:
-                    st.success("パラメータ取得完了")
-                    excel_file = to_excel_multi_sheet(result_dict)
-                    st.download_button(
-                        "Excelとしてダウンロード",
-                        data=excel_file,
-                        file_name="snowflake_parameters.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        key="download-excel"
-                    )
-                    for name, df in result_dict.items():
-                        st.subheader(name)
-                        st.dataframe(df, use_container_width=True)
-                else:
-                    st.warning("選択された対象のパラメータを取得できませんでした")
-
-    with tabs[1]:
-        from snowflake.snowpark import Session
-        import io
-
-        # Set up Snowpark Session
-        if "snowpark_session" not in st.session_state:
-            try:
-                connection_parameters = {
-                    "account": account,
-                    "user": user,
-                    "password": password,
-                    "role": "ACCOUNTADMIN",  
-                    "warehouse": "default",  
-                }
-                st.session_state.snowpark_session = Session.builder.configs(connection_parameters).create()
-            except Exception as e:
-                st.error(f"Snowpark セッション作成失敗: {e}")
-                st.stop()
+                export_layout = st.radio(
+                    "ファイルの内容", PARAMETER_EXPORT_LAYOUTS, horizontal=True, key="parameter_export_layout"
+                )
 
-        session = st.session_state.snowpark_session
+                def build_parameter_export():
+                    with query_trace.phase("ファイル出力"):
+                        if export_layout == PARAMETER_EXPORT_LAYOUTS[0]:
+                            return export_sheets(
+                                [("Matrix", df_matrix.reset_index()), ("Parameters", df_params)], export_format
+                            )
+                        return export_sheets(result_dict.items(), export_format, col_widths=PARAMETER_COLUMN_WIDTHS)
+
+                # ファイルは取得結果・内容・形式（マトリクスは絞り込みも）が変わったときだけ作り直す
+                export_options = (export_layout, matrix_filter if export_layout == PARAMETER_EXPORT_LAYOUTS[0] else None, export_format)
+                cached_download(
+                    "parameter_export", result_dict, export_options, build_parameter_export,
+                    label="ファイルとしてダウンロード",
+                    file_name="snowflake_parameters",
+                    key="download-excel"
+                )
+            else:
+                st.warning("選択された対象のパラメータを取得できませんでした")
 
+    @timed_fragment(MAIN_TABS[1])
+    def definitions_tab():
         st.markdown("### 出力形式の選択")
 
         option = st.radio(
             "出力形式を選択してください",
-            ("プレビュー表示", "Excelとしてダウンロード（全テーブル）", "Excelとしてダウンロード（選択テーブルのみ）"),
+            ("プレビュー表示", "ファイルとしてダウンロード（全テーブル）", "ファイルとしてダウンロード（選択テーブルのみ）"),
             index=0
         )
+        if option != "プレビュー表示":
+            export_format = st.selectbox("出力ファイル形式", list(EXPORT_FORMATS), key="definition_export_format")
+
+        extract_mode = st.radio(
+            "定義の取得方式",
+            (
+                "一括取得（DB単位 INFORMATION_SCHEMA）",
+                "一括取得（アカウント全体 ACCOUNT_USAGE）",
+                "差分更新（ローカルスナップショット）",
+                "テーブルごと（DESCRIBE TABLE）",
+            ),
+            index=0,
+            help="ACCOUNT_USAGE は最大数時間の反映遅延があり、SNOWFLAKE データベースへの参照権限が必要です。"
+        )
+
+        job = interrupted_job("definitions")
+        if job is not None:
+            # 取得済みの DB / テーブル分だけで定義一覧を組み立てる（差分更新はスナップショットを保存しない）
+            # 1件も取得できていなければ、前回の定義一覧をそのまま残す
+            for name, err in job["failed"]:
+                st.text(f"{name}: {err}")
+            if job["results"]:
+                partial_defs = ColumnarCollector(DEF_ALL_COLUMNS)
+                for df_def in job["results"].values():
+                    partial_defs.append(df_def)
+                store_definitions(partial_defs.to_frame())
 
         if st.button("取得する"):
             with st.spinner("⏳ テーブル情報を取得中..."):
                 # 1. Collect all DB, exclude sample
-                df_dbs = session.sql("SHOW DATABASES").to_pandas()
+                with query_trace.phase("DB一覧"):
+                    df_dbs = session_metadata_query(scope.show("DATABASES"))
                 df_dbs.columns = [str(col) for col in df_dbs.columns]
                 db_name_col = df_dbs.columns[1] 
-                database_names = df_dbs[db_name_col].tolist()
-                database_names = [db for db in database_names if db.upper() != "SNOWFLAKE_SAMPLE_DATA"]
-
-                # 2. Collect all tables
-                df_all_tables = pd.DataFrame()
-                for db in database_names:
-                    try:
-                        df = session.sql(f"""
-                            SELECT table_catalog, table_schema, table_name
-                            FROM {db}.information_schema.tables
-                            WHERE table_type = 'BASE TABLE'
-                        """).to_pandas()
-                        df["table_catalog"] = db
-                        df_all_tables = pd.concat([df_all_tables, df], ignore_index=True)
-                    except:
-                        st.warning(f"⚠️ データベース {db} の取得に失敗しました。")
-
-                df_all_tables.columns = [col.lower() for col in df_all_tables.columns]
-                table_entries = df_all_tables.to_dict("records")
-
-                tables = []
-                df_def_all = pd.DataFrame()
-
-                # 3. Collect table definication & sample data
-                for entry in table_entries:
-                    db = entry["table_catalog"]
-                    schema = entry["table_schema"]
-                    tbl = entry["table_name"]
-                    full_name = f"{db}.{schema}.{tbl}"
-
-                    # Definition
-                    try:
-                        quoted_name = f'"{db}"."{schema}"."{tbl}"'
-                        df_desc = session.sql(f"DESCRIBE TABLE {quoted_name}").to_pandas()
-                        df_desc.columns = [str(i) for i in range(df_desc.shape[1])]
-                        df_desc = df_desc.rename(columns={
-                            "0": "column_name",
-                            "1": "data_type",
-                            "3": "nullable",
-                            "5": "primary_key",
-                            "9": "comment"
-                        })
-                        df_desc = df_desc[["column_name", "data_type", "nullable", "primary_key", "comment"]]
-
-                        df_desc["database_name"] = db
-                        df_desc["schema_name"] = schema
-                        df_desc["table_name"] = tbl
-                        df_def_all = pd.concat([df_def_all, df_desc], ignore_index=True)
-                    except Exception as e:
-                        df_columns = pd.DataFrame([["取得失敗"]], columns=["Error"])
-                        st.warning(f"⚠️ 定義取得エラー（{full_name}）: {e}")
-
-                    # Sample data
-                    try:
-                        df_sample = session.sql(f"SELECT * FROM {full_name} LIMIT 10").to_pandas()
-                    except:
-                        df_sample = pd.DataFrame([["取得失敗"]], columns=["Error"])
+                database_names = scope.filter_names("database", df_dbs[db_name_col].tolist())
+                database_names = [db for db in database_names if db.upper() not in EXCLUDED_DATABASES]
 
-                    tables.append({
-                        "full_name": full_name,
-                        "sample_df": df_sample
-                    })
+                query = data_query
 
-                st.session_state["df_def_all"] = df_def_all
-                st.session_state["tables"] = tables
+                job = start_job("definitions")
+                progress, finish_job = job_progress(
+                    job, render=None if extract_mode == "テーブルごと（DESCRIBE TABLE）" else render_partial_frame
+                )
+                # 取得がエラーで止まっても job を完了扱いにし、次の再実行で途中結果として扱わない
+                # （中止ボタンなどによる画面の再実行は BaseException なので、途中結果の表示に回す）
+                try:
+                    with query_trace.phase("定義取得"), connection_manager.cancellable() as cancel:
+                        if extract_mode == "差分更新（ローカルスナップショット）":
+                            # 2-3. Refresh only added / changed tables since the previous snapshot
+                            df_def_all, summary, failed = refresh_catalog(
+                                query, CatalogSnapshotStore(), account, database_names, max_workers=max_workers,
+                                progress=progress, cancel=cancel, scope=scope
+                            )
+                            warn_definition_failures(failed)
+                            st.info(
+                                f"差分更新: 追加 {summary['added']} / 変更 {summary['changed']} / "
+                                f"削除 {summary['dropped']} / 変更なし {summary['unchanged']} テーブル"
+                            )
+                            if summary["snapshot_id"] is None:
+                                st.info("主キーを取得できなかったため、今回の結果はスナップショットに保存していません。")
+                            st.session_state.pop("catalog_snapshot_cache", None)
+                        elif extract_mode != "テーブルごと（DESCRIBE TABLE）":
+                            # 2-3. Collect table definitions in bulk
+                            df_def_all, failed = extract_table_definitions(
+                                query, database_names, account_wide=extract_mode.startswith("一括取得（アカウント全体"),
+                                max_workers=max_workers, progress=progress, cancel=cancel, scope=scope
+                            )
+                            warn_definition_failures(failed)
+                        else:
+                            # 2-3. Collect all tables, then DESCRIBE TABLE one by one
+                            df_def_all, failed = extract_table_definitions_by_describe(
+                                query, database_names, max_workers=max_workers, progress=progress, cancel=cancel, scope=scope
+                            )
+                            for name, err in failed:
+                                st.warning(f"⚠️ 定義取得エラー（{name}）: {err}")
+                except Exception:
+                    finish_job()
+                    raise
+                finish_job()
+                restore_warehouse(warehouse_guard)
+
+                if df_def_all.empty and failed:
+                    st.info("定義を1件も取得できなかったため、前回の定義一覧を残しています。")
+                else:
+                    store_definitions(df_def_all)
 
                 # 4. Output
+        # 定義一覧の検索・ページ送りのたびに SQLite を読まないよう、履歴は差分更新のあと（または明示的に押したとき）だけ読み込み、
+        # 差分は (比較元, 比較先) ごとに session_state に置いて使い回す（保持するのは直近の1組だけ）
+        with st.expander("スナップショット履歴と差分"):
+            snapshot_cache = st.session_state.get("catalog_snapshot_cache")
+            if st.button("履歴を読み込み直す", key="reload_snapshots") or snapshot_cache is None or snapshot_cache["account"] != account:
+                snapshot_store = CatalogSnapshotStore()
+                snapshot_cache = {
+                    "account": account, "store": snapshot_store, "snapshots": snapshot_store.list_snapshots(account), "diff": None,
+                }
+                st.session_state["catalog_snapshot_cache"] = snapshot_cache
+            df_snapshots = snapshot_cache["snapshots"]
+            if len(df_snapshots) < 2:
+                st.caption("差分を表示するには「差分更新」で2回以上取得してください。")
+            else:
+                st.dataframe(df_snapshots, use_container_width=True)
+                snapshot_ids = df_snapshots["snapshot_id"].tolist()
+                col1, col2 = st.columns(2)
+                old_id = col1.selectbox("比較元", snapshot_ids, index=1)
+                new_id = col2.selectbox("比較先", snapshot_ids, index=0)
+                if snapshot_cache["diff"] is None or snapshot_cache["diff"][0] != (old_id, new_id):
+                    snapshot_cache["diff"] = ((old_id, new_id), diff_snapshots(snapshot_cache["store"], old_id, new_id))
+                df_table_diff, df_column_diff = snapshot_cache["diff"][1]
+                st.markdown(f"**テーブルの差分（{len(df_table_diff)} 件）**")
+                st.dataframe(df_table_diff, use_container_width=True)
+                st.markdown(f"**カラムの差分（{len(df_column_diff)} 件）**")
+                st.dataframe(df_column_diff, use_container_width=True)
+
         if "df_def_all" in st.session_state and not st.session_state["df_def_all"].empty:
             df_def_all = st.session_state["df_def_all"]
-            tables = st.session_state["tables"]
+            if "definition_index" not in st.session_state:
+                store_definitions(df_def_all)
+                df_def_all = st.session_state["df_def_all"]
+            definition_index = st.session_state["definition_index"]
             if option == "プレビュー表示":        
                 st.success("✅ データベース構造と各テーブルの定義情報を以下に表示します。")
             
-                # --- Tree view
-                
-                dot_lines = ["digraph G {", "rankdir=LR;", 'node [shape=box];']
-                grouped = df_def_all.groupby(["database_name", "schema_name", "table_name"])
-                
-                db_schema_edges = set()
-                schema_table_edges = set()
-                
-                for (db, schema, tbl), _ in grouped:
-                    db_node = db
-                    schema_node = f"{db}.{schema}"
-                    table_node = f"{db}.{schema}.{tbl}"
-                
-                    if (db_node, schema_node) not in db_schema_edges:
-                        dot_lines.append(f'"{db_node}" -> "{schema_node}"')
-                        db_schema_edges.add((db_node, schema_node))
-                
-                    if (schema_node, table_node) not in schema_table_edges:
-                        dot_lines.append(f'"{schema_node}" -> "{table_node}"')
-                        schema_table_edges.add((schema_node, table_node))
-                
-                dot_lines.append("}")
-                dot_source = "\n".join(dot_lines)
+                hierarchy = definition_index["hierarchy"]
 
+                # --- Tree view (level of detail)
                 with st.expander("### データベース構造（DB → スキーマ → テーブル）"):
-                    st.graphviz_chart(dot_source)
-            
-                # --- Tabke definition
-                with st.expander("### 各テーブルの定義書"):
-                    for (db, schema, tbl), df_group in grouped:
-                        full_name = f"{db}.{schema}.{tbl}"
-                        df_show = df_group[["column_name", "data_type", "nullable", "primary_key", "comment"]].reset_index(drop=True)
-                        st.markdown(f"#### {full_name}")
+                    st.dataframe(hierarchy_summary(hierarchy), use_container_width=True)
+                    tree_db = st.selectbox("展開するデータベース", [None] + list(hierarchy), format_func=lambda db: "（選択してください）" if db is None else db)
+                    if tree_db is not None:
+                        tree_schema = st.selectbox(
+                            "展開するスキーマ", [None] + list(hierarchy[tree_db]),
+                            format_func=lambda schema: "（スキーマ一覧を表示）" if schema is None else schema
+                        )
+                        if tree_schema is None:
+                            st.dataframe(hierarchy_summary(hierarchy, tree_db), use_container_width=True)
+                        st.graphviz_chart(hierarchy_dot(hierarchy, tree_db, tree_schema))
+
+                # --- Tabke definition (search & paging)
+
+                with st.expander("### 各テーブルの定義書", expanded=True):
+                    col1, col2, col3 = st.columns([3, 1, 1])
+                    search_text = col1.text_input("検索（空白区切りで AND 検索）", key="definition_search")
+                    search_field = col2.selectbox("検索対象", list(SEARCH_FIELDS), key="definition_search_field")
+                    page_size = col3.selectbox("1ページの表示件数", PREVIEW_PAGE_SIZES, key="definition_page_size")
+
+                    matched_ids = search_definitions(definition_index, search_text, SEARCH_FIELDS[search_field])
+                    page_count = max(1, -(-len(matched_ids) // page_size))
+                    page = st.number_input(f"ページ（全 {page_count} ページ）", min_value=1, max_value=page_count, value=1)
+                    page_ids = matched_ids[(page - 1) * page_size:page * page_size]
+                    st.caption(
+                        f"{len(matched_ids)} / {len(definition_index['table_keys'])} テーブルが該当"
+                        + (f"（{(page - 1) * page_size + 1}〜{(page - 1) * page_size + len(page_ids)} 件目を表示）" if len(page_ids) else "")
+                    )
+
+                    for table_id in page_ids:
+                        db, schema, tbl = definition_index["table_keys"][table_id]
+                        df_show = df_def_all.iloc[definition_rows(definition_index, table_id)][DEF_COLUMNS].reset_index(drop=True)
+                        st.markdown(f"#### {db}.{schema}.{tbl}")
                         st.dataframe(df_show, use_container_width=True)
-                # --- Sample data
+                # --- Sample data (on demand)
                 with st.expander("### 各テーブルのサンプルデータ"):
-                    for table in tables:
-                        st.markdown(f"#### テーブル： {table['full_name']}")
-                        st.dataframe(table["sample_df"], use_container_width=True)
+                    sample_cache = sample_store()
+                    col1, col2, col3 = st.columns(3)
+                    sample_method = col1.selectbox("取得方法", SAMPLE_METHODS, index=0)
+                    sample_rows = col2.number_input("行数", min_value=1, max_value=1000, value=SAMPLE_ROWS)
+                    sample_max_columns = col3.number_input("最大列数", min_value=1, max_value=1000, value=SAMPLE_MAX_COLUMNS)
+
+                    # 表示中のページのテーブルだけを対象にする
+                    sample_target = st.selectbox(
+                        "サンプルを表示するテーブル（表示中のページから選択）", page_ids,
+                        format_func=lambda table_id: ".".join(definition_index["table_keys"][table_id])
+                    )
+                    if sample_target is not None:
+                        db, schema, tbl = definition_index["table_keys"][sample_target]
+                        sample_key = (db, schema, tbl, sample_method, sample_rows, sample_max_columns)
+                        if sample_key not in sample_cache and st.button("サンプルを取得"):
+                            try:
+                                with query_trace.phase("サンプル取得"):
+                                    sample_cache.put(sample_key, fetch_sample(
+                                        data_query, db, schema, tbl,
+                                        columns=df_def_all["column_name"].iloc[definition_rows(definition_index, sample_target)],
+                                        rows=sample_rows, method=sample_method, max_columns=sample_max_columns
+                                    ))
+                            except Exception as e:
+                                st.warning(f"⚠️ サンプル取得エラー（{db}.{schema}.{tbl}）: {e}")
+                            restore_warehouse(warehouse_guard)
+                        if sample_key in sample_cache:
+                            st.markdown(f"#### テーブル： {db}.{schema}.{tbl}")
+                            st.dataframe(sample_cache.get(sample_key), use_container_width=True)
 
                 st.markdown("""
                 <style>
@@ -412,101 +730,91 @@ if st.session_state.conn:
                 """, unsafe_allow_html=True)
 
 
-            elif option == "Excelとしてダウンロード（全テーブル）":
-                output = io.BytesIO()
-
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-
-                    # Sheet1
-                    df_def_all_csv = df_def_all[
-                        ["database_name", "schema_name", "table_name", "column_name", "data_type", "nullable", "primary_key", "comment"]
-                    ].sort_values(["database_name", "schema_name", "table_name", "column_name"])
-
-                    df_def_all_csv.to_excel(writer, index=False, sheet_name="All_Tables_Overview")
-
-                    # Sheet2〜
-                    grouped = df_def_all.groupby(["database_name", "schema_name", "table_name"])
-                    for (db, schema, tbl), df_group in grouped:
-                        sheet_name = f"{tbl}"[:31] 
-                        df_table_def = df_group[
-                            ["column_name", "data_type", "nullable", "primary_key", "comment"]
-                        ]
-                        df_table_def.to_excel(writer, index=False, sheet_name=sheet_name)
-
-                st.download_button(
+            elif option == "ファイルとしてダウンロード（全テーブル）":
+                with query_trace.phase("ファイル出力"):
+                    path, suffix, mime = export_sheets(
+                        iter_table_definition_sheets(df_def_all, "All_Tables_Overview"), export_format
+                    )
+                download_tempfile(
+                    path,
                     label="ダウンロード",
-                    data=output.getvalue(),
-                    file_name="table_definitions.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-
-            elif option == "Excelとしてダウンロード（選択テーブルのみ）":
-                # 👇 multiselect 的数据源也从 session 取
-                all_table_names = df_def_all[["database_name", "schema_name", "table_name"]].drop_duplicates()
-                all_table_names["full_name"] = (
-                    all_table_names["database_name"] + "." +
-                    all_table_names["schema_name"] + "." +
-                    all_table_names["table_name"]
+                    file_name=f"table_definitions{suffix}",
+                    mime=mime
                 )
 
+            elif option == "ファイルとしてダウンロード（選択テーブルのみ）":
+                # 👇 multiselect 的数据源也从 session 取（選択肢は (db, schema, table) の索引から作り、定義一覧は変更しない）
                 selected_tables = st.multiselect(
                     "出力対象のテーブルを選択してください",
-                    options=all_table_names["full_name"].tolist(),
+                    options=definition_index["table_keys"],
+                    format_func=".".join,
                     key="selected_tables_key"
                 )
 
                 if selected_tables:
-                    output = io.BytesIO()
-                    df_def_all["full_name"] = (
-                        df_def_all["database_name"] + "." +
-                        df_def_all["schema_name"] + "." +
-                        df_def_all["table_name"]
-                    )
-                    df_def_selected = df_def_all[df_def_all["full_name"].isin(selected_tables)]
-
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        df_def_selected_csv = df_def_selected[
-                            ["database_name", "schema_name", "table_name", "column_name", "data_type", "nullable", "primary_key", "comment"]
-                        ].sort_values(["database_name", "schema_name", "table_name", "column_name"])
-                        df_def_selected_csv.to_excel(writer, index=False, sheet_name="Selected_Tables_Overview")
-
-                        grouped = df_def_selected.groupby(["database_name", "schema_name", "table_name"])
-                        for (db, schema, tbl), df_group in grouped:
-                            sheet_name = f"{tbl}"[:31]
-                            df_table_def = df_group[["column_name", "data_type", "nullable", "primary_key", "comment"]]
-                            df_table_def.to_excel(writer, index=False, sheet_name=sheet_name)
-
-                    st.download_button(
+                    df_def_selected = select_definitions(df_def_all, definition_index, selected_tables)
+
+                    with query_trace.phase("ファイル出力"):
+                        path, suffix, mime = export_sheets(
+                            iter_table_definition_sheets(df_def_selected, "Selected_Tables_Overview"), export_format
+                        )
+                    download_tempfile(
+                        path,
                         label="選択テーブルをダウンロード",
-                        data=output.getvalue(),
-                        file_name="selected_table_definitions.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        file_name=f"selected_table_definitions{suffix}",
+                        mime=mime
                     )
 
-    with tabs[2]:
+    @timed_fragment(MAIN_TABS[2])
+    def grants_tab():
         st.markdown("### データベース・スキーマ・テーブルの権限一覧")
 
-        conn = st.session_state.get("conn")
-        if not conn:
-            st.warning("Snowflake に接続してください。")
-            st.stop()
-
-        cursor = conn.cursor()
+        query = data_query
+        metadata_query = make_cached_query(metadata_cache, metadata_scope, query)
 
         # ---- データベース選択 ----
-        cursor.execute("SHOW DATABASES")
-        all_dbs = [row[1] for row in cursor.fetchall()]
+        with query_trace.phase("DB一覧"):
+            all_dbs = scope.filter_names("database", metadata_query(scope.show("DATABASES"))["name"].tolist())
         dbs_display = ["ALL"] + all_dbs
         selected_dbs = st.multiselect("データベースを選択", dbs_display, default=["ALL"])
         active_dbs = all_dbs if "ALL" in selected_dbs or not selected_dbs else selected_dbs
 
+        account_wide_listing = st.checkbox(
+            "スキーマ・テーブル一覧をアカウント単位で一括取得する", value=True,
+            help="SHOW SCHEMAS / SHOW TABLES IN ACCOUNT で階層全体を一度に取得し、選択肢をメモリ上のインデックスから作成します"
+        )
+        if account_wide_listing:
+            index_key = (metadata_scope, "HIERARCHY_INDEX", scope.key())
+            hierarchy_index = metadata_cache.get(index_key)
+            if hierarchy_index is None:
+                try:
+                    with query_trace.phase("テーブル一覧"):
+                        hierarchy_index, failed = fetch_hierarchy_index(metadata_query, all_dbs, max_workers, scope=scope)
+                    for db, err in failed:
+                        st.warning(f"{db} のスキーマ・テーブル取得に失敗しました。")
+                    metadata_cache.put(index_key, hierarchy_index)
+                except Exception as e:
+                    st.warning(f"アカウント単位の一覧取得に失敗しました: {e}")
+                    hierarchy_index = {}
+
+            def list_schemas(db):
+                return list(hierarchy_index.get(db, {}))
+
+            def list_tables(db, schema):
+                return hierarchy_index.get(db, {}).get(schema, [])
+        else:
+            def list_schemas(db):
+                return scope.filter_names("schema", metadata_query(scope.show("SCHEMAS", f"IN DATABASE {db}"))["name"].tolist())
+
+            def list_tables(db, schema):
+                return scope.filter_names("table", metadata_query(scope.show("TABLES", f"IN SCHEMA {db}.{schema}"))["name"].tolist())
+
         # ---- スキーマ選択 ----
         schema_display = []
         schema_map = {}
         for db in active_dbs:
             try:
-                cursor.execute(f"SHOW SCHEMAS IN DATABASE {db}")
-                schemas = [row[1] for row in cursor.fetchall()]
+                schemas = list_schemas(db)
                 for schema in schemas:
                     full = f"{db}.{schema}"
                     schema_display.append(full)
@@ -524,8 +832,7 @@ if st.session_state.conn:
         table_display = []
         for db, schema in active_schemas:
             try:
-                cursor.execute(f"SHOW TABLES IN SCHEMA {db}.{schema}")
-                tables = [row[1] for row in cursor.fetchall()]
+                tables = list_tables(db, schema)
                 for tbl in tables:
                     table_display.append(f"{db}.{schema}.{tbl}")
             except:
@@ -535,67 +842,214 @@ if st.session_state.conn:
         selected_tables = st.multiselect("テーブルを選択", table_display)
         active_tables = [t for t in table_display if t != "ALL"] if "ALL" in selected_tables else selected_tables
 
+        grants_mode = st.radio(
+            "権限の取得方式",
+            ("オブジェクトごと（SHOW GRANTS）", "一括取得（ACCOUNT_USAGE.GRANTS_TO_ROLES・差分同期）"),
+            index=0,
+            help="ACCOUNT_USAGE は最大2時間程度の反映遅延があり、SNOWFLAKE データベースへの参照権限が必要です。"
+        )
+        if "grants_snapshots" not in st.session_state:
+            st.session_state.grants_snapshots = {}
+        if grants_mode.startswith("一括取得") and account not in st.session_state.grants_snapshots:
+            # 前回までに保存したスナップショット（アプリの再起動後・別セッションでも差分同期を続ける）
+            st.session_state.grants_snapshots[account] = GrantsSnapshotStore().load(account)
+        grants_snapshot = st.session_state.grants_snapshots.get(account)
+        if grants_mode.startswith("一括取得") and grants_snapshot is not None:
+            st.caption(
+                f"ローカルスナップショット: {len(grants_snapshot['grants'])} 件"
+                f"（最終同期 {grants_snapshot['synced_at']:%Y-%m-%d %H:%M:%S} UTC）"
+            )
+
+        export_format = st.selectbox("出力ファイル形式", list(EXPORT_FORMATS), key="grants_export_format")
+
         # ---- 実行 & 表示 ----
+        # 取得結果は session_state に置き、実効権限の問い合わせで画面が再実行されても残す
+        grant_results = None
+        job = interrupted_job("grants")
+        if job is not None:
+            grant_results = job["results"]
+            for name, err in job["failed"]:
+                st.text(f"{name}: {err}")
+
         if st.button("権限情報を取得"):
-            grant_results = {}
+            with query_trace.phase("権限取得"):
+                if grants_mode.startswith("一括取得"):
+                    try:
+                        grants_snapshot = sync_grants_snapshot(query, grants_snapshot)
+                        GrantsSnapshotStore().save(account, grants_snapshot)
+                        st.session_state.grants_snapshots[account] = grants_snapshot
+                        st.info(f"差分同期: {grants_snapshot['changed_rows']} 件の変更を反映しました")
+                        grant_results = group_grants_by_object(
+                            grants_snapshot["grants"], active_dbs, active_schemas, active_tables
+                        )
+                    except Exception as e:
+                        st.warning(f"⚠️ GRANTS_TO_ROLES の取得に失敗しました: {e}")
+                else:
+                    job = start_job("grants")
+                    progress, finish_job = job_progress(job)
+                    with connection_manager.cancellable() as cancel:
+                        grant_results, failed = extract_grants(
+                            query, active_dbs, active_schemas, active_tables, max_workers, progress=progress, cancel=cancel
+                        )
+                    finish_job()
+                    for level, name, err in failed:
+                        st.warning(f"⚠️ {level} {name} のGRANT取得失敗")
+            restore_warehouse(warehouse_guard)
+
+        if grant_results is not None:
+            st.session_state["grant_results"] = grant_results
+            st.session_state["effective_access"] = None
+        grant_results = st.session_state.get("grant_results", {})
+
+        # 表示 & ダウンロード
+        # 実効権限の問い合わせでもこのフラグメントは再実行されるため、直接の付与はページ単位で表示し、
+        # ファイルは取得結果と形式が変わったときだけ作り直す
+        if grant_results:
+            with st.expander(f"オブジェクトごとの直接の付与（{len(grant_results)} 件）"):
+                grant_names = list(grant_results)
+                page_size = st.selectbox("1ページの表示件数", PREVIEW_PAGE_SIZES, key="grant_page_size")
+                page_count = max(1, -(-len(grant_names) // page_size))
+                page = st.number_input(
+                    f"ページ（全 {page_count} ページ）", min_value=1, max_value=page_count, value=1, key="grant_page"
+                )
+                for name in grant_names[(page - 1) * page_size:page * page_size]:
+                    st.subheader(f"{name}")
+                    st.dataframe(grant_results[name])
 
-            # DBレベル
-            for db in active_dbs:
-                try:
-                    cursor.execute(f"SHOW GRANTS ON DATABASE {db}")
-                    df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
-                    grant_results[f"{db} [DATABASE]"] = df
-                except:
-                    st.warning(f"⚠️ DATABASE {db} のGRANT取得失敗")
-
-            # SCHEMAレベル
-            for db, schema in active_schemas:
-                try:
-                    cursor.execute(f"SHOW GRANTS ON SCHEMA {db}.{schema}")
-                    df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
-                    grant_results[f"{db}.{schema} [SCHEMA]"] = df
-                except:
-                    st.warning(f"⚠️ SCHEMA {db}.{schema} のGRANT取得失敗")
-
-            # TABLEレベル
-            for tbl_full in active_tables:
-                try:
-                    cursor.execute(f"SHOW GRANTS ON TABLE {tbl_full}")
-                    df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
-                    grant_results[f"{tbl_full} [TABLE]"] = df
-                except:
-                    st.warning(f"⚠️ TABLE {tbl_full} のGRANT取得失敗")
-
-            # 表示 & ダウンロード
-            for name, df in grant_results.items():
-                st.subheader(f"{name}")
-                st.dataframe(df)
-
-            if grant_results:
-                from io import BytesIO
-                import re
-                used_sheet_names = set()
-
-                def safe_sheet_name(name):
-                    name = re.sub(r'[:\\/?*\[\]]', '_', name)
-                    name = name[:31]
-                    base = name
-                    i = 1
-                    while name in used_sheet_names:
-                        name = f"{base[:28]}_{i}"
-                        i += 1
-                    used_sheet_names.add(name)
-                    return name
-
-                excel_io = BytesIO()
-                with pd.ExcelWriter(excel_io, engine="openpyxl") as writer:
-                    for name, df in grant_results.items():
-                        sheet_name = safe_sheet_name(name)
-                        try:
-                            df.astype(str).to_excel(writer, index=False, sheet_name=sheet_name)
-                        except Exception as e:
-                            st.warning(f"❌ Excel出力エラー（{sheet_name}）: {e}")
-                st.download_button("📥 Excelでダウンロード", data=excel_io.getvalue(), file_name="object_grants_by_level.xlsx")
+            def build_grant_export():
+                with query_trace.phase("ファイル出力"):
+                    return export_sheets(grant_results.items(), export_format)
+
+            try:
+                cached_download(
+                    "grant_export", grant_results, export_format, build_grant_export,
+                    label="📥 ファイルとしてダウンロード",
+                    file_name="object_grants_by_level"
+                )
+            except Exception as e:
+                st.warning(f"❌ ファイル出力エラー: {e}")
+
+        # ---- 実効権限（ロールの継承を含む） ----
+        # SHOW ROLES のロール一覧とロール → ロールの付与からロール階層を組み立て、上の直接の付与と合わせて
+        # 「このオブジェクトを使えるロール」「このロールが使えるオブジェクト」をメモリ上で引く（クエリは発行しない）。
+        # ロール階層はアカウント単位で保持し、再取得時は付与の追加・取り消しだけを反映する。
+        st.subheader("実効権限（ロールの継承を含む）")
+        if "role_graphs" not in st.session_state:
+            st.session_state.role_graphs = {}
+        role_graph = st.session_state.role_graphs.get(account)
+
+        if st.button("ロール階層を取得・更新", help="一括取得方式でスナップショットがある場合は GRANTS_TO_ROLES の内容を使います"):
+            with query_trace.phase("ロール階層"):
+                if grants_mode.startswith("一括取得") and grants_snapshot is not None:
+                    df_edges, failed = role_edges_from_grants(grants_snapshot["grants"]), []
+                else:
+                    with st.spinner("⏳ ロール間の付与を取得中..."):
+                        df_edges, failed = fetch_role_edges(query, role_names, max_workers)
+            for role, err in failed:
+                st.warning(f"⚠️ ロール {role} の付与先を取得できませんでした: {err}")
+            # 取得に失敗したロールの付与は前回の内容を残す
+            failed_roles = {role for role, _ in failed}
+            edges = list(zip(df_edges["role"], df_edges["grantee_name"]))
+            if role_graph is None:
+                role_graph = RoleGraph(role_names, edges)
+                st.session_state.role_graphs[account] = role_graph
+                st.info(f"ロール階層: {len(role_graph.roles)} ロール / ロール間の付与 {len(edges)} 件")
+            else:
+                edges += [edge for edge in role_graph.edges() if edge[0] in failed_roles]
+                summary = role_graph.update(role_names, edges)
+                st.info(f"ロール階層を更新しました: 付与の追加 {summary['added']} 件 / 取り消し {summary['removed']} 件")
+
+        if role_graph is None:
+            st.caption("「ロール階層を取得・更新」を押すと、ロールの継承を含めた権限を調べられます。")
+        elif not grant_results:
+            st.caption("権限情報を取得すると、ロールの継承を含めた権限を調べられます。")
+        else:
+            effective_access = st.session_state.get("effective_access")
+            if effective_access is None or effective_access.graph is not role_graph:
+                effective_access = EffectiveAccess(role_graph, grant_results)
+                st.session_state["effective_access"] = effective_access
+            lookup = st.radio(
+                "調べ方", ["オブジェクトから（使えるロール）", "ロールから（使えるオブジェクト）"],
+                horizontal=True, key="effective_access_lookup"
+            )
+            if lookup.startswith("オブジェクト"):
+                target = st.selectbox("オブジェクト", list(grant_results), key="effective_access_object")
+                started = time.perf_counter()
+                df_access = effective_access.roles_for_object(target)
+            else:
+                target = st.selectbox("ロール", role_names, key="effective_access_role")
+                started = time.perf_counter()
+                df_access = effective_access.objects_for_role(target)
+            st.caption(
+                f"{len(df_access)} 件（via_role は権限を直接付与されているロール ／ "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms）"
+            )
+            st.dataframe(df_access, use_container_width=True)
+
+    tabs = main_tabs(MAIN_TABS)
+    for tab, render_tab in zip(tabs, [parameters_tab, definitions_tab, grants_tab]):
+        with tab:
+            if tab_is_open(tab):
+                render_tab()
+
+    # ---- ウェアハウスの使用状況 ----
+    # ウェアハウスを使った文を表示する（停止状態に戻すのは各取得の終わりだけで、画面の再実行ごとには行わない）。
+    with st.sidebar.expander("ウェアハウスを使ったクエリ"):
+        df_compute = warehouse_guard.report()
+        if df_compute.empty:
+            st.caption("ウェアハウスを使ったクエリはありません")
+        else:
+            st.dataframe(df_compute.tail(TRACE_PREVIEW_ROWS), use_container_width=True)
+        if st.button("記録をクリア", key="clear_compute_report"):
+            warehouse_guard.clear()
+            st.rerun()
+
+    # ---- クエリ計測 ----
+    # 各フェーズの所要時間と、直近のクエリ（クエリID付き）を表示する。
+    # QUERY_TAG（snowflake_info_tool:<run_id>:<フェーズ>）で QUERY_HISTORY と突き合わせられる。
+    with st.sidebar.expander("クエリ計測"):
+        st.dataframe(query_trace.summary(), use_container_width=True)
+        df_trace_queries = query_trace.queries_frame()
+        if not df_trace_queries.empty:
+            st.dataframe(df_trace_queries.tail(TRACE_PREVIEW_ROWS)[TRACE_PREVIEW_COLUMNS], use_container_width=True)
+        st.caption(f"QUERY_TAG: {query_trace.query_tag('<フェーズ>')}")
+        st.download_button(
+            "トレースをダウンロード（JSON）",
+            data=query_trace.to_json(),
+            file_name=f"query_trace_{query_trace.run_id}.json",
+            mime="application/json"
+        )
+        if st.button("計測をクリア"):
+            query_trace.clear()
+            st.rerun()
+
+    # ---- セッションのメモリ使用量 ----
+    # テーブル定義（一覧・検索インデックス）とサンプルの保持量。サンプルは上限を超えるとディスクに退避・破棄される。
+    with st.sidebar.expander("セッションのメモリ使用量"):
+        catalog_memory = st.session_state.get("catalog_memory", {"catalog": 0, "index": 0})
+        table_count = len(st.session_state["definition_index"]["table_keys"]) if "definition_index" in st.session_state else 0
+        sample_usage = sample_store().usage()
+        st.dataframe([
+            {"対象": "テーブル定義", "MB": catalog_memory["catalog"] / 2**20, "件数": table_count},
+            {"対象": "検索インデックス", "MB": catalog_memory["index"] / 2**20, "件数": None},
+            {"対象": "サンプル（メモリ）", "MB": sample_usage["memory_bytes"] / 2**20, "件数": sample_usage["memory_tables"]},
+            {"対象": "サンプル（ディスク退避）", "MB": sample_usage["disk_bytes"] / 2**20, "件数": sample_usage["disk_tables"]},
+        ], use_container_width=True)
+        st.caption(
+            f"メモリ上限 {sample_usage['budget_bytes'] / 2**20:.0f} MB ／ "
+            f"使用中 {(sample_usage['reserved_bytes'] + sample_usage['memory_bytes']) / 2**20:.1f} MB ／ "
+            f"破棄したサンプル {sample_usage['evicted_tables']} 件"
+        )
+        if st.button("サンプルを破棄", key="clear_sample_store"):
+            sample_store().clear()
+            st.rerun()
+
+    # タブ内の操作による再実行は「タブ: …」、それ以外の操作は「画面全体」として記録される
+    with st.sidebar.expander("画面の応答時間"):
+        st.dataframe(list(st.session_state.ui_timings)[::-1], use_container_width=True)
+        st.caption("タブ内の操作の記録は、次に画面全体が再実行されたときに表示に反映されます。")
 
 else:
     st.warning("まず左のサイドバーでSnowflakeに接続してください。")
+
+record_ui_timing("画面全体", SCRIPT_STARTED)